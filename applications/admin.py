@@ -1,5 +1,7 @@
-from django.contrib import admin
-from .models import Application
+from django.contrib import admin, messages
+from .models import Application, ApprovalStatus, ArchivedApplication, StoredBlob, UploadSession
+from .export import export_response
+from .transitions import TransitionError, bulk_transition
 
 
 @admin.register(Application)
@@ -16,19 +18,20 @@ class ApplicationAdmin(admin.ModelAdmin):
     )
     list_filter = ('status', 'created_at', 'approved_at')
     search_fields = (
-        'applicant__username', 
-        'approver__username', 
+        'applicant', 
+        'approver', 
         'original_filename',
         'comment'
     )
-    readonly_fields = ('created_at', 'updated_at', 'file_size', 'content_type')
+    readonly_fields = ('created_at', 'updated_at', 'file_size', 'content_type', 'sha256')
+    actions = ('approve_selected', 'reject_selected', 'export_selected')
     
     fieldsets = (
         ('基本情報', {
             'fields': ('applicant', 'approver', 'status')
         }),
         ('ファイル情報', {
-            'fields': ('file', 'original_filename', 'file_size', 'content_type')
+            'fields': ('file', 'original_filename', 'file_size', 'content_type', 'sha256')
         }),
         ('コメント', {
             'fields': ('comment', 'approval_comment')
@@ -38,3 +41,101 @@ class ApplicationAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+    @admin.action(description="選択した申請を一括承認")
+    def approve_selected(self, request, queryset):
+        self._bulk_transition(request, queryset, ApprovalStatus.APPROVED)
+
+    @admin.action(description="選択した申請を一括却下")
+    def reject_selected(self, request, queryset):
+        self._bulk_transition(request, queryset, ApprovalStatus.REJECTED)
+
+    @admin.action(description="選択した申請のファイルをZIPでダウンロード")
+    def export_selected(self, request, queryset):
+        return export_response(queryset)
+
+    def _bulk_transition(self, request, queryset, new_status):
+        try:
+            results, changed = bulk_transition(
+                queryset.values_list('pk', flat=True), new_status, request.user
+            )
+        except TransitionError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        self.message_user(request, f"{len(changed)} 件を「{new_status.label}」にしました。")
+        skipped = len(results) - len(changed)
+        if skipped:
+            self.message_user(request, f"申請中でない {skipped} 件はスキップしました。", messages.WARNING)
+
+
+@admin.register(ArchivedApplication)
+class ArchivedApplicationAdmin(admin.ModelAdmin):
+    """アーカイブ済み申請 (閲覧のみ)"""
+    list_display = (
+        'id',
+        'applicant',
+        'approver',
+        'original_filename',
+        'status',
+        'created_at',
+        'archived_at'
+    )
+    list_filter = ('status', 'archived_at')
+    search_fields = (
+        'applicant',
+        'approver',
+        'original_filename',
+        'comment'
+    )
+    actions = ('export_selected',)
+
+    @admin.action(description="選択した申請のファイルをZIPでダウンロード")
+    def export_selected(self, request, queryset):
+        return export_response(queryset)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    """分割アップロードのセッション (閲覧・削除のみ)"""
+    list_display = (
+        'id',
+        'owner',
+        'original_filename',
+        'offset',
+        'length',
+        'application',
+        'updated_at',
+        'completed_at'
+    )
+    list_filter = ('completed_at',)
+    search_fields = ('owner__username', 'original_filename')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    """内容アドレス方式のファイル実体 (閲覧のみ)"""
+    list_display = ('sha256', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
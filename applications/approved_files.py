@@ -0,0 +1,247 @@
+"""承認済みファイルの承認済みディレクトリ (settings.APPROVED_DIR) への移動
+
+承認処理のリクエスト内ではファイルに触れず、承認と同じトランザクションで
+ジョブ (applications.move_approved_file) を投入する。コミット後にワーカーが
+
+1. 申請専用のファイルを APPROVED_DIR 配下へ置く
+2. FileField の名前を approved/... に付け替える (QuerySet.update。save() は通さず
+   version・updated_at も変えない)
+3. コミット後に移動元を削除する (移動元が他の申請と共有の実体なら残す)
+
+の順で処理する。どの段階で落ちても移動元か移動先のどちらかに完全なファイルが
+残り、再実行 (ジョブのリトライ) か `reconcile_approved_files` コマンドで続きから
+直せる。
+
+内容アドレス方式の実体 (blobs/) は同じ内容の申請中・却下の申請や今後のアップロードと
+共有されるため動かさない。承認された申請ごとに approved/<モデル名>/ab/cd/<pk>-<sha256>
+を作り (同一ファイルシステムならハードリンク、別ボリューム (EXDEV) なら .part への
+チャンクコピー → fsync → SHA-256 照合 → rename)、その申請の行だけを付け替える。
+実体の参照 (StoredBlob.ref_count) は sha256 を持つ行の数のまま変えない。
+内容アドレス方式導入前のファイル (sha256 なし) は申請固有なので rename で移す。
+
+申請専用ファイルは、それを参照する行 (申請・アーカイブ) がすべて削除された
+コミット後に削除する (remove_if_unreferenced)。
+"""
+import errno
+import hashlib
+import logging
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .blobs import blob_name, hash_file
+from .models import Application, ApprovalStatus, ArchivedApplication, StoredBlob
+from .storage import APPROVED_PREFIX, approved_name, is_approved_name, source_name
+
+logger = logging.getLogger(__name__)
+
+MOVE_TASK = 'applications.move_approved_file'
+COPY_BLOCK_SIZE = 4 * 1024 * 1024
+PART_SUFFIX = '.part'
+# これより古い .part はコピー中のワーカーが落ちた残骸とみなす
+STALE_PART_SECONDS = 3600
+
+
+class FileMoveError(Exception):
+    """移動元の欠損・コピーの検証失敗"""
+
+
+def schedule_moves(applications):
+    """承認済みになった申請の移動ジョブを投入する (承認と同じトランザクション内で呼ぶ)"""
+    from jobs.queue import enqueue_many
+    enqueue_many(MOVE_TASK, [
+        {'application_id': a.pk}
+        for a in applications
+        if a.file and not is_approved_name(a.file.name)
+    ])
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _copy_verified(src, dst, expected=None):
+    """src を dst.part へコピーして検証し、dst に rename する"""
+    part = dst + PART_SUFFIX
+    hasher = hashlib.sha256()
+    try:
+        with open(src, 'rb') as reader, open(part, 'wb') as writer:
+            for block in iter(lambda: reader.read(COPY_BLOCK_SIZE), b''):
+                writer.write(block)
+                hasher.update(block)
+            writer.flush()
+            os.fsync(writer.fileno())
+        digest = hasher.hexdigest()
+        if expected and digest != expected:
+            raise FileMoveError(f"移動元の内容がハッシュと一致しません: {src}")
+        # 書き込んだ内容を読み直して照合する
+        if hash_file(part) != digest:
+            raise FileMoveError(f"コピー結果の検証に失敗しました: {dst}")
+        os.replace(part, dst)
+    except BaseException:
+        if os.path.exists(part):
+            os.unlink(part)
+        raise
+    _fsync_dir(os.path.dirname(dst))
+
+
+def place_file(src, dst, expected=None):
+    """src を dst へ移す。rename できないボリューム間では検証付きコピー (移動元は残す)"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.rename(src, dst)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        _copy_verified(src, dst, expected)
+        return
+    _fsync_dir(os.path.dirname(dst))
+
+
+def link_file(src, dst, expected=None):
+    """src を残したまま dst に同じ内容を置く。ハードリンクできないボリューム間では検証付きコピー"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError as exc:
+        if exc.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        _copy_verified(src, dst, expected)
+        return
+    _fsync_dir(os.path.dirname(dst))
+
+
+def approved_target(obj):
+    """obj の承認済みディレクトリでの名前 (共有の実体なら申請ごとの別名)"""
+    if obj.sha256:
+        sha256 = obj.sha256
+        return approved_name(f"{obj._meta.model_name}/{sha256[:2]}/{sha256[2:4]}/{obj.pk}-{sha256}")
+    return approved_name(obj.file.name)
+
+
+def remove_if_unreferenced(name):
+    """name のファイルを削除する (どの行からも参照されていなければ)"""
+    if (
+        Application.objects.filter(file=name).exists()
+        or ArchivedApplication.objects.filter(file=name).exists()
+        or StoredBlob.objects.filter(name=name).exists()
+    ):
+        return False
+    path = default_storage.path(name)
+    if not os.path.exists(path):
+        return False
+    os.unlink(path)
+    return True
+
+
+def move_to_approved(obj):
+    """申請 (またはアーカイブ行) のファイルを承認済みディレクトリへ置く。置いたら True"""
+    name = obj.file.name
+    if not name or is_approved_name(name):
+        return False
+    target = approved_target(obj)
+    src, dst = default_storage.path(name), default_storage.path(target)
+    if os.path.exists(dst) and obj.sha256 and hash_file(dst) != obj.sha256:
+        # 前回の途中で残った不完全なファイル
+        os.unlink(dst)
+    if not os.path.exists(dst):
+        if not os.path.exists(src):
+            raise FileMoveError(f"移動元のファイルがありません: {name}")
+        if obj.sha256:
+            link_file(src, dst, obj.sha256)
+        else:
+            place_file(src, dst)
+    with transaction.atomic():
+        type(obj).objects.filter(pk=obj.pk, file=name).update(file=target)
+        obj.file.name = target
+        if not obj.sha256:
+            transaction.on_commit(lambda: remove_if_unreferenced(name))
+    logger.info("Moved approved file | %s=%s name=%s", obj._meta.model_name, obj.pk, target)
+    return True
+
+
+def move_approved_file(application_id):
+    """ジョブ本体。承認済みでない・削除済みなら何もしない"""
+    application = Application.objects.filter(pk=application_id, status=ApprovalStatus.APPROVED).first()
+    if application is None:
+        return False
+    return move_to_approved(application)
+
+
+def restore_shared_blob(blob):
+    """承認済みディレクトリへ移されてしまった共有の実体を blobs/ に戻す。戻したら True
+
+    承認済みの行は承認済みディレクトリ側のファイルを参照したまま残し、
+    それ以外 (申請中・却下) の行と StoredBlob を blobs/ に付け替える。
+    """
+    name, target = blob.name, blob_name(blob.sha256)
+    dst = default_storage.path(target)
+    if not os.path.exists(dst):
+        src = default_storage.path(name)
+        if not os.path.exists(src):
+            return False
+        link_file(src, dst, blob.sha256)
+    with transaction.atomic():
+        StoredBlob.objects.filter(sha256=blob.sha256, name=name).update(name=target)
+        for model in (Application, ArchivedApplication):
+            (model.objects.filter(sha256=blob.sha256, file=name)
+             .exclude(status=ApprovalStatus.APPROVED).update(file=target))
+        transaction.on_commit(lambda: remove_if_unreferenced(name))
+    logger.info("Restored shared blob | sha256=%s from=%s", blob.sha256, name)
+    return True
+
+
+def reconcile(dry_run=False, limit=None):
+    """途中で止まった移動を修復し、
+    {'moved': n, 'sources_removed': n, 'parts_removed': n, 'blobs_restored': n, 'missing': [...]} を返す
+
+    - 承認済みディレクトリに置かれた共有の実体 (StoredBlob.name が approved/): blobs/ に戻す
+    - 承認済みなのに approved/ でない行: 移動を実行 (移動先に完成済みなら付け替えのみ)
+    - approved/ の行 (sha256 なし) で移動元が残っているもの: 移動元を削除
+    - APPROVED_DIR に残ったコピー途中の .part (STALE_PART_SECONDS 経過): 削除
+    """
+    result = {'moved': 0, 'sources_removed': 0, 'parts_removed': 0, 'blobs_restored': 0, 'missing': []}
+    for blob in StoredBlob.objects.filter(name__startswith=APPROVED_PREFIX).iterator():
+        result['blobs_restored'] += 1 if dry_run else restore_shared_blob(blob)
+    for model in (Application, ArchivedApplication):
+        pending = (
+            model.objects.filter(status=ApprovalStatus.APPROVED)
+            .exclude(file='')
+            .exclude(file__startswith='approved/')
+            .order_by('pk')
+        )
+        if limit is not None:
+            pending = pending[:limit]
+        for obj in pending.iterator():
+            if dry_run:
+                result['moved'] += 1
+                continue
+            try:
+                result['moved'] += move_to_approved(obj)
+            except FileMoveError:
+                result['missing'].append(f"{model._meta.model_name}:{obj.pk}")
+
+        names = (
+            model.objects.filter(file__startswith='approved/', sha256='')
+            .values_list('file', flat=True).distinct()
+        )
+        for name in names.iterator():
+            source = source_name(name)
+            if os.path.exists(default_storage.path(source)):
+                result['sources_removed'] += 1 if dry_run else remove_if_unreferenced(source)
+
+    stale_before = time.time() - STALE_PART_SECONDS
+    for dirpath, _dirs, files in os.walk(default_storage.path('approved/')):
+        for filename in files:
+            path = os.path.join(dirpath, filename)
+            if filename.endswith(PART_SUFFIX) and os.path.getmtime(path) < stale_before:
+                if not dry_run:
+                    os.unlink(path)
+                result['parts_removed'] += 1
+    return result
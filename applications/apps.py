@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class ApplicationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'applications'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        post_migrate.connect(_ensure_search_index, sender=self)
+
+
+def _ensure_search_index(sender, using, **kwargs):
+    """テーブル再作成で消えた全文検索トリガーを補う"""
+    from django.db import connections
+    from .search import install_search_index
+    install_search_index(connections[using])
@@ -0,0 +1,113 @@
+"""完了済み申請のアーカイブ (ホット/コールド分離)
+
+承認済み・却下済みで settings.APPLICATION_ARCHIVE_AFTER_DAYS 日以上更新のない
+申請を、監査ログ・通知とともにアーカイブテーブルへ移す。バッチごとに
+1トランザクションで「コピー → 元行の削除」を行うため、途中で中断しても
+二重登録や欠落は起きず、再実行すれば続きから処理される。
+
+元行の削除は通常の QuerySet.delete() で行うので、ステータスカウンタの減算と
+全文検索インデックスからの除去は既存のシグナル/トリガーがそのまま担う。
+ファイル実体 (StoredBlob) の参照は削除前にアーカイブ行の分を足しておき、増減を相殺する。
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from audit.models import AuditLog, ArchivedAuditLog
+from notifications.models import Notification, ArchivedNotification
+
+from .blobs import blob_name
+from .models import Application, ApprovalStatus, ArchivedApplication, StoredBlob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+DEFAULT_BATCH_SIZE = 500
+
+FINISHED_STATUSES = (ApprovalStatus.APPROVED, ApprovalStatus.REJECTED)
+
+
+def archive_cutoff(days=None):
+    """この日時より前に最終更新された完了済み申請がアーカイブ対象"""
+    if days is None:
+        days = getattr(settings, 'APPLICATION_ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_applications(cutoff):
+    return Application.objects.filter(status__in=FINISHED_STATUSES, updated_at__lt=cutoff)
+
+
+def _copy(model, obj, **overrides):
+    values = {field.attname: getattr(obj, field.attname) for field in obj._meta.concrete_fields}
+    values.update(overrides)
+    return model(**values)
+
+
+def archive_batch(ids):
+    """指定 ID の申請と関連行をアーカイブへ移す。移動した申請数を返す"""
+    now = timezone.now()
+    with transaction.atomic():
+        # ロック取得後に条件を再確認 (バッチ選定後に差し戻された行は対象外)
+        applications = list(
+            Application.objects.select_for_update()
+            .filter(id__in=ids, status__in=FINISHED_STATUSES)
+            .order_by('id')
+        )
+        if not applications:
+            return 0
+        moved_ids = [a.id for a in applications]
+        ArchivedApplication.objects.bulk_create(
+            [ArchivedApplication.from_application(a, archived_at=now) for a in applications]
+        )
+        ArchivedAuditLog.objects.bulk_create(
+            [_copy(ArchivedAuditLog, log) for log in AuditLog.objects.filter(application_id__in=moved_ids)]
+        )
+        ArchivedNotification.objects.bulk_create(
+            [
+                _copy(ArchivedNotification, n)
+                for n in Notification.objects.filter(related_application_id__in=moved_ids)
+            ]
+        )
+        # ファイル実体の参照をアーカイブ行へ引き継ぐ (元行の削除で減る分を先に足す)
+        for (sha256, size), count in Counter(
+            (a.sha256, a.file_size) for a in applications if a.sha256
+        ).items():
+            StoredBlob.acquire(sha256, blob_name(sha256), size, count=count)
+        # 監査ログ・通知は CASCADE で同時に削除される
+        Application.objects.filter(id__in=moved_ids).delete()
+    return len(moved_ids)
+
+
+def archive_applications(cutoff=None, batch_size=DEFAULT_BATCH_SIZE, limit=None):
+    """cutoff より古い完了済み申請を batch_size 件ずつアーカイブし、移動件数を返す"""
+    cutoff = cutoff or archive_cutoff()
+    total = 0
+    last_id = 0
+    while limit is None or total < limit:
+        size = batch_size if limit is None else min(batch_size, limit - total)
+        ids = list(
+            archivable_applications(cutoff)
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        moved = archive_batch(ids)
+        total += moved
+        logger.info("Archived applications | batch=%s moved=%s total=%s", len(ids), moved, total)
+    return total
+
+
+def get_application_or_archived(pk):
+    """ホット側になければアーカイブから引く。どちらにもなければ None"""
+    return (
+        Application.objects.filter(pk=pk).first()
+        or ArchivedApplication.objects.filter(pk=pk).first()
+    )
@@ -0,0 +1,213 @@
+"""内容アドレス方式のファイル保存 (同一内容の重複排除)
+
+アップロードされたファイルは受信しながら SHA-256 を計算し、
+
+    MEDIA_ROOT/blobs/ab/cd/<sha256>
+
+に1つだけ置く。同じ内容が再申請されても実体は増えず、StoredBlob.ref_count が
+増えるだけになる。参照数は申請 (Application / ArchivedApplication) の作成・削除と
+同じトランザクションで増減し、0 になった実体はコミット後に削除する。
+
+実体の配置と削除はどちらも StoredBlob 行を更新した後 (行ロック取得後) に行うため、
+「同じ内容の登録」と「最後の参照の削除」が並行しても実体が消えたまま参照されることはない。
+
+- 削除: 行ロックを持ったまま実体を blobs/tmp へ退避し、コミットされてから消す。
+  コミットに失敗したら退避先から戻すので、行だけ残って実体がない状態にはならない
+- 配置: 申請の保存トランザクション内で実体を置くため、ロールバックされると行のない
+  実体が残る。purge_orphan_files() が一定時間 (ORPHAN_GRACE_SECONDS) 経っても
+  行のない実体と一時ファイルを掃除する
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import StoredBlob
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = 'blobs'
+TMP_DIR = f"{BLOB_DIR}/tmp"
+HASH_BLOCK_SIZE = 1024 * 1024
+# 作成途中の実体・一時ファイルを掃除対象にしないための猶予
+ORPHAN_GRACE_SECONDS = 24 * 3600
+TRASH_MARKER = '.deleted-'
+
+
+def blob_name(sha256):
+    """内容ハッシュからストレージ上の名前を決める (先頭2桁ずつで2階層に分散)"""
+    return f"{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def hash_file(path):
+    """ファイル全体の SHA-256 (16進)"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def adopt_file(path, sha256, size):
+    """ハッシュ計算済みのファイル path を実体として登録し、参照を1つ取って StoredBlob を返す
+
+    同じ内容の実体が既にあれば path は削除し、なければ実体の位置へ移動する。
+    """
+    StoredBlob.acquire(sha256, blob_name(sha256), size)
+    blob = StoredBlob.objects.get(sha256=sha256)
+    target = default_storage.path(blob.name)
+    if os.path.exists(target):
+        # 更新日時を新しくし、コミット前に孤立ファイルとして掃除されないようにする
+        os.utime(target)
+        os.unlink(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+    return blob
+
+
+def store_file(file):
+    """アップロードファイルをチャンク単位で読みながらハッシュを計算して実体として保存する
+
+    一時ファイルは実体と同じディレクトリ配下に作るため、最後の移動は rename で済む。
+    """
+    tmp_dir = default_storage.path(TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            for chunk in file.chunks():
+                hasher.update(chunk)
+                fh.write(chunk)
+                size += len(chunk)
+            fh.flush()
+            os.fsync(fh.fileno())
+        return adopt_file(tmp_path, hasher.hexdigest(), size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def adopt_legacy_file(obj):
+    """内容アドレス方式導入前のファイル (sha256 が空) を実体へ移し、obj を付け替える
+
+    obj は Application または ArchivedApplication。ファイルが見つからなければ False。
+    """
+    path = default_storage.path(obj.file.name)
+    if not os.path.exists(path):
+        return False
+    sha256 = hash_file(path)
+    with transaction.atomic():
+        blob = adopt_file(path, sha256, os.path.getsize(path))
+        # save() は通さない (version・updated_at を変えない)
+        type(obj).objects.filter(pk=obj.pk).update(file=blob.name, sha256=sha256)
+    obj.file.name, obj.sha256 = blob.name, sha256
+    return True
+
+
+def legacy_files(model):
+    return model.objects.filter(sha256='').exclude(file='')
+
+
+def delete_if_unreferenced(sha256):
+    """参照数が 0 以下なら行と実体を削除する。削除したら True
+
+    実体は行ロックを持ったまま退避し (並行する同一内容の登録と入れ違わないように)、
+    消すのはコミット後。外側のトランザクション内で呼ばれた場合はその外側のコミット後に
+    消え、外側がロールバックされた分は purge_orphan_files() が退避先から戻す。
+    """
+    trash = None
+    try:
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(sha256=sha256, ref_count__lte=0).first()
+            if blob is None:
+                return False
+            blob.delete()
+            trash = _move_to_trash(sha256, blob.name)
+            if trash is not None:
+                transaction.on_commit(lambda: _unlink(trash))
+    except BaseException:
+        if trash is not None and os.path.exists(trash):
+            _restore_from_trash(trash, default_storage.path(blob.name))
+        raise
+    logger.info("Deleted unreferenced blob | sha256=%s size=%s", sha256, blob.size)
+    return True
+
+
+def _move_to_trash(sha256, name):
+    """実体を blobs/tmp/<sha256>.deleted-<乱数> へ移し、移動先を返す。実体がなければ None"""
+    path = default_storage.path(name)
+    trash_dir = default_storage.path(TMP_DIR)
+    os.makedirs(trash_dir, exist_ok=True)
+    trash = os.path.join(trash_dir, f"{sha256}{TRASH_MARKER}{uuid.uuid4().hex}")
+    try:
+        os.replace(path, trash)
+    except FileNotFoundError:
+        return None
+    return trash
+
+
+def _restore_from_trash(trash, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # 戻す前に同じ内容が登録し直されていても中身は同一なので上書きしてよい
+    os.replace(trash, target)
+    logger.warning("Restored blob from trash | path=%s", target)
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def purge_unreferenced():
+    """参照数 0 のまま残った実体 (コミット後フックの取りこぼし) を削除し、件数を返す"""
+    count = 0
+    for sha256 in StoredBlob.objects.filter(ref_count__lte=0).values_list('sha256', flat=True):
+        count += delete_if_unreferenced(sha256)
+    return count
+
+
+def purge_orphan_files(grace_seconds=ORPHAN_GRACE_SECONDS):
+    """StoredBlob 行のない実体と古い一時ファイルを削除し、件数を返す
+
+    保存トランザクションのロールバックで残った実体や、中断されたアップロードの
+    一時ファイルが対象。更新から grace_seconds 経っていないものは作成途中の
+    可能性があるので残す。退避済みの実体で行が残っているもの (削除側のロールバック)
+    は元の位置へ戻す。
+    """
+    root = default_storage.path(BLOB_DIR)
+    tmp_root = default_storage.path(TMP_DIR)
+    deadline = time.time() - grace_seconds
+    count = 0
+    for dirpath, _dirnames, filenames in os.walk(root):
+        in_tmp = dirpath == tmp_root
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                if os.path.getmtime(path) >= deadline:
+                    continue
+            except FileNotFoundError:
+                continue
+            if in_tmp:
+                sha256 = filename.split(TRASH_MARKER)[0] if TRASH_MARKER in filename else None
+                if sha256 and StoredBlob.objects.filter(sha256=sha256).exists():
+                    target = default_storage.path(blob_name(sha256))
+                    if not os.path.exists(target):
+                        _restore_from_trash(path, target)
+                        continue
+            elif StoredBlob.objects.filter(sha256=filename).exists():
+                continue
+            _unlink(path)
+            count += 1
+            logger.info("Deleted orphan blob file | path=%s", path)
+    return count
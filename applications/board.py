@@ -0,0 +1,76 @@
+"""カンバンボードのカラム取得
+
+3ステータス分のカードを1クエリで取得する。ROW_NUMBER() を status で
+パーティションし、各カラムの先頭 N 件 (settings.KANBAN_COLUMN_LIMIT) のみを返す。
+カラムごとの総件数は ApplicationStatusCounter から読むため COUNT は発行しない。
+"""
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Application, ApprovalStatus, ApplicationStatusCounter
+from .pagination import cursor_after, paginate_keyset
+
+DEFAULT_COLUMN_LIMIT = 50
+
+
+def column_limit():
+    return getattr(settings, 'KANBAN_COLUMN_LIMIT', DEFAULT_COLUMN_LIMIT)
+
+
+def load_board_columns(username, role, limit=None):
+    """ボード表示用に {status: {'applications', 'total', 'remaining'}} を返す
+
+    role は CounterRole (applicant / approver)。値がそのまま絞り込み対象の
+    フィールド名になる。各カラムは作成日時降順。
+    """
+    limit = limit or column_limit()
+    ranked = (
+        Application.objects.filter(**{role: username})
+        .annotate(
+            column_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('status')],
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        )
+        .filter(column_rank__lte=limit)
+        .order_by('status', 'column_rank')
+    )
+    cards = {status: [] for status in ApprovalStatus.values}
+    for application in ranked:
+        cards.setdefault(application.status, []).append(application)
+
+    counts = ApplicationStatusCounter.counts_for(username, role)
+    columns = {}
+    for status in ApprovalStatus.values:
+        shown = cards[status]
+        remaining = max(counts[status] - len(shown), 0)
+        columns[status] = {
+            'applications': shown,
+            'total': counts[status],
+            'remaining': remaining,
+            # 続きを board_column_page で取得するためのカーソル
+            'next_cursor': cursor_after(shown[-1]) if remaining and shown else '',
+        }
+    return columns
+
+
+def load_column_page(username, role, status, cursor=None, limit=None):
+    """1カラム分の続き (cursor 以降の N 件) を KeysetPage で返す。不正なカーソルは ValueError"""
+    queryset = Application.objects.filter(**{role: username, 'status': status})
+    return paginate_keyset(queryset, cursor, limit or column_limit())
+
+
+def board_context(username, role, limit=None):
+    """既存テンプレート互換のコンテキスト (pending_applications 等) を組み立てる"""
+    columns = load_board_columns(username, role, limit)
+    return {
+        'pending_applications': columns[ApprovalStatus.PENDING]['applications'],
+        'approved_applications': columns[ApprovalStatus.APPROVED]['applications'],
+        'rejected_applications': columns[ApprovalStatus.REJECTED]['applications'],
+        'status_counts': {status: column['total'] for status, column in columns.items()},
+        'column_remaining': {status: column['remaining'] for status, column in columns.items()},
+        'column_next_cursor': {status: column['next_cursor'] for status, column in columns.items()},
+    }
+
@@ -0,0 +1,32 @@
+"""申請カード (application_card.html) のフラグメントキャッシュ
+
+キャッシュキーは (申請ID, updated_at) で版管理する。カードの内容は閲覧者の
+立場によらないため、承認者・申請者のボードで同じフラグメントを共有する。保存で
+updated_at が変われば別キーになるため古い版は参照されず、さらに保存時に
+旧版のキーを明示的に削除する。相対時刻 (naturaltime) はキャッシュ外で描画する。
+容量超過時の追い出しは CACHES['template_fragments'] の MAX_ENTRIES に任せる。
+"""
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+
+# application_card.html 内の {% cache %} ブロック名
+CARD_FRAGMENTS = ('application_card_head', 'application_card_tail')
+
+
+def fragment_cache():
+    """{% cache %} タグと同じ規則でキャッシュを選ぶ"""
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def card_fragment_keys(application_id, updated_at):
+    version = updated_at.timestamp()
+    return [make_template_fragment_key(name, [application_id, version]) for name in CARD_FRAGMENTS]
+
+
+def invalidate_card_fragments(application_id, updated_at):
+    if updated_at is None:
+        return
+    fragment_cache().delete_many(card_fragment_keys(application_id, updated_at))
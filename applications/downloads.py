@@ -0,0 +1,168 @@
+"""申請ファイルの認可付きダウンロード
+
+MEDIA_URL の静的配信 (権限チェックなし) に代わり、申請者・承認者・スタッフのみに
+ファイルを返す。
+
+- ETag は内容ハッシュ (sha256) 由来。If-None-Match が一致すれば 304 を返す。
+- Range (単一範囲) に対応し 206 を返す。If-Range が一致しない場合は全体を返す。
+- settings.APPLICATION_DOWNLOAD_ACCEL を設定すると、本体の送信はフロントの
+  プロキシに任せる (nginx: X-Accel-Redirect / apache: X-Sendfile)。Range も
+  プロキシ側で処理されるため、Python のワーカーはヘッダーを返すだけで済む。
+- プロキシを使わない場合は FileResponse で返す。ファイル末尾までの送信では
+  ファイルオブジェクトをそのまま渡すので、WSGI サーバの wsgi.file_wrapper
+  (gunicorn 等は os.sendfile) でゼロコピー送信される。
+- ASGI (daphne) には file_wrapper がなく、素の FileResponse はファイル全体を
+  読み切ってから送る。ChunkedFileResponse で DOWNLOAD_BLOCK_SIZE ずつ読んで送るが、
+  ワーカースレッドを1ブロックごとに往復するので、大きいファイルを多く配る環境では
+  APPLICATION_DOWNLOAD_ACCEL でプロキシに任せること。
+"""
+import os
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.http import content_disposition_header
+
+from .streaming import ChunkedFileResponse
+
+DOWNLOAD_BLOCK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def can_download(application, user):
+    return (
+        user.is_staff
+        or application.applicant == user.username
+        or application.approver == user.username
+    )
+
+
+def file_etag(application, stat):
+    """内容ハッシュがあれば強い ETag、なければサイズと更新時刻からの弱い ETag"""
+    return application.etag or f'W/"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def _etag_matches(header, etag):
+    if header.strip() == '*':
+        return True
+    # If-None-Match は弱い比較
+    opaque = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque for tag in header.split(','))
+
+
+def parse_range(header, size):
+    """Range ヘッダーを (start, end) (end を含む) にする
+
+    解釈できない・複数範囲の場合は None (全体を返す)。満たせない範囲は ValueError。
+    """
+    match = _RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # 末尾から last バイト
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class _RangeReader:
+    """ファイルの [start, start + length) だけを読ませるラッパー"""
+
+    def __init__(self, fh, length):
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fh.close()
+
+
+def _accel_response(application, path):
+    mode = getattr(settings, 'APPLICATION_DOWNLOAD_ACCEL', '')
+    if mode == 'nginx':
+        prefix = getattr(settings, 'APPLICATION_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + application.file.name.lstrip('/')
+        return response
+    if mode == 'sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return response
+    return None
+
+
+def serve_application_file(request, application, as_attachment=True):
+    """権限確認済みの申請ファイルを返す"""
+    try:
+        path = application.file.path
+        stat = os.stat(path)
+    except (ValueError, FileNotFoundError):
+        raise Http404("ファイルが見つかりません")
+    etag = file_etag(application, stat)
+    filename = application.original_filename or os.path.basename(path)
+    content_type = application.content_type or 'application/octet-stream'
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and _etag_matches(if_none_match, etag):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    response = _accel_response(application, path)
+    if response is not None:
+        response['Content-Type'] = content_type
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        response['ETag'] = etag
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    fh = open(path, 'rb')
+    if byte_range is None:
+        response = ChunkedFileResponse(
+            fh, as_attachment=as_attachment, filename=filename, content_type=content_type
+        )
+    else:
+        start, end = byte_range
+        fh.seek(start)
+        length = end - start + 1
+        # 末尾までならファイルのまま渡して file_wrapper (sendfile) を使わせる
+        body = fh if end == size - 1 else _RangeReader(fh, length)
+        response = ChunkedFileResponse(
+            body, status=206, as_attachment=as_attachment, filename=filename, content_type=content_type
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.block_size = DOWNLOAD_BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
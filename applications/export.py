@@ -0,0 +1,164 @@
+"""申請ファイルの ZIP ストリーミングエクスポート
+
+全体のバッファを作らず、zipfile に書き込まれたバイト列をそのままジェネレータから
+ChunkedStreamingHttpResponse に流す (ASGI でも1チャンクずつ送出される)。各ファイルは
+READ_BLOCK_SIZE ずつ読んでは送り出すため、メモリ使用量はエクスポートの
+件数・サイズによらずほぼ一定になる。
+
+- 圧縮済みの形式 (画像・動画・PDF・Office 文書・アーカイブ等) は無圧縮 (store)、
+  それ以外は deflate で格納する。
+- 末尾に manifest.csv (ID・格納名・元ファイル名・SHA-256・申請者・承認者・
+  承認日時・サイズ・状態) を入れる。ファイルが欠損していた申請も状態付きで記録する。
+  行は処理しながら一時領域 (MANIFEST_SPOOL_SIZE を超えるとディスク) に書き出し、
+  最後に ZIP へ写す。
+- 出力先は seek できないため、zipfile はデータディスクリプタ形式で書き出す
+  (サイズと CRC は各ファイルの後ろに付く)。4GiB を超えるファイルは ZIP64。
+"""
+import codecs
+import csv
+import io
+import itertools
+import logging
+import os
+import re
+import tempfile
+import zipfile
+
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from .streaming import ChunkedStreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = 1024 * 1024
+QUERY_CHUNK_SIZE = 200
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_SPOOL_SIZE = 1024 * 1024
+MANIFEST_COLUMNS = [
+    'id', 'archive_name', 'original_filename', 'sha256', 'applicant', 'approver',
+    'approved_at', 'file_size', 'state',
+]
+
+# 既に圧縮されていて deflate しても縮まない形式
+STORED_EXTENSIONS = frozenset({
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic',
+    '.mp3', '.mp4', '.m4a', '.mov', '.avi', '.mkv', '.webm',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp',
+})
+STORED_CONTENT_TYPE_PREFIXES = ('image/', 'video/', 'audio/')
+
+_UNSAFE_CHARS_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+class _Sink(io.RawIOBase):
+    """zipfile の書き込み先。書かれたバイト列をためておき drain() で取り出す"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(application):
+    ext = os.path.splitext(application.original_filename or '')[1].lower()
+    content_type = (application.content_type or '').lower()
+    if ext in STORED_EXTENSIONS or content_type.startswith(STORED_CONTENT_TYPE_PREFIXES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def archive_name(application):
+    """ZIP 内の名前 (<ID>_<元ファイル名>。パス区切り等は _ に置き換える)"""
+    filename = _UNSAFE_CHARS_RE.sub('_', os.path.basename(application.original_filename or '')) or 'file'
+    return f"{application.pk}_{filename}"
+
+
+def _manifest_row(application, name, state):
+    return {
+        'id': application.pk,
+        'archive_name': name,
+        'original_filename': application.original_filename,
+        'sha256': application.sha256,
+        'applicant': application.applicant,
+        'approver': application.approver,
+        'approved_at': timezone.localtime(application.approved_at).isoformat() if application.approved_at else '',
+        'file_size': application.file_size,
+        'state': state,
+    }
+
+
+def iter_zip(applications):
+    """applications (イテラブル) のファイルを ZIP にしたバイト列を順に返すジェネレータ"""
+    sink = _Sink()
+    with tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_SIZE, mode='w+', encoding='utf-8',
+                                       newline='') as spool, \
+            zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        writer = csv.DictWriter(spool, fieldnames=MANIFEST_COLUMNS)
+        writer.writeheader()
+        for application in applications:
+            name = archive_name(application)
+            try:
+                source = application.file.open('rb')
+            except (ValueError, FileNotFoundError):
+                logger.warning("Export skipped missing file | application=%s", application.pk)
+                writer.writerow(_manifest_row(application, '', 'missing'))
+                continue
+            with source:
+                info = zipfile.ZipInfo(name, date_time=timezone.localtime(application.created_at).timetuple()[:6])
+                info.compress_type = compress_type_for(application)
+                # 事前にサイズを伝えて ZIP64 の要否を判定させる
+                info.file_size = application.file_size
+                with archive.open(info, 'w') as dest:
+                    for block in iter(lambda: source.read(READ_BLOCK_SIZE), b''):
+                        dest.write(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            writer.writerow(_manifest_row(application, name, 'ok'))
+            yield sink.drain()
+
+        spool.seek(0)
+        info = zipfile.ZipInfo(MANIFEST_NAME, date_time=timezone.localtime().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, 'w') as dest:
+            # Excel で開けるよう BOM 付き UTF-8
+            dest.write(codecs.BOM_UTF8)
+            for block in iter(lambda: spool.read(READ_BLOCK_SIZE), ''):
+                dest.write(block.encode('utf-8'))
+                data = sink.drain()
+                if data:
+                    yield data
+    yield sink.drain()
+
+
+def export_queryset(*querysets):
+    """複数のクエリセット (申請・アーカイブ) をサーバ側カーソルで順に読む"""
+    return itertools.chain.from_iterable(
+        queryset.order_by('pk').iterator(chunk_size=QUERY_CHUNK_SIZE) for queryset in querysets
+    )
+
+
+def export_response(*querysets, filename=None):
+    """ZIP をストリーミングで返すレスポンス"""
+    filename = filename or f"applications_{timezone.localtime():%Y%m%d_%H%M%S}.zip"
+    response = ChunkedStreamingHttpResponse(
+        (chunk for chunk in iter_zip(export_queryset(*querysets)) if chunk),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    # プロキシによるバッファリングを止め、届いた分から送らせる
+    response['X-Accel-Buffering'] = 'no'
+    response['Cache-Control'] = 'no-store'
+    return response
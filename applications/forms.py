@@ -1,6 +1,30 @@
 from django import forms
+from django.db import models
 from .models import Application, ApprovalStatus
 
+
+def validate_approver(user, approver):
+    """承認者のユーザ名を検証して返す (申請作成フォームと分割アップロードで共通)
+
+    本人は承認者にできない。LDAP の承認者候補 (所属 OU 階層) が取れる利用者は
+    その候補に限る (候補が取れないローカルユーザ・LDAP 障害時は名前の形式のみ確認)。
+    """
+    from users.utils import get_approvers_for_user
+    approver = (approver or '').strip()
+    if not approver:
+        raise forms.ValidationError("承認者を指定してください")
+    if len(approver) > Application._meta.get_field('approver').max_length:
+        raise forms.ValidationError("承認者のユーザ名が長すぎます")
+    if user is None:
+        return approver
+    if approver == user.username:
+        raise forms.ValidationError("自分自身を承認者にはできません")
+    candidates = get_approvers_for_user(user)
+    if candidates and approver not in {c.get('username') for c in candidates}:
+        raise forms.ValidationError("承認者候補に含まれないユーザは指定できません")
+    return approver
+
+
 class ApplicationCreateForm(forms.ModelForm):
     """申請作成フォーム"""
     approver = forms.CharField(
@@ -34,6 +58,8 @@ class ApplicationCreateForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+    def clean_approver(self):
+        return validate_approver(self.user, self.cleaned_data.get('approver'))
     def save(self, commit=True):
         application = super().save(commit=False)
         if self.user:
@@ -53,6 +79,14 @@ class ApplicationCreateForm(forms.ModelForm):
 
 class ApplicationFilterForm(forms.Form):
     """申請フィルタフォーム"""
+    q = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'ファイル名・コメントで検索'
+        }),
+        label="キーワード"
+    )
     status = forms.ChoiceField(
         choices=[('', 'すべて')] + list(ApprovalStatus.choices),
         required=False,
@@ -78,6 +112,66 @@ class ApplicationFilterForm(forms.Form):
         }),
         label="承認者ユーザ名（LDAP）"
     )
+    # 管理者一覧のみ: アーカイブ済み申請を表示
+    archived = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input',
+            'onchange': 'this.form.submit();'
+        }),
+        label="アーカイブ済みを表示"
+    )
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+
+
+class ApplicationExportForm(forms.Form):
+    """ZIP エクスポートの対象指定 (GET パラメータ)"""
+    ids = forms.CharField(
+        required=False,
+        label="申請ID（カンマ区切り）"
+    )
+    status = forms.ChoiceField(
+        choices=[('', 'すべて')] + list(ApprovalStatus.choices),
+        required=False,
+        label="ステータス"
+    )
+    applicant = forms.CharField(required=False, label="申請者ユーザ名（LDAP）")
+    approver = forms.CharField(required=False, label="承認者ユーザ名（LDAP）")
+    department = forms.CharField(required=False, label="申請者の部署（コードまたは名称）")
+    approved_from = forms.DateField(required=False, label="承認日（から）")
+    approved_to = forms.DateField(required=False, label="承認日（まで）")
+    archived = forms.BooleanField(required=False, label="アーカイブ済みを含める")
+
+    def clean_ids(self):
+        value = self.cleaned_data['ids']
+        if not value:
+            return []
+        try:
+            return [int(pk) for pk in value.split(',') if pk.strip()]
+        except ValueError:
+            raise forms.ValidationError("申請IDが不正です")
+
+    def filter(self, queryset):
+        """クエリセットに条件を適用する (申請・アーカイブ共通)"""
+        data = self.cleaned_data
+        if data['ids']:
+            queryset = queryset.filter(pk__in=data['ids'])
+        if data['status']:
+            queryset = queryset.filter(status=data['status'])
+        if data['applicant']:
+            queryset = queryset.filter(applicant=data['applicant'])
+        if data['approver']:
+            queryset = queryset.filter(approver=data['approver'])
+        if data['department']:
+            queryset = queryset.filter(
+                models.Q(applicant_user__department_code=data['department'])
+                | models.Q(applicant_user__department_name=data['department'])
+            )
+        if data['approved_from']:
+            queryset = queryset.filter(approved_at__date__gte=data['approved_from'])
+        if data['approved_to']:
+            queryset = queryset.filter(approved_at__date__lte=data['approved_to'])
+        return queryset
+
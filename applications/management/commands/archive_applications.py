@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from applications.archive import (
+    DEFAULT_BATCH_SIZE,
+    archivable_applications,
+    archive_applications,
+    archive_cutoff,
+)
+
+
+class Command(BaseCommand):
+    help = "一定期間を過ぎた承認済み/却下済みの申請を監査ログ・通知とともにアーカイブへ移す"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='最終更新からの経過日数 (既定: APPLICATION_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='1トランザクションで移動する件数')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='今回移動する最大件数')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='対象件数の表示のみ行う')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        if options['dry_run']:
+            count = archivable_applications(cutoff).count()
+            self.stdout.write(f'アーカイブ対象: {count} 件 ({cutoff:%Y-%m-%d %H:%M} より前)')
+            return
+        moved = archive_applications(cutoff, options['batch_size'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'{moved} 件の申請をアーカイブしました'))
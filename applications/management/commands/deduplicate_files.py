@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from applications.blobs import adopt_legacy_file, legacy_files
+from applications.models import Application, ArchivedApplication
+
+
+class Command(BaseCommand):
+    help = "内容アドレス方式導入前のファイルのハッシュを計算し、同一内容を1つの実体にまとめる"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='今回処理する最大件数 (申請・アーカイブそれぞれ)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='対象件数の表示のみ行う')
+
+    def handle(self, *args, **options):
+        for model in (Application, ArchivedApplication):
+            label = model._meta.verbose_name
+            queryset = legacy_files(model).order_by('pk')
+            if options['dry_run']:
+                self.stdout.write(f'{label}: 対象 {queryset.count()} 件')
+                continue
+            if options['limit'] is not None:
+                queryset = queryset[:options['limit']]
+            adopted = missing = 0
+            for obj in queryset.iterator():
+                if adopt_legacy_file(obj):
+                    adopted += 1
+                else:
+                    missing += 1
+                    self.stderr.write(f'{label} {obj.pk}: ファイルが見つかりません ({obj.file.name})')
+            self.stdout.write(self.style.SUCCESS(f'{label}: {adopted} 件を移行しました (欠損 {missing} 件)'))
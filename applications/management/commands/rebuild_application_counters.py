@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from applications.models import ApplicationStatusCounter
+
+
+class Command(BaseCommand):
+    help = "申請テーブルからユーザ別ステータスカウンタを再集計し、ずれていた行を修正する"
+
+    def handle(self, *args, **options):
+        fixed = ApplicationStatusCounter.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'カウンタを再集計しました (修正 {fixed} 行)'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from applications.approved_files import reconcile
+
+
+class Command(BaseCommand):
+    help = "承認済みファイルの移動の取りこぼし・中断を修復する (未移動の移動、移動元・コピー途中ファイルの削除)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='今回移動する最大件数 (申請・アーカイブそれぞれ)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='対象件数の表示のみ行う')
+
+    def handle(self, *args, **options):
+        result = reconcile(dry_run=options['dry_run'], limit=options['limit'])
+        prefix = '対象' if options['dry_run'] else '処理'
+        self.stdout.write(
+            f"{prefix}: 移動 {result['moved']} 件 / 移動元の削除 {result['sources_removed']} 件 / "
+            f".part の削除 {result['parts_removed']} 件 / 共有実体の復元 {result['blobs_restored']} 件"
+        )
+        for label in result['missing']:
+            self.stderr.write(f'ファイルが見つかりません: {label}')
+        if not options['dry_run'] and not result['missing']:
+            self.stdout.write(self.style.SUCCESS('承認済みファイルの状態は整合しています'))
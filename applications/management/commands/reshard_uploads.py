@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from applications.reshard import DEFAULT_BATCH_SIZE, MODELS, flat_files, reshard, sharded_name, verify
+
+
+class Command(BaseCommand):
+    help = "uploads/ 直下のファイルを uploads/ab/cd/ 形式へ移し、申請のファイル参照を付け替える (中断しても再実行で続きから)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='1バッチで処理する件数')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='今回処理する最大件数')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='対象件数と移動先の例を表示するのみ')
+        parser.add_argument('--verify', action='store_true',
+                            help='未移行件数と欠損ファイルを点検する (変更しない)')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            result = verify()
+            for model_name, pk, name in result['missing']:
+                self.stderr.write(f'ファイルが見つかりません: {model_name}:{pk} ({name})')
+            self.stdout.write(f"未移行: {result['flat']} 件 / 欠損: {len(result['missing'])} 件")
+            return
+        if options['dry_run']:
+            for model in MODELS:
+                queryset = flat_files(model).order_by('pk')
+                self.stdout.write(f'{model._meta.verbose_name}: 対象 {queryset.count()} 件')
+                for name in queryset.values_list('file', flat=True)[:5]:
+                    self.stdout.write(f'  {name} -> {sharded_name(name)}')
+            return
+
+        def report(model, size, totals):
+            self.stdout.write(
+                f"{model._meta.verbose_name}: {size} 件処理 (累計 移動 {totals['moved']} / "
+                f"付け替えのみ {totals['repointed']} / 欠損 {totals['missing']})"
+            )
+
+        totals = reshard(options['batch_size'], options['limit'], on_batch=report)
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['moved'] + totals['repointed']} 件を再配置しました (欠損 {totals['missing']} 件)"
+        ))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='application',
+            name='applicant',
+            field=models.CharField(max_length=150, verbose_name='申請者ユーザ名（LDAP）'),
+        ),
+        migrations.AlterField(
+            model_name='application',
+            name='approver',
+            field=models.CharField(max_length=150, verbose_name='承認者ユーザ名（LDAP）'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['approver', 'status', '-created_at'], name='app_approver_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['applicant', 'status', '-created_at'], name='app_applicant_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['approver', '-updated_at'], name='app_approver_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['-created_at'], name='app_created'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:46
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    Application = apps.get_model('applications', 'Application')
+    Counter = apps.get_model('applications', 'ApplicationStatusCounter')
+    rows = []
+    for field in ('applicant', 'approver'):
+        grouped = (
+            Application.objects.order_by()
+            .values(field, 'status')
+            .annotate(n=models.Count('id'))
+        )
+        rows.extend(
+            Counter(username=g[field], role=field, status=g['status'], count=g['n'])
+            for g in grouped
+        )
+    Counter.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0002_application_board_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150, verbose_name='ユーザ名（LDAP）')),
+                ('role', models.CharField(choices=[('applicant', '申請者'), ('approver', '承認者')], max_length=20, verbose_name='立場')),
+                ('status', models.CharField(choices=[('pending', '申請中'), ('approved', '承認済み'), ('rejected', '却下')], max_length=20, verbose_name='ステータス')),
+                ('count', models.IntegerField(default=0, verbose_name='件数')),
+            ],
+            options={
+                'verbose_name': '申請件数カウンタ',
+                'verbose_name_plural': '申請件数カウンタ',
+                'constraints': [models.UniqueConstraint(fields=('username', 'role', 'status'), name='app_counter_unique_key')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
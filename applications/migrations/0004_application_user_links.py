@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0003_application_status_counter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='applicant_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='applications_as_applicant', to=settings.AUTH_USER_MODEL, verbose_name='申請者'),
+        ),
+        migrations.AddField(
+            model_name='application',
+            name='approver_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='applications_as_approver', to=settings.AUTH_USER_MODEL, verbose_name='承認者'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# applicant_user / approver_user をユーザ名から埋めるデータマイグレーション
+#
+# 大量データでもテーブルを長時間ロックしないよう、id 順に BATCH_SIZE 件ずつ
+# 個別トランザクションで更新する (Migration.atomic = False)。
+# 途中で中断しても、再実行時は未設定 (NULL) の行だけが対象になるため再開可能。
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def backfill_user_links(apps, schema_editor):
+    Application = apps.get_model('applications', 'Application')
+    User = apps.get_model('users', 'User')
+    pending = Application.objects.filter(applicant_user__isnull=True) | Application.objects.filter(
+        approver_user__isnull=True
+    )
+    last_id = 0
+    while True:
+        batch = list(
+            pending.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'applicant', 'approver', 'applicant_user', 'approver_user')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        usernames = {a.applicant for a in batch} | {a.approver for a in batch}
+        user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        changed = []
+        for app in batch:
+            applicant_id = app.applicant_user_id or user_ids.get(app.applicant)
+            approver_id = app.approver_user_id or user_ids.get(app.approver)
+            if (applicant_id, approver_id) != (app.applicant_user_id, app.approver_user_id):
+                app.applicant_user_id = applicant_id
+                app.approver_user_id = approver_id
+                changed.append(app)
+        if changed:
+            with transaction.atomic():
+                Application.objects.bulk_update(changed, ['applicant_user', 'approver_user'])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('applications', '0004_application_user_links'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# 全文検索インデックス (SQLite: FTS5 + トリガー / PostgreSQL: GIN 式インデックス)
+# SQL はこの時点の内容で固定する (applications.search は後から変わるため参照しない)
+
+from django.db import migrations
+
+SEARCH_FIELDS = ('original_filename', 'comment', 'approval_comment')
+
+
+def _names(apps):
+    table = apps.get_model('applications', 'Application')._meta.db_table
+    return table, f'{table}_fts'
+
+
+def _sqlite_triggers(table, fts):
+    return {
+        f'{fts}_ai': f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, original_filename, comment, approval_comment)
+                VALUES (new.id, new.original_filename, new.comment, new.approval_comment);
+            END
+        """,
+        f'{fts}_ad': f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, original_filename, comment, approval_comment)
+                VALUES ('delete', old.id, old.original_filename, old.comment, old.approval_comment);
+            END
+        """,
+        f'{fts}_au': f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_au
+            AFTER UPDATE OF original_filename, comment, approval_comment ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, original_filename, comment, approval_comment)
+                VALUES ('delete', old.id, old.original_filename, old.comment, old.approval_comment);
+                INSERT INTO {fts}(rowid, original_filename, comment, approval_comment)
+                VALUES (new.id, new.original_filename, new.comment, new.approval_comment);
+            END
+        """,
+    }
+
+
+def _pg_index(table):
+    return f'{table}_fts_gin'
+
+
+def install(apps, schema_editor):
+    table, fts = _names(apps)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{', '.join(SEARCH_FIELDS)}, content='{table}', content_rowid='id', tokenize='trigram')"
+        )
+        for sql in _sqlite_triggers(table, fts).values():
+            schema_editor.execute(sql)
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {_pg_index(table)} ON {table} USING GIN ("
+            f"to_tsvector('simple', coalesce(original_filename, '') || ' ' || "
+            f"coalesce(comment, '') || ' ' || coalesce(approval_comment, '')))"
+        )
+
+
+def uninstall(apps, schema_editor):
+    table, fts = _names(apps)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for name in _sqlite_triggers(table, fts):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {_pg_index(table)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0005_backfill_application_user_links'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
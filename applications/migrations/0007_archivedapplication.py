@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:56
+
+import applications.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0006_application_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedApplication',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('applicant', models.CharField(max_length=150, verbose_name='申請者ユーザ名（LDAP）')),
+                ('approver', models.CharField(max_length=150, verbose_name='承認者ユーザ名（LDAP）')),
+                ('file', models.FileField(upload_to=applications.models.get_upload_path, verbose_name='ファイル')),
+                ('original_filename', models.CharField(max_length=255, verbose_name='元ファイル名')),
+                ('file_size', models.IntegerField(verbose_name='ファイルサイズ')),
+                ('content_type', models.CharField(max_length=100, verbose_name='コンテンツタイプ')),
+                ('comment', models.TextField(blank=True, verbose_name='申請コメント')),
+                ('approval_comment', models.TextField(blank=True, verbose_name='承認コメント')),
+                ('status', models.CharField(choices=[('pending', '申請中'), ('approved', '承認済み'), ('rejected', '却下')], max_length=20, verbose_name='ステータス')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日時')),
+                ('approved_at', models.DateTimeField(blank=True, null=True, verbose_name='承認日時')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='アーカイブ日時')),
+                ('applicant_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='申請者')),
+                ('approver_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='承認者')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済み申請',
+                'verbose_name_plural': 'アーカイブ済み申請',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='archived_app_created')],
+            },
+        ),
+    ]
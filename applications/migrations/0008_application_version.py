@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0007_archivedapplication'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='版'),
+        ),
+        migrations.AddField(
+            model_name='archivedapplication',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='版'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:07
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0008_application_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='application',
+            name='file_size',
+            field=models.BigIntegerField(verbose_name='ファイルサイズ'),
+        ),
+        migrations.AlterField(
+            model_name='archivedapplication',
+            name='file_size',
+            field=models.BigIntegerField(verbose_name='ファイルサイズ'),
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('approver', models.CharField(max_length=150, verbose_name='承認者ユーザ名（LDAP）')),
+                ('comment', models.TextField(blank=True, verbose_name='申請コメント')),
+                ('original_filename', models.CharField(max_length=255, verbose_name='元ファイル名')),
+                ('content_type', models.CharField(max_length=100, verbose_name='コンテンツタイプ')),
+                ('length', models.BigIntegerField(verbose_name='ファイルサイズ')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='受信済みバイト数')),
+                ('storage_name', models.CharField(max_length=255, verbose_name='保存先')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='書き込みロック期限')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='完了日時')),
+                ('application', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='applications.application', verbose_name='作成された申請')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='申請者')),
+            ],
+            options={
+                'verbose_name': 'アップロードセッション',
+                'verbose_name_plural': 'アップロードセッション',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,133 @@
+# 短い語 (1・2文字) 用の n-gram 索引と、PostgreSQL の部分一致 (pg_trgm) 索引への切り替え
+# SQL はこの時点の内容で固定する (applications.search は後から変わるため参照しない)
+
+from django.db import migrations
+
+SEARCH_FIELDS = ('original_filename', 'comment', 'approval_comment')
+NGRAM_SIZES = (1, 2)
+PG_NGRAM_FUNCTION = 'applications_search_ngrams'
+
+
+def _names(apps):
+    table = apps.get_model('applications', 'Application')._meta.db_table
+    return table, f'{table}_fts', f'{table}_ngram'
+
+
+def _ngram_insert(ngram, source, id_column, from_clause):
+    """source の各検索列から 1・2文字の n-gram (小文字化、空白を含むものは除く) を入れる INSERT"""
+    docs = ' UNION ALL '.join(
+        f"SELECT {id_column}, lower({source}{field}) FROM {from_clause}" for field in SEARCH_FIELDS
+    )
+    sizes = ' UNION ALL '.join(f"SELECT {n}" for n in NGRAM_SIZES)
+    return f"""
+        INSERT OR IGNORE INTO {ngram}(gram, application_id)
+        WITH RECURSIVE
+            doc(id, t) AS ({docs}),
+            pos(id, t, i) AS (
+                SELECT id, t, 1 FROM doc WHERE length(t) > 0
+                UNION ALL SELECT id, t, i + 1 FROM pos WHERE i < length(t)
+            ),
+            size(n) AS ({sizes})
+        SELECT DISTINCT substr(t, i, n), id FROM pos, size
+        WHERE i + n - 1 <= length(t) AND instr(substr(t, i, n), ' ') = 0
+    """
+
+
+def _sqlite_triggers(table, fts, ngram):
+    from_new = _ngram_insert(ngram, 'new.', 'new.id', '(SELECT 1)')
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, original_filename, comment, approval_comment)
+            VALUES (new.id, new.original_filename, new.comment, new.approval_comment);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, original_filename, comment, approval_comment)
+            VALUES ('delete', old.id, old.original_filename, old.comment, old.approval_comment);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au
+        AFTER UPDATE OF original_filename, comment, approval_comment ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, original_filename, comment, approval_comment)
+            VALUES ('delete', old.id, old.original_filename, old.comment, old.approval_comment);
+            INSERT INTO {fts}(rowid, original_filename, comment, approval_comment)
+            VALUES (new.id, new.original_filename, new.comment, new.approval_comment);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {ngram}_ai AFTER INSERT ON {table} BEGIN
+            {from_new};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {ngram}_ad AFTER DELETE ON {table} BEGIN
+            DELETE FROM {ngram} WHERE application_id = old.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {ngram}_au
+        AFTER UPDATE OF original_filename, comment, approval_comment ON {table} BEGIN
+            DELETE FROM {ngram} WHERE application_id = old.id;
+            {from_new};
+        END
+        """,
+    ]
+
+
+def install(apps, schema_editor):
+    table, fts, ngram = _names(apps)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # 途中のテーブル再作成で FTS のトリガーが消えている場合があるので、FTS 側も作り直す
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{', '.join(SEARCH_FIELDS)}, content='{table}', content_rowid='id', tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {ngram} ("
+            f"gram TEXT NOT NULL, application_id INTEGER NOT NULL, "
+            f"PRIMARY KEY (gram, application_id)) WITHOUT ROWID"
+        )
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {ngram}_application ON {ngram}(application_id)")
+        for sql in _sqlite_triggers(table, fts, ngram):
+            schema_editor.execute(sql)
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        schema_editor.execute(f"DELETE FROM {ngram}")
+        schema_editor.execute(_ngram_insert(ngram, '', 'id', table))
+    elif vendor == 'postgresql':
+        document = (
+            "lower(coalesce(original_filename, '') || ' ' || "
+            "coalesce(comment, '') || ' ' || coalesce(approval_comment, ''))"
+        )
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(f"""
+            CREATE OR REPLACE FUNCTION {PG_NGRAM_FUNCTION}(doc text) RETURNS text[]
+            LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+                SELECT coalesce(array_agg(DISTINCT substr(doc, i, n)), '{{}}')
+                FROM unnest(ARRAY[{', '.join(str(n) for n in NGRAM_SIZES)}]) AS n,
+                     generate_series(1, length(doc) - n + 1) AS i
+                WHERE position(' ' IN substr(doc, i, n)) = 0
+            $$
+        """)
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_fts_gin")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_search_trgm ON {table} USING GIN (({document}) gin_trgm_ops)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_search_ngram ON {table} "
+            f"USING GIN ({PG_NGRAM_FUNCTION}({document}))"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0010_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, migrations.RunPython.noop),
+    ]
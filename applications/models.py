@@ -1,10 +1,20 @@
-from django.db import models
+from django.db import connection, models, transaction, IntegrityError
+from django.db.models import F
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
+import hashlib
+import logging
 import os
 import uuid
-from datetime import datetime
+
+from .storage import is_approved_name
+
+logger = logging.getLogger(__name__)
+
+# ステータスカウンタの集計キー (申請者, 承認者, ステータス)
+COUNTER_FIELDS = ('applicant', 'approver', 'status')
 
 User = get_user_model()
 
@@ -16,11 +26,23 @@ class ApprovalStatus(models.TextChoices):
     REJECTED = 'rejected', '却下'
 
 
+def shard_name(directory, filename):
+    """directory/ab/cd/filename (ab, cd はファイル名の UUID 先頭4桁) の形にする
+
+    1ディレクトリのファイル数を抑えるため2階層 (各256通り) に分散させる。
+    UUID でないファイル名はファイル名のハッシュで振り分ける。
+    """
+    key = filename.replace('-', '')[:4].lower()
+    if len(key) < 4 or any(c not in '0123456789abcdef' for c in key):
+        key = hashlib.md5(filename.encode('utf-8')).hexdigest()[:4]
+    return f"{directory}/{key[:2]}/{key[2:4]}/{filename}"
+
+
 def get_upload_path(instance, filename):
-    """アップロードパスを生成する関数"""
+    """アップロードパスを生成する関数 (uploads/ab/cd/<uuid><拡張子>)"""
     ext = os.path.splitext(filename)[1]
     unique_filename = f"{uuid.uuid4()}{ext}"
-    return os.path.join('uploads', unique_filename)
+    return shard_name('uploads', unique_filename)
 
 
 class Application(models.Model):
@@ -37,6 +59,23 @@ class Application(models.Model):
         max_length=150,
         verbose_name="承認者ユーザ名（LDAP）"
     )
+    # ユーザ名に対応するローカルユーザ (JOIN / select_related 用。未登録ユーザは NULL)
+    applicant_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='applications_as_applicant',
+        verbose_name="申請者"
+    )
+    approver_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='applications_as_approver',
+        verbose_name="承認者"
+    )
     file = models.FileField(
         upload_to=get_upload_path,
         verbose_name="ファイル"
@@ -45,13 +84,20 @@ class Application(models.Model):
         max_length=255,
         verbose_name="元ファイル名"
     )
-    file_size = models.IntegerField(
+    file_size = models.BigIntegerField(
         verbose_name="ファイルサイズ"
     )
     content_type = models.CharField(
         max_length=100,
         verbose_name="コンテンツタイプ"
     )
+    # 内容の SHA-256 (16進)。空は内容アドレス方式導入前のファイル
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name="SHA-256"
+    )
     comment = models.TextField(
         blank=True,
         verbose_name="申請コメント"
@@ -79,40 +125,628 @@ class Application(models.Model):
         blank=True,
         verbose_name="承認日時"
     )
+    # 楽観的排他制御用の版番号 (applications.transitions の条件付き UPDATE で照合)
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name="版"
+    )
     
     class Meta:
         verbose_name = "申請"
         verbose_name_plural = "申請"
         ordering = ['-created_at']
-    
+        indexes = [
+            # 承認者ボード / 承認待ち一覧 (approver + status で絞り込み、作成日時降順)
+            models.Index(
+                fields=['approver', 'status', '-created_at'],
+                name='app_approver_status_created',
+            ),
+            # 申請者ボード / 自分の申請一覧
+            models.Index(
+                fields=['applicant', 'status', '-created_at'],
+                name='app_applicant_status_created',
+            ),
+            # 承認履歴 (approver で絞り込み、更新日時降順)
+            models.Index(
+                fields=['approver', '-updated_at'],
+                name='app_approver_updated',
+            ),
+            # 管理者一覧 (全件を作成日時降順)
+            models.Index(
+                fields=['-created_at'],
+                name='app_created',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.applicant}の申請 ({self.id})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_counter_key()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # 読み直した値を基準にする (古いキーのままだと次の保存で別のカウンタを増減してしまう)
+        if fields is None:
+            self._remember_counter_key()
+            return
+        saved = dict(getattr(self, '_saved_counter_values', None) or {})
+        saved.update(
+            (name, self.__dict__[name]) for name in COUNTER_FIELDS if name in fields and name in self.__dict__
+        )
+        self._saved_counter_values = saved
+
+    def _counter_key(self):
+        return tuple(getattr(self, name) for name in COUNTER_FIELDS)
+
+    def _remember_counter_key(self):
+        """カウンタ差分計算用に DB 上の (申請者, 承認者, ステータス) を保持
+
+        読み込み済みの列だけを見る。遅延列 (only / defer) に触れると
+        refresh_from_db → from_db → ここ、と再帰するため、欠けた列は
+        _previous_counter_key で必要になった時点で取得する。
+        """
+        self._saved_counter_values = {
+            name: self.__dict__[name] for name in COUNTER_FIELDS if name in self.__dict__
+        }
+        # カードのフラグメントキャッシュ版 (保存時に旧版を破棄する)
+        self._saved_card_version = self.__dict__.get('updated_at')
+
+    def _previous_counter_key(self):
+        """保存前の DB 上の (申請者, 承認者, ステータス)。遅延していた列はここで DB から補う"""
+        saved = getattr(self, '_saved_counter_values', None)
+        if saved is None:
+            return None
+        missing = [name for name in COUNTER_FIELDS if name not in saved]
+        if missing:
+            row = (
+                type(self)._base_manager.using(self._state.db or 'default')
+                .filter(pk=self.pk).values(*missing).first()
+            )
+            if row is None:
+                return None
+            saved.update(row)
+        return tuple(saved[name] for name in COUNTER_FIELDS)
+
+    def _link_users(self, previous):
+        """applicant / approver のユーザ名から FK を解決 (新規作成またはユーザ名変更時のみ)
+
+        未登録ユーザのままの申請は保存のたびに引き直さず、ユーザ作成時に
+        link_applications_to_user で紐づける。
+        """
+        prev_applicant, prev_approver = (previous or (None, None, None))[:2]
+        if prev_applicant != self.applicant:
+            self.applicant_user = User.objects.filter(username=self.applicant).first()
+        if prev_approver != self.approver:
+            self.approver_user = User.objects.filter(username=self.approver).first()
+
+    def _store_file_content(self):
+        """未保存のアップロードファイルを内容アドレス方式の保存先へ置き、参照を1つ取る
+
+        同じ内容のファイルが既にあれば実体は共有される (StoredBlob.ref_count)。
+        """
+        from .blobs import store_file
+        blob = store_file(self.file)
+        self.file.name = blob.name
+        self.file._committed = True
+        self.sha256 = blob.sha256
+
+    @property
+    def etag(self):
+        """内容ハッシュ由来の強い ETag (ハッシュ未計算なら None)"""
+        return f'"{self.sha256}"' if self.sha256 else None
+
+    def save(self, *args, **kwargs):
+        """保存と同一トランザクションでステータスカウンタを更新する
+
+        全列保存では version を進め、読み込み後に遷移しようとする側を競合させる。
+        承認日時もここで埋めるため post_save での再保存は不要。
+        """
+        previous = None if self._state.adding else self._previous_counter_key()
+        saved_values = getattr(self, '_saved_counter_values', None)
+        saved_version = self.version
+        if kwargs.get('update_fields') is None:
+            self._link_users(previous)
+            if not self._state.adding:
+                self.version += 1
+            if self.status == ApprovalStatus.APPROVED and self.approved_at is None:
+                self.approved_at = timezone.now()
+        current = self._counter_key()
+        # post_save で遷移 (申請中→承認 等) を判定するため保持
+        self._status_transition = (
+            (previous[2], current[2]) if previous is not None and previous[2] != current[2] else None
+        )
+        # post_save シグナル内の再保存で二重計上しないよう先に更新しておく
+        self._saved_counter_values = dict(zip(COUNTER_FIELDS, current))
+        try:
+            with transaction.atomic():
+                if self.file and not self.file._committed:
+                    self._store_file_content()
+                if previous != current:
+                    if previous is not None:
+                        ApplicationStatusCounter.apply(*previous, delta=-1)
+                    ApplicationStatusCounter.apply(*current, delta=1)
+                super().save(*args, **kwargs)
+        except Exception:
+            self._saved_counter_values = saved_values
+            self.version = saved_version
+            raise
+        previous_version = getattr(self, '_saved_card_version', None)
+        if previous_version is not None and previous_version != self.updated_at:
+            from .cards import invalidate_card_fragments
+            invalidate_card_fragments(self.pk, previous_version)
+        self._saved_card_version = self.updated_at
+
+
+class CounterRole(models.TextChoices):
+    """カウンタの集計軸 (ユーザの立場)"""
+    APPLICANT = 'applicant', '申請者'
+    APPROVER = 'approver', '承認者'
+
+
+class ApplicationStatusCounter(models.Model):
+    """ユーザ×立場×ステータスごとの申請件数
+
+    Application の保存/削除と同一トランザクションで増減させる。
+    集計が壊れた場合は `rebuild_application_counters` コマンドで再構築する。
+    """
+    username = models.CharField(
+        max_length=150,
+        verbose_name="ユーザ名（LDAP）"
+    )
+    role = models.CharField(
+        max_length=20,
+        choices=CounterRole.choices,
+        verbose_name="立場"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=ApprovalStatus.choices,
+        verbose_name="ステータス"
+    )
+    count = models.IntegerField(
+        default=0,
+        verbose_name="件数"
+    )
+
+    class Meta:
+        verbose_name = "申請件数カウンタ"
+        verbose_name_plural = "申請件数カウンタ"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['username', 'role', 'status'],
+                name='app_counter_unique_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.username} ({self.role}/{self.status}): {self.count}"
+
+    @classmethod
+    def apply(cls, applicant, approver, status, delta):
+        """申請1件分の増減を申請者側・承認者側の両カウンタに反映"""
+        cls._add(applicant, CounterRole.APPLICANT, status, delta)
+        cls._add(approver, CounterRole.APPROVER, status, delta)
+
+    @classmethod
+    def _add(cls, username, role, status, delta):
+        key = {'username': username, 'role': role, 'status': status}
+        if cls.objects.filter(**key).update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(count=delta, **key)
+        except IntegrityError:
+            # 並行して同じキーが作成された場合は UPDATE でやり直す
+            cls.objects.filter(**key).update(count=F('count') + delta)
+
+    @classmethod
+    def counts_for(cls, username, role):
+        """{status: 件数} を全ステータス分 (0 埋め) で返す"""
+        counts = dict.fromkeys(ApprovalStatus.values, 0)
+        counts.update(
+            cls.objects.filter(username=username, role=role).values_list('status', 'count')
+        )
+        counts['total'] = sum(counts[s] for s in ApprovalStatus.values)
+        return counts
+
+    @classmethod
+    def has_any(cls, username, role):
+        return cls.objects.filter(username=username, role=role, count__gt=0).exists()
+
+    @classmethod
+    def global_counts(cls):
+        """全申請のステータス別件数 (申請者側カウンタの合計)"""
+        rows = (
+            cls.objects.filter(role=CounterRole.APPLICANT)
+            .values('status')
+            .annotate(total=models.Sum('count'))
+        )
+        counts = dict.fromkeys(ApprovalStatus.values, 0)
+        counts.update({row['status']: row['total'] for row in rows})
+        counts['total'] = sum(counts[s] for s in ApprovalStatus.values)
+        return counts
+
+    @classmethod
+    def rebuild(cls):
+        """Application テーブルから全カウンタを再集計し、ずれていた行だけ書き直す。修正した行数を返す
+
+        集計中に増減が入るとその分を取りこぼす (または二重に数える) ため、カウンタ表を
+        書き込み禁止にしてから集計する。増減中のトランザクションはロック取得時に
+        コミットを待ち、以後の増減は再集計のコミット後に反映される。
+        行の削除・再作成はせず、値の違う行の更新と足りない行の追加だけを行う。
+        """
+        with transaction.atomic():
+            cls._lock_for_rebuild()
+            expected = {}
+            for field, role in (('applicant', CounterRole.APPLICANT), ('approver', CounterRole.APPROVER)):
+                grouped = (
+                    Application.objects.order_by()
+                    .values(field, 'status')
+                    .annotate(n=models.Count('id'))
+                )
+                for g in grouped:
+                    expected[(g[field], role, g['status'])] = g['n']
+            stale = []
+            for counter in cls.objects.all():
+                count = expected.pop((counter.username, counter.role, counter.status), 0)
+                if counter.count != count:
+                    counter.count = count
+                    stale.append(counter)
+            cls.objects.bulk_update(stale, ['count'], batch_size=500)
+            cls.objects.bulk_create(
+                [
+                    cls(username=username, role=role, status=status, count=count)
+                    for (username, role, status), count in expected.items()
+                ],
+                batch_size=500,
+            )
+        fixed = len(stale) + len(expected)
+        if fixed:
+            logger.warning("Application counters drifted | fixed_rows=%s", fixed)
+        return fixed
+
+    @classmethod
+    def _lock_for_rebuild(cls):
+        """再集計の間、カウンタへの増減を止める"""
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # 読み取りは通し、UPDATE / INSERT だけを待たせる
+                cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            elif connection.vendor == 'sqlite':
+                # 書き込み文で DB の書き込みロックを先に取る (以後の書き込みは待つ)
+                cursor.execute(f"UPDATE {table} SET count = count WHERE 0")
+            else:
+                list(cls.objects.select_for_update().values_list('pk', flat=True))
+
+
+class ArchivedApplication(models.Model):
+    """アーカイブ済み申請 (コールド領域)
+
+    一定期間を過ぎた承認済み/却下済みの申請を `archive_applications` コマンドで
+    Application から移す。ID は元の申請と同じ値を保持する。
+    カンバンボード等のホットなクエリはこのテーブルを参照しない。
+    """
+    id = models.IntegerField(
+        primary_key=True,
+        verbose_name="ID"
+    )
+    applicant = models.CharField(
+        max_length=150,
+        verbose_name="申請者ユーザ名（LDAP）"
+    )
+    approver = models.CharField(
+        max_length=150,
+        verbose_name="承認者ユーザ名（LDAP）"
+    )
+    applicant_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="申請者"
+    )
+    approver_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="承認者"
+    )
+    file = models.FileField(
+        upload_to=get_upload_path,
+        verbose_name="ファイル"
+    )
+    original_filename = models.CharField(
+        max_length=255,
+        verbose_name="元ファイル名"
+    )
+    file_size = models.BigIntegerField(
+        verbose_name="ファイルサイズ"
+    )
+    content_type = models.CharField(
+        max_length=100,
+        verbose_name="コンテンツタイプ"
+    )
+    # 内容の SHA-256 (16進)。空は内容アドレス方式導入前のファイル
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name="SHA-256"
+    )
+    comment = models.TextField(
+        blank=True,
+        verbose_name="申請コメント"
+    )
+    approval_comment = models.TextField(
+        blank=True,
+        verbose_name="承認コメント"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=ApprovalStatus.choices,
+        verbose_name="ステータス"
+    )
+    # 元の日時をそのまま保持するため auto_now / auto_now_add は使わない
+    created_at = models.DateTimeField(
+        verbose_name="作成日時"
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="更新日時"
+    )
+    approved_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="承認日時"
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name="版"
+    )
+    archived_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="アーカイブ日時"
+    )
+
+    is_archived = True
+
+    class Meta:
+        verbose_name = "アーカイブ済み申請"
+        verbose_name_plural = "アーカイブ済み申請"
+        ordering = ['-created_at']
+        indexes = [
+            # 管理者一覧 (アーカイブ表示時)
+            models.Index(
+                fields=['-created_at'],
+                name='archived_app_created',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.applicant}の申請 ({self.id}・アーカイブ)"
+
+    @classmethod
+    def from_application(cls, application, archived_at=None):
+        """Application の全列を写したアーカイブ行を作る (未保存)"""
+        values = {
+            field.attname: getattr(application, field.attname)
+            for field in Application._meta.concrete_fields
+        }
+        return cls(archived_at=archived_at or timezone.now(), **values)
+
+
+class StoredBlob(models.Model):
+    """内容アドレス方式で保存したファイル実体と参照数
+
+    Application / ArchivedApplication の sha256 が同じ行は同じ実体 (name) を共有する。
+    参照数は申請の作成と同一トランザクションで増やし、削除時に減らす。
+    0 になった実体はコミット後に削除される (applications.blobs)。
+    """
+    sha256 = models.CharField(
+        max_length=64,
+        primary_key=True,
+        verbose_name="SHA-256"
+    )
+    name = models.CharField(
+        max_length=255,
+        verbose_name="保存先"
+    )
+    size = models.BigIntegerField(
+        verbose_name="ファイルサイズ"
+    )
+    ref_count = models.IntegerField(
+        default=0,
+        verbose_name="参照数"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="作成日時"
+    )
+
+    class Meta:
+        verbose_name = "ファイル実体"
+        verbose_name_plural = "ファイル実体"
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count})"
+
+    @classmethod
+    def acquire(cls, sha256, name, size, count=1):
+        """参照を count 個増やす (行がなければ作成)"""
+        if cls.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + count):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(sha256=sha256, name=name, size=size, ref_count=count)
+        except IntegrityError:
+            # 並行して同じ内容が登録された場合は UPDATE でやり直す
+            cls.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + count)
+
+    @classmethod
+    def release(cls, sha256, count=1):
+        """参照を count 個減らす。実体の削除はコミット後に参照数を再確認して行う"""
+        if not sha256:
+            return
+        cls.objects.filter(sha256=sha256).update(ref_count=F('ref_count') - count)
+        from .blobs import delete_if_unreferenced
+        transaction.on_commit(lambda: delete_if_unreferenced(sha256))
+
+
+class UploadSession(models.Model):
+    """分割・再開可能アップロード (tus 方式) のセッション
+
+    チャンクは最終保存先 (storage_name) に直接追記し、offset までが確定済み。
+    offset が length に達すると Application を作成して application に紐づける。
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name="申請者"
+    )
+    approver = models.CharField(
+        max_length=150,
+        verbose_name="承認者ユーザ名（LDAP）"
+    )
+    comment = models.TextField(
+        blank=True,
+        verbose_name="申請コメント"
+    )
+    original_filename = models.CharField(
+        max_length=255,
+        verbose_name="元ファイル名"
+    )
+    content_type = models.CharField(
+        max_length=100,
+        verbose_name="コンテンツタイプ"
+    )
+    length = models.BigIntegerField(
+        verbose_name="ファイルサイズ"
+    )
+    offset = models.BigIntegerField(
+        default=0,
+        verbose_name="受信済みバイト数"
+    )
+    storage_name = models.CharField(
+        max_length=255,
+        verbose_name="保存先"
+    )
+    # チャンク書き込み中の排他 (期限切れなら次の PATCH が取得できる)
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="書き込みロック期限"
+    )
+    application = models.OneToOneField(
+        Application,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_session',
+        verbose_name="作成された申請"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="作成日時"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="更新日時"
+    )
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="完了日時"
+    )
+
+    class Meta:
+        verbose_name = "アップロードセッション"
+        verbose_name_plural = "アップロードセッション"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.original_filename} ({self.offset}/{self.length})"
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
 
 # シグナル: 申請作成時と ステータス変更時の処理
 @receiver(post_save, sender=Application)
 def handle_application_changes(sender, instance, created, **kwargs):
-    """申請の作成・変更時の処理"""
-    from django.conf import settings
-    notifications_on = getattr(settings, 'NOTIFICATIONS_ENABLED', True)
+    """申請の作成・ステータス変更を通知アウトボックスに登録 (配信はコミット後)"""
+    from notifications.models import NotificationType
+    from notifications.outbox import enqueue
     if created:
-        if notifications_on:
-            from notifications.services import NotificationService
-            NotificationService.notify_new_application(instance)
-    elif not created:
-        # ステータス変更時の処理
-        if instance.status == ApprovalStatus.APPROVED and not instance.approved_at:
-            # 承認時の処理
-            instance.approved_at = datetime.now()
-            instance.save(update_fields=['approved_at'])
-            
-            # 承認済みディレクトリへの移動処理
-            # move_file_to_approved_directory(instance)
-            
-            if notifications_on:
-                from notifications.services import NotificationService
-                NotificationService.notify_application_approved(instance)
-            
-        elif instance.status == ApprovalStatus.REJECTED and notifications_on:
-            from notifications.services import NotificationService
-            NotificationService.notify_application_rejected(instance)
+        enqueue(instance, NotificationType.NEW_APPLICATION)
+        return
+    # ステータスが変わった保存のみ (承認日時は save() で設定済み)
+    transition = getattr(instance, '_status_transition', None)
+    if transition is None:
+        return
+    if instance.status == ApprovalStatus.APPROVED:
+        # 承認済みディレクトリへの移動はコミット後にワーカーが行う
+        from .approved_files import schedule_moves
+        schedule_moves([instance])
+        enqueue(instance, NotificationType.APPLICATION_APPROVED)
+    elif instance.status == ApprovalStatus.REJECTED:
+        enqueue(instance, NotificationType.APPLICATION_REJECTED)
+
+
+@receiver(post_save, sender=User)
+def link_applications_to_user(sender, instance, created, **kwargs):
+    """後から作成されたユーザ (初回 LDAP ログイン等) を既存の申請に紐づける"""
+    if not created:
+        return
+    # update() なので version・updated_at は変えない
+    Application.objects.filter(applicant=instance.username, applicant_user__isnull=True).update(
+        applicant_user=instance
+    )
+    Application.objects.filter(approver=instance.username, approver_user__isnull=True).update(
+        approver_user=instance
+    )
+
+
+@receiver(pre_delete, sender=Application)
+def remember_deleted_counter_key(sender, instance, **kwargs):
+    """削除前に DB 上のキーとファイル列を確定させる (削除後は遅延列を読み込めない)"""
+    deferred = instance.get_deferred_fields() & {'sha256', 'file'}
+    if deferred:
+        instance.refresh_from_db(fields=sorted(deferred))
+    instance._deleted_counter_key = instance._previous_counter_key()
+
+
+@receiver(post_delete, sender=Application)
+def handle_application_deleted(sender, instance, **kwargs):
+    """削除時にカウンタを減算し、ファイル実体の参照を手放す (QuerySet.delete でも削除トランザクション内で呼ばれる)"""
+    key = getattr(instance, '_deleted_counter_key', None) or instance._counter_key()
+    ApplicationStatusCounter.apply(*key, delta=-1)
+    _release_file(instance)
+
+
+@receiver(post_delete, sender=ArchivedApplication)
+def handle_archived_application_deleted(sender, instance, **kwargs):
+    """アーカイブ行の削除でファイル実体の参照を手放す"""
+    _release_file(instance)
+
+
+def _release_file(instance):
+    """実体の参照を手放し、承認済みディレクトリの申請専用ファイルは参照が無くなればコミット後に消す"""
+    StoredBlob.release(instance.sha256)
+    name = instance.file.name
+    if instance.sha256 and is_approved_name(name):
+        from .approved_files import remove_if_unreferenced
+        transaction.on_commit(lambda: remove_if_unreferenced(name))
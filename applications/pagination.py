@@ -0,0 +1,188 @@
+"""申請一覧のページネーション
+
+既定は従来どおりのページ番号 (OFFSET) 方式。`?cursor=` / `?pagination=cursor`
+指定時、または settings.APPLICATIONS_KEYSET_PAGINATION = True の場合は
+(created_at, id) をキーにしたキーセット方式に切り替え、COUNT(*) と深い OFFSET
+走査を避ける。HTML 一覧と REST API で同じカーソル形式を共有する。
+"""
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+CURSOR_PARAM = 'cursor'
+MODE_PARAM = 'pagination'
+
+_FORWARD = 'n'
+_BACKWARD = 'p'
+
+
+def encode_cursor(direction, value, pk):
+    raw = f"{direction}|{value.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """カーソル文字列を (direction, (value, pk)) に戻す。不正な場合は ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, value, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        if direction not in (_FORWARD, _BACKWARD):
+            raise ValueError(direction)
+        return direction, (datetime.fromisoformat(value), int(pk))
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {token!r}") from e
+
+
+def cursor_after(obj, field='created_at'):
+    """obj の直後 (降順で次) から始まるページを指すカーソル"""
+    return encode_cursor(_FORWARD, getattr(obj, field), obj.pk)
+
+
+def use_keyset(request):
+    """このリクエストでキーセット方式を使うかどうか"""
+    params = request.GET
+    return (
+        CURSOR_PARAM in params
+        or params.get(MODE_PARAM) == 'cursor'
+        or getattr(settings, 'APPLICATIONS_KEYSET_PAGINATION', False)
+    )
+
+
+class KeysetPage:
+    """キーセット方式の1ページ分 (テンプレートからは Page と同様に反復可能)"""
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous, field):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.field = field
+        self.next_url = None
+        self.previous_url = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _cursor_for(self, direction, obj):
+        return encode_cursor(direction, getattr(obj, self.field), obj.pk)
+
+    @property
+    def next_cursor(self):
+        if not (self._has_next and self.object_list):
+            return None
+        return self._cursor_for(_FORWARD, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not (self._has_previous and self.object_list):
+            return None
+        return self._cursor_for(_BACKWARD, self.object_list[0])
+
+
+def paginate_keyset(queryset, token, per_page, field='created_at'):
+    """(field, id) 降順のキーセットで1ページ分を取得する。
+
+    per_page + 1 件だけ読み、次ページの有無を COUNT なしで判定する。
+    """
+    direction, position = (_FORWARD, None)
+    if token:
+        direction, position = decode_cursor(token)
+
+    qs = queryset.order_by(f'-{field}', '-id')
+    if position is not None:
+        value, pk = position
+        if direction == _FORWARD:
+            qs = qs.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+        else:
+            qs = qs.filter(
+                Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+            ).order_by(field, 'id')
+
+    rows = list(qs[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == _BACKWARD:
+        rows.reverse()
+        return KeysetPage(rows, has_next=True, has_previous=has_more, field=field)
+    return KeysetPage(rows, has_next=has_more, has_previous=position is not None, field=field)
+
+
+def paginate_request(request, queryset, per_page=20, field='created_at'):
+    """HTML 一覧用。モードに応じて Page または KeysetPage を返す"""
+    if not use_keyset(request):
+        return Paginator(queryset, per_page).get_page(request.GET.get('page'))
+    try:
+        page = paginate_keyset(queryset, request.GET.get(CURSOR_PARAM), per_page, field)
+    except ValueError:
+        # 壊れたカーソルは先頭ページとして扱う
+        page = paginate_keyset(queryset, None, per_page, field)
+
+    def build_url(token):
+        params = request.GET.copy()
+        params.pop('page', None)
+        params[CURSOR_PARAM] = token
+        return f"?{params.urlencode()}"
+
+    if page.next_cursor:
+        page.next_url = build_url(page.next_cursor)
+    if page.previous_cursor:
+        page.previous_url = build_url(page.previous_cursor)
+    return page
+
+
+class ApplicationPagination(PageNumberPagination):
+    """REST API 用。既定はページ番号方式、カーソル指定時はキーセット方式"""
+    ordering_field = 'created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_page = None
+        if not use_keyset(request):
+            return super().paginate_queryset(queryset, request, view)
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        try:
+            self.keyset_page = paginate_keyset(
+                queryset, request.query_params.get(CURSOR_PARAM), page_size, self.ordering_field
+            )
+        except ValueError:
+            raise NotFound('無効なカーソルです。')
+        self.request = request
+        return list(self.keyset_page)
+
+    def _keyset_link(self, token):
+        if token is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, CURSOR_PARAM, token)
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self._keyset_link(self.keyset_page.next_cursor),
+            'previous': self._keyset_link(self.keyset_page.previous_cursor),
+            'results': data,
+        })
@@ -0,0 +1,101 @@
+"""フラットな uploads/ 配下のファイルを uploads/ab/cd/ 形式へ移す (再配置)
+
+対象は内容アドレス方式 (blobs/) 導入前から残る uploads/<uuid>.<拡張子> と、
+それが承認済みディレクトリへ移った approved/uploads/<uuid>.<拡張子>。
+
+1件ごとに「rename → FileField の付け替え (QuerySet.update)」の順で行い、
+処理済みの行は対象から外れるので、中断しても再実行すれば続きから進む。
+rename 後・付け替え前に止まった行は、移動先にだけファイルがあることを
+確認して付け替えのみ行う。
+"""
+import logging
+import os
+import re
+
+from django.core.files.storage import default_storage
+from django.db.models import Q
+
+from .models import Application, ArchivedApplication, shard_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+MODELS = (Application, ArchivedApplication)
+
+_FLAT_RE = re.compile(r'^(?P<directory>(?:approved/)?uploads)/(?P<filename>[^/]+)$')
+
+
+def sharded_name(name):
+    """フラットな名前の移動先。対象外 (分散済み・blobs/ 等) は None"""
+    match = _FLAT_RE.match(name)
+    if not match:
+        return None
+    return shard_name(match['directory'], match['filename'])
+
+
+def flat_files(model):
+    """uploads/ 直下 (または approved/uploads/ 直下) を参照している行"""
+    return model.objects.filter(
+        Q(file__regex=r'^uploads/[^/]+$') | Q(file__regex=r'^approved/uploads/[^/]+$')
+    )
+
+
+def reshard_one(obj):
+    """1件を移す。'moved' / 'repointed' (移動済みで付け替えのみ) / 'missing' を返す"""
+    name = obj.file.name
+    target = sharded_name(name)
+    src, dst = default_storage.path(name), default_storage.path(target)
+    if os.path.exists(src):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.rename(src, dst)
+        outcome = 'moved'
+    elif os.path.exists(dst):
+        outcome = 'repointed'
+    else:
+        return 'missing'
+    # save() は通さない (version・updated_at を変えない)
+    type(obj).objects.filter(pk=obj.pk, file=name).update(file=target)
+    obj.file.name = target
+    return outcome
+
+
+def reshard(batch_size=DEFAULT_BATCH_SIZE, limit=None, on_batch=None):
+    """フラットな配置のファイルを batch_size 件ずつ移し、{'moved', 'repointed', 'missing'} の件数を返す
+
+    欠損ファイルの行は対象に残るため、pk の昇順に進めて同じ行を再処理しない。
+    """
+    totals = {'moved': 0, 'repointed': 0, 'missing': 0}
+    for model in MODELS:
+        last_pk = 0
+        while limit is None or sum(totals.values()) < limit:
+            size = batch_size if limit is None else min(batch_size, limit - sum(totals.values()))
+            batch = list(flat_files(model).filter(pk__gt=last_pk).order_by('pk')[:size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for obj in batch:
+                outcome = reshard_one(obj)
+                totals[outcome] += 1
+                if outcome == 'missing':
+                    logger.warning("Reshard source missing | %s=%s name=%s",
+                                   model._meta.model_name, obj.pk, obj.file.name)
+            if on_batch is not None:
+                on_batch(model, len(batch), totals)
+    return totals
+
+
+def verify():
+    """現状の点検。{'flat': 未移行件数, 'missing': [(モデル名, pk, 名前)...]} を返す
+
+    missing は uploads/ 配下 (分散済みを含む) を参照しているのにファイルがない行。
+    """
+    result = {'flat': 0, 'missing': []}
+    for model in MODELS:
+        result['flat'] += flat_files(model).count()
+        rows = model.objects.filter(
+            Q(file__startswith='uploads/') | Q(file__startswith='approved/uploads/')
+        ).values_list('pk', 'file')
+        for pk, name in rows.iterator():
+            if not os.path.exists(default_storage.path(name)):
+                result['missing'].append((model._meta.model_name, pk, name))
+    return result
@@ -0,0 +1,233 @@
+"""申請の全文検索 (元ファイル名 / 申請コメント / 承認コメント)
+
+どのバックエンドでも「空白区切りの各語を部分文字列として含む」(大文字小文字は区別しない)
+で一致させ、語の長さで索引を使い分ける。
+
+- SQLite: 3文字以上の語は FTS5 仮想テーブル (trigram トークナイザ、外部コンテンツ方式)。
+  3文字未満の語は trigram に一致しないため、1・2文字の n-gram 表 (gram, 申請ID) を引く。
+  どちらもトリガーで applications_application と同期する。
+- PostgreSQL: 3文字以上の語は pg_trgm の GIN 式インデックスを使う LIKE。
+  3文字未満の語は 1・2文字の n-gram 配列の GIN 式インデックスを使う包含検索。
+- その他 (および ArchivedApplication 等の別テーブル): icontains にフォールバック。
+
+2文字の語 (「至急」「経理」等) が多いため、短い語でも全件走査にならないようにしている。
+
+SQLite はテーブル再作成を伴う ALTER でトリガーが消えるため、post_migrate で
+install_search_index() を再実行し、欠けていれば作り直して索引を再構築する。
+"""
+import logging
+
+from django.db import connection as default_connection, connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'applications_application'
+FTS_TABLE = 'applications_application_fts'
+NGRAM_TABLE = 'applications_application_ngram'
+SEARCH_FIELDS = ('original_filename', 'comment', 'approval_comment')
+# trigram は3文字未満の語に一致しないため、短い語は n-gram 索引で引く
+MIN_TRIGRAM_LENGTH = 3
+NGRAM_SIZES = (1, 2)
+
+
+def _ngram_select(source, id_column):
+    """source の各検索列から 1・2文字の n-gram (小文字化、空白を含むものは除く) を作る SELECT"""
+    docs = ' UNION ALL '.join(
+        f"SELECT {id_column}, lower({source}{field}) FROM {{from_clause}}" for field in SEARCH_FIELDS
+    )
+    sizes = ' UNION ALL '.join(f"SELECT {n}" for n in NGRAM_SIZES)
+    return f"""
+        WITH RECURSIVE
+            doc(id, t) AS ({docs}),
+            pos(id, t, i) AS (
+                SELECT id, t, 1 FROM doc WHERE length(t) > 0
+                UNION ALL SELECT id, t, i + 1 FROM pos WHERE i < length(t)
+            ),
+            size(n) AS ({sizes})
+        SELECT DISTINCT substr(t, i, n), id FROM pos, size
+        WHERE i + n - 1 <= length(t) AND instr(substr(t, i, n), ' ') = 0
+    """
+
+
+def _ngram_insert(source, id_column, from_clause):
+    select = _ngram_select(source, id_column).replace('{from_clause}', from_clause)
+    return f"INSERT OR IGNORE INTO {NGRAM_TABLE}(gram, application_id) {select}"
+
+
+_NGRAM_FROM_NEW = _ngram_insert('new.', 'new.id', '(SELECT 1)')
+
+_SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, original_filename, comment, approval_comment)
+            VALUES (new.id, new.original_filename, new.comment, new.approval_comment);
+        END
+    """,
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, original_filename, comment, approval_comment)
+            VALUES ('delete', old.id, old.original_filename, old.comment, old.approval_comment);
+        END
+    """,
+    # ステータス変更等では FTS を触らないよう対象列の更新時のみ
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF original_filename, comment, approval_comment ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, original_filename, comment, approval_comment)
+            VALUES ('delete', old.id, old.original_filename, old.comment, old.approval_comment);
+            INSERT INTO {FTS_TABLE}(rowid, original_filename, comment, approval_comment)
+            VALUES (new.id, new.original_filename, new.comment, new.approval_comment);
+        END
+    """,
+    f'{NGRAM_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {NGRAM_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+            {_NGRAM_FROM_NEW};
+        END
+    """,
+    f'{NGRAM_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {NGRAM_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+            DELETE FROM {NGRAM_TABLE} WHERE application_id = old.id;
+        END
+    """,
+    f'{NGRAM_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {NGRAM_TABLE}_au
+        AFTER UPDATE OF original_filename, comment, approval_comment ON {TABLE} BEGIN
+            DELETE FROM {NGRAM_TABLE} WHERE application_id = old.id;
+            {_NGRAM_FROM_NEW};
+        END
+    """,
+}
+
+_PG_DOCUMENT = (
+    "lower(coalesce(original_filename, '') || ' ' || "
+    "coalesce(comment, '') || ' ' || coalesce(approval_comment, ''))"
+)
+_PG_NGRAM_FUNCTION = 'applications_search_ngrams'
+_PG_NGRAMS = f"{_PG_NGRAM_FUNCTION}({_PG_DOCUMENT})"
+_PG_TRGM_INDEX = f'{TABLE}_search_trgm'
+_PG_NGRAM_INDEX = f'{TABLE}_search_ngram'
+# 旧版の to_tsvector('simple', ...) 索引 (単語単位の一致で SQLite と結果が異なっていた)
+_PG_LEGACY_INDEX = f'{TABLE}_fts_gin'
+
+
+def install_search_index(connection=None):
+    """検索用インデックスを作成 (冪等)。SQLite で欠けていたトリガーがあれば索引を再構築する"""
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            if TABLE not in connection.introspection.table_names(cursor):
+                return
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND "
+                "(name LIKE %s OR name LIKE %s)",
+                [f'{FTS_TABLE}%', f'{NGRAM_TABLE}%'],
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = [name for name in (FTS_TABLE, NGRAM_TABLE, *_SQLITE_TRIGGERS) if name not in existing]
+            if not missing:
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"{', '.join(SEARCH_FIELDS)}, content='{TABLE}', content_rowid='id', tokenize='trigram')"
+            )
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {NGRAM_TABLE} ("
+                f"gram TEXT NOT NULL, application_id INTEGER NOT NULL, "
+                f"PRIMARY KEY (gram, application_id)) WITHOUT ROWID"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {NGRAM_TABLE}_application ON {NGRAM_TABLE}(application_id)"
+            )
+            for sql in _SQLITE_TRIGGERS.values():
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            cursor.execute(f"DELETE FROM {NGRAM_TABLE}")
+            cursor.execute(_ngram_insert('', 'id', TABLE))
+            logger.info("Search index (re)built | missing=%s", missing)
+        elif connection.vendor == 'postgresql':
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION {_PG_NGRAM_FUNCTION}(doc text) RETURNS text[]
+                LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+                    SELECT coalesce(array_agg(DISTINCT substr(doc, i, n)), '{{}}')
+                    FROM unnest(ARRAY[{', '.join(str(n) for n in NGRAM_SIZES)}]) AS n,
+                         generate_series(1, length(doc) - n + 1) AS i
+                    WHERE position(' ' IN substr(doc, i, n)) = 0
+                $$
+            """)
+            cursor.execute(f"DROP INDEX IF EXISTS {_PG_LEGACY_INDEX}")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {_PG_TRGM_INDEX} ON {TABLE} USING GIN (({_PG_DOCUMENT}) gin_trgm_ops)"
+            )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {_PG_NGRAM_INDEX} ON {TABLE} USING GIN ({_PG_NGRAMS})")
+
+
+def uninstall_search_index(connection=None):
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in _SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+            cursor.execute(f"DROP TABLE IF EXISTS {NGRAM_TABLE}")
+        elif connection.vendor == 'postgresql':
+            for name in (_PG_TRGM_INDEX, _PG_NGRAM_INDEX, _PG_LEGACY_INDEX):
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+            cursor.execute(f"DROP FUNCTION IF EXISTS {_PG_NGRAM_FUNCTION}(text)")
+
+
+def _contains_all(terms):
+    condition = Q()
+    for term in terms:
+        term_q = Q()
+        for field in SEARCH_FIELDS:
+            term_q |= Q(**{f'{field}__icontains': term})
+        condition &= term_q
+    return condition
+
+
+def _fts5_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like_pattern(term):
+    escaped = term.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_applications(queryset, query):
+    """空白区切りの全語を部分文字列として含む申請に絞り込む (AND 検索)"""
+    terms = [t for t in (query or '').split() if t]
+    if not terms:
+        return queryset
+    if queryset.model._meta.db_table != TABLE:
+        # アーカイブは参照頻度が低いため索引を持たず部分一致で検索する
+        return queryset.filter(_contains_all(terms))
+    vendor = connections[queryset.db].vendor
+    long_terms = [t for t in terms if len(t) >= MIN_TRIGRAM_LENGTH]
+    short_terms = [t for t in terms if len(t) < MIN_TRIGRAM_LENGTH]
+    if vendor == 'sqlite':
+        if long_terms:
+            match = ' AND '.join(_fts5_phrase(t) for t in long_terms)
+            queryset = queryset.filter(
+                id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+            )
+        for term in short_terms:
+            queryset = queryset.filter(
+                id__in=RawSQL(f"SELECT application_id FROM {NGRAM_TABLE} WHERE gram = lower(%s)", [term])
+            )
+        return queryset
+    if vendor == 'postgresql':
+        for term in long_terms:
+            queryset = queryset.filter(
+                RawSQL(f"{_PG_DOCUMENT} LIKE %s", [_like_pattern(term)], output_field=BooleanField())
+            )
+        if short_terms:
+            queryset = queryset.filter(
+                RawSQL(f"{_PG_NGRAMS} @> %s::text[]", [[t.lower() for t in short_terms]],
+                       output_field=BooleanField())
+            )
+        return queryset
+    return queryset.filter(_contains_all(terms))
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import models
+from django.urls import reverse
 from .models import Application, ApprovalStatus
+from .transitions import BULK_TRANSITION_LIMIT
 
 User = get_user_model()
 
@@ -20,32 +23,78 @@ class UserSerializer(serializers.ModelSerializer):
         return f"{obj.first_name} {obj.last_name}".strip()
 
 
+def _cached_user(obj, field_name):
+    """FK が select_related 等でロード済みならそのユーザ、未ロードなら None (追加クエリを発生させない)"""
+    field = obj._meta.get_field(field_name)
+    if getattr(obj, field.attname) is None or not field.is_cached(obj):
+        return None
+    return field.get_cached_value(obj)
+
+
+class ApplicationListSerializer(serializers.ListSerializer):
+    """ページ内の申請者/承認者をまとめて1クエリで解決する ListSerializer"""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        self.child.prefetch_users(items)
+        return [self.child.to_representation(item) for item in items]
+
+
 class ApplicationSerializer(serializers.ModelSerializer):
     """申請シリアライザー（読み取り用）
     applicant / approver は現在 CharField (ユーザ名) なので、互換性確保のため
     以前のネスト構造に近い dict を返す SerializerMethodField にする。
+    applicant_user / approver_user (FK) がロード済みならそれを使い、
+    それ以外は many=True 時に ApplicationListSerializer がページ単位で
+    まとめて引いたユーザマップ (context['user_map'] でも指定可) から解決する。
     """
     applicant = serializers.SerializerMethodField()
     approver = serializers.SerializerMethodField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
+    download_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Application
         fields = [
             'id', 'applicant', 'approver', 'file', 'original_filename',
             'file_size', 'content_type', 'comment', 'approval_comment',
-            'status', 'status_display', 'created_at', 'updated_at', 'approved_at'
+            'status', 'status_display', 'created_at', 'updated_at', 'approved_at', 'version', 'sha256',
+            'download_url'
         ]
-        read_only_fields = ('created_at', 'updated_at', 'approved_at')
-
-    def _user_dict(self, username):
+        read_only_fields = ('created_at', 'updated_at', 'approved_at', 'version', 'sha256')
+        list_serializer_class = ApplicationListSerializer
+
+    def prefetch_users(self, applications):
+        """FK 未ロードの申請者/承認者を username__in の1クエリで取得しマップに保持"""
+        usernames = set()
+        for app in applications:
+            if _cached_user(app, 'applicant_user') is None and app.applicant:
+                usernames.add(app.applicant)
+            if _cached_user(app, 'approver_user') is None and app.approver:
+                usernames.add(app.approver)
+        user_map = dict(self.context.get('user_map') or {})
+        missing = usernames - user_map.keys()
+        if missing:
+            user_map.update((u.username, u) for u in User.objects.filter(username__in=missing))
+        self._user_map = user_map
+
+    def _lookup_user(self, username):
+        user_map = getattr(self, '_user_map', None)
+        if user_map is None:
+            user_map = self.context.get('user_map')
+        if user_map is not None:
+            return user_map.get(username)
+        return User.objects.filter(username=username).first()
+
+    def _user_dict(self, username, user=None):
         if not username:
             return None
-        try:
-            user = User.objects.get(username=username)
-            serialized = UserSerializer(user).data
-            return serialized
-        except User.DoesNotExist:
+        if user is None:
+            user = self._lookup_user(username)
+        if user is not None:
+            return UserSerializer(user).data
+        else:
             # 最低限の情報だけ返す
             return {
                 'id': None,
@@ -59,10 +108,16 @@ class ApplicationSerializer(serializers.ModelSerializer):
             }
 
     def get_applicant(self, obj):
-        return self._user_dict(obj.applicant)
+        return self._user_dict(obj.applicant, _cached_user(obj, 'applicant_user'))
 
     def get_approver(self, obj):
-        return self._user_dict(obj.approver)
+        return self._user_dict(obj.approver, _cached_user(obj, 'approver_user'))
+
+    def get_download_url(self, obj):
+        """権限チェック付きのダウンロード URL (file は MEDIA_URL 上の参考値)"""
+        url = reverse('applications:application-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
 
 
 class ApplicationCreateSerializer(serializers.ModelSerializer):
@@ -95,3 +150,17 @@ class ApplicationStatusUpdateSerializer(serializers.ModelSerializer):
         if value not in [ApprovalStatus.APPROVED, ApprovalStatus.REJECTED]:
             raise serializers.ValidationError("承認または却下のみ選択可能です。")
         return value
+
+
+class ApplicationBulkStatusSerializer(serializers.Serializer):
+    """一括承認・却下シリアライザー"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_TRANSITION_LIMIT,
+    )
+    status = serializers.ChoiceField(choices=[
+        (ApprovalStatus.APPROVED, ApprovalStatus.APPROVED.label),
+        (ApprovalStatus.REJECTED, ApprovalStatus.REJECTED.label),
+    ])
+    approval_comment = serializers.CharField(required=False, allow_blank=True, default='')
@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeSortable();
     setupHTMXEvents();
     initializeWebSocket();
+    initializeLazyColumns();
 });
 
 // WebSocket接続を初期化
@@ -42,12 +43,31 @@ function handleWebSocketMessage(data) {
         showToast(data.data.title, 'info');
     } else if (data.type === 'kanban_update') {
         handleKanbanUpdate(data);
+    } else if (data.type === 'kanban_batch_update') {
+        // 通知アウトボックスからのまとめ送信。1件なら通常どおり、複数件はトーストを1回だけ
+        if (data.updates.length === 1) {
+            handleKanbanUpdate(data.updates[0]);
+        } else {
+            data.updates.forEach(update => handleKanbanUpdate(update, true));
+            showToast(`${data.updates.length} 件の申請が更新されました`, 'info');
+        }
     }
 }
 
-// カンバンボード更新の処理
-function handleKanbanUpdate(data) {
+// カンバンボード更新の処理 (quiet=true の場合は個別の通知を出さない)
+function handleKanbanUpdate(data, quiet = false) {
     const { action, application } = data;
+    if (quiet) {
+        if (action === 'new_application') {
+            addApplicationCard(application, 'pending');
+        } else if (action === 'application_approved') {
+            moveApplicationCard(application.id, 'approved');
+        } else if (action === 'application_rejected') {
+            moveApplicationCard(application.id, 'rejected');
+        }
+        updateColumnCounts();
+        return;
+    }
     
     switch (action) {
         case 'new_application':
@@ -335,6 +355,10 @@ function updateApplicationStatus(applicationId, newStatus, cardElement) {
     const formData = new FormData();
     formData.append('application_id', applicationId);
     formData.append('status', newStatus);
+    if (cardElement.dataset.version !== undefined) {
+        // 表示中の版と一致しない場合はサーバーが 409 を返す
+        formData.append('version', cardElement.dataset.version);
+    }
     formData.append('csrfmiddlewaretoken', getCSRFToken());
     
     fetch('/applications/update-status/', {
@@ -348,6 +372,10 @@ function updateApplicationStatus(applicationId, newStatus, cardElement) {
         console.log('サーバーレスポンス:', response.status);
         if (response.ok) {
             return response.text();
+        } else if (response.status === 409) {
+            return response.json().then(data => {
+                throw new Error(data.error || '他のユーザーによって既に更新されています');
+            });
         } else {
             throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
@@ -363,13 +391,86 @@ function updateApplicationStatus(applicationId, newStatus, cardElement) {
     })
     .catch(error => {
         console.error('ステータス更新エラー:', error);
-        showToast('更新に失敗しました', 'error');
+        showToast(error.message.startsWith('HTTP') ? '更新に失敗しました' : error.message, 'error');
         
         // カードを元の位置に戻す
         location.reload();
     });
 }
 
+// カラムの続きをスクロールで読み込む（初期表示は各カラム先頭N件のみ）
+function initializeLazyColumns() {
+    const board = document.querySelector('.kanban-board');
+    if (!board || !board.dataset.columnUrl) return;
+    
+    document.querySelectorAll('.kanban-body').forEach(column => {
+        column.addEventListener('scroll', function() {
+            if (column.scrollTop + column.clientHeight >= column.scrollHeight - 100) {
+                loadMoreCards(column);
+            }
+        });
+        const moreLink = column.parentElement.querySelector('.kanban-more');
+        if (moreLink) {
+            moreLink.addEventListener('click', () => loadMoreCards(column));
+        }
+    });
+}
+
+function loadMoreCards(column) {
+    const cursor = column.dataset.nextCursor;
+    if (!cursor || column.dataset.loading === 'true') return;
+    
+    const board = document.querySelector('.kanban-board');
+    const params = new URLSearchParams({
+        role: board.dataset.role,
+        status: column.dataset.status,
+        cursor: cursor
+    });
+    column.dataset.loading = 'true';
+    
+    fetch(`${board.dataset.columnUrl}?${params}`, {
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        column.dataset.nextCursor = response.headers.get('X-Next-Cursor') || '';
+        return response.text();
+    })
+    .then(html => {
+        const tempDiv = document.createElement('div');
+        tempDiv.innerHTML = html;
+        let added = 0;
+        tempDiv.querySelectorAll('.application-card').forEach(card => {
+            // WebSocket 経由で既に追加済みのカードは重複させない
+            if (!column.querySelector(`[data-id="${card.dataset.id}"]`)) {
+                column.appendChild(card);
+                added++;
+            }
+        });
+        
+        const remaining = Math.max(parseInt(column.dataset.remaining || '0', 10) - added, 0);
+        column.dataset.remaining = remaining;
+        const moreLink = column.parentElement.querySelector('.kanban-more');
+        if (moreLink) {
+            if (!column.dataset.nextCursor || remaining === 0) {
+                moreLink.remove();
+            } else {
+                moreLink.innerHTML = `<i class="bi bi-three-dots"></i> 他 ${remaining} 件`;
+            }
+        }
+        updateColumnCounts();
+    })
+    .catch(error => {
+        console.error('カード追加読み込みエラー:', error);
+        showToast('カードの読み込みに失敗しました', 'error');
+    })
+    .finally(() => {
+        column.dataset.loading = 'false';
+    });
+}
+
 // 申請詳細モーダルを表示
 function showApplicationDetail(applicationId) {
     const modal = new bootstrap.Modal(document.getElementById('detail-modal'));
@@ -397,11 +498,13 @@ function updateColumnCounts() {
         const column = document.getElementById(`${status}-column`);
         const cards = column.querySelectorAll('.application-card');
         const header = column.parentElement.querySelector('.kanban-header h5');
+        // 初期表示されていない残り件数（サーバー側で各カラム先頭N件のみ描画）
+        const remaining = parseInt(column.dataset.remaining || '0', 10);
         
         // ヘッダーのテキストを更新
         const iconClass = header.querySelector('i').className;
         const baseText = header.textContent.replace(/\(\d+\)/, '');
-        header.innerHTML = `<i class="${iconClass}"></i> ${baseText.trim()} (${cards.length})`;
+        header.innerHTML = `<i class="${iconClass}"></i> ${baseText.trim()} (${cards.length + remaining})`;
     });
 }
 
@@ -0,0 +1,34 @@
+"""申請ファイル用のストレージ
+
+MEDIA_ROOT 配下を基本とし、名前が approved/ で始まるファイルだけを
+settings.APPROVED_DIR 配下に置く。FileField の名前を書き換えるだけで
+承認済みディレクトリ (別ボリュームでもよい) のファイルを参照できる。
+"""
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils._os import safe_join
+
+APPROVED_PREFIX = 'approved/'
+
+
+def is_approved_name(name):
+    return name.startswith(APPROVED_PREFIX)
+
+
+def approved_name(name):
+    """承認済みディレクトリでの名前 (元の相対パスをそのまま保つ)"""
+    return APPROVED_PREFIX + name
+
+
+def source_name(name):
+    """approved_name() の逆変換"""
+    return name[len(APPROVED_PREFIX):]
+
+
+class ApplicationFileStorage(FileSystemStorage):
+    def path(self, name):
+        if is_approved_name(name):
+            return safe_join(os.fspath(settings.APPROVED_DIR), source_name(name))
+        return super().path(name)
@@ -0,0 +1,39 @@
+"""ASGI (daphne) でも逐次送出されるストリーミングレスポンス
+
+Django の StreamingHttpResponse/FileResponse は、同期イテレータを ASGI で送るとき
+`sync_to_async(list)` で全体を読み切ってから送り出す (= 全体がメモリに載る)。
+ここでは同期イテレータのまま保持し (WSGI・テストクライアントはそのまま使える)、
+ASGI で `async for` されたときは1チャンクずつ `sync_to_async(next)` で取り出す。
+
+thread_sensitive=True のままなので、イテレータ内の DB アクセス (サーバ側カーソル) は
+ビューと同じスレッド・同じ接続で行われる。
+"""
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, StreamingHttpResponse
+
+_EXHAUSTED = object()
+
+
+class AsyncIterMixin:
+    """同期イテレータを1チャンクずつ非同期に取り出す __aiter__"""
+
+    async def __aiter__(self):
+        if self.is_async:
+            async for part in super().__aiter__():
+                yield part
+            return
+        iterator = iter(self.streaming_content)
+        pull = sync_to_async(next)
+        while True:
+            part = await pull(iterator, _EXHAUSTED)
+            if part is _EXHAUSTED:
+                return
+            yield part
+
+
+class ChunkedStreamingHttpResponse(AsyncIterMixin, StreamingHttpResponse):
+    pass
+
+
+class ChunkedFileResponse(AsyncIterMixin, FileResponse):
+    pass
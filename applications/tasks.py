@@ -0,0 +1,38 @@
+from jobs.queue import task
+
+from .approved_files import move_approved_file
+from .archive import archive_applications
+from .blobs import purge_orphan_files, purge_unreferenced
+from .models import ApplicationStatusCounter
+from .uploads import purge_stale_sessions
+
+
+@task('applications.archive_applications')
+def archive_applications_task():
+    """完了済み申請のアーカイブ (APPLICATION_ARCHIVE_AFTER_DAYS 経過分)"""
+    archive_applications()
+
+
+@task('applications.move_approved_file', max_attempts=5)
+def move_approved_file_task(application_id):
+    """承認済み申請のファイルを APPROVED_DIR へ移動"""
+    move_approved_file(application_id)
+
+
+@task('applications.rebuild_counters')
+def rebuild_counters_task():
+    """ステータスカウンタの再集計 (増分更新のずれの補正)。定期実行はせず必要時に投入する"""
+    ApplicationStatusCounter.rebuild()
+
+
+@task('applications.purge_stale_uploads')
+def purge_stale_uploads_task():
+    """期限切れの未完了アップロードを削除 (APPLICATION_UPLOAD_EXPIRY_HOURS)"""
+    purge_stale_sessions()
+
+
+@task('applications.purge_unreferenced_blobs')
+def purge_unreferenced_blobs_task():
+    """参照数 0 のファイル実体と、行のない実体・一時ファイル (ロールバック分) の削除"""
+    purge_unreferenced()
+    purge_orphan_files()
@@ -1,3 +1,1108 @@
-from django.test import TestCase
+import base64
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from unittest import skipUnless
+from unittest.mock import AsyncMock, MagicMock, patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, TestCase, override_settings
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from audit.models import AuditLog
+from notifications.models import Notification
+
+from .archive import archive_applications
+from .blobs import delete_if_unreferenced, purge_orphan_files
+from .transitions import TransitionConflict, transition_application
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from .models import (
+    Application, ApprovalStatus, ApplicationStatusCounter, ArchivedApplication, CounterRole, StoredBlob,
+    UploadSession,
+)
+from .pagination import paginate_keyset, paginate_request
+from .serializers import ApplicationSerializer
+from .board import load_board_columns
+from .cards import card_fragment_keys, fragment_cache
+from .search import search_applications
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN 出力の形式は SQLite を前提とする")
+class BoardQueryIndexTests(TestCase):
+    """ボード/一覧の主要クエリが複合インデックスを利用することを EXPLAIN で確認"""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def test_approval_board_columns(self):
+        for status in ApprovalStatus.values:
+            qs = Application.objects.filter(approver='bob', status=status).order_by('-created_at')
+            self.assertUsesIndex(qs, 'app_approver_status_created')
+
+    def test_pending_approvals(self):
+        qs = Application.objects.filter(
+            approver='bob', status=ApprovalStatus.PENDING
+        ).order_by('-created_at')
+        self.assertUsesIndex(qs, 'app_approver_status_created')
+
+    def test_applicant_board_columns(self):
+        for status in ApprovalStatus.values:
+            qs = Application.objects.filter(applicant='alice', status=status).order_by('-created_at')
+            self.assertUsesIndex(qs, 'app_applicant_status_created')
+
+    def test_my_approval_history(self):
+        qs = Application.objects.filter(approver='bob').exclude(
+            status=ApprovalStatus.PENDING
+        ).order_by('-updated_at')
+        self.assertUsesIndex(qs, 'app_approver_updated')
+
+    def test_kanban_board_role_probe(self):
+        self.assertUsesIndex(Application.objects.filter(approver='bob').values('id')[:1], 'app_approver_')
+        self.assertUsesIndex(Application.objects.filter(applicant='alice').values('id')[:1], 'app_applicant_status_created')
+
+    def test_admin_list_order(self):
+        self.assertUsesIndex(Application.objects.order_by('-created_at')[:20], 'app_created')
+
+
+def make_application(applicant='alice', approver='bob', status=ApprovalStatus.PENDING, **kwargs):
+    """ファイル実体を書き込まずに申請を作成するテスト用ヘルパー"""
+    defaults = {
+        'file': 'uploads/test.txt',
+        'original_filename': 'test.txt',
+        'file_size': 4,
+        'content_type': 'text/plain',
+    }
+    defaults.update(kwargs)
+    return Application.objects.create(applicant=applicant, approver=approver, status=status, **defaults)
+
+
+class ApplicationStatusCounterTests(TestCase):
+    """ステータスカウンタの増分更新と再構築"""
+
+    def test_insert_and_transition_update_counters(self):
+        app = make_application()
+        make_application(approver='carol')
+        self.assertEqual(ApplicationStatusCounter.counts_for('alice', CounterRole.APPLICANT)['pending'], 2)
+        self.assertEqual(ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)['pending'], 1)
+
+        app.status = ApprovalStatus.APPROVED
+        app.save()
+        bob = ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)
+        self.assertEqual((bob['pending'], bob['approved'], bob['total']), (0, 1, 1))
+        alice = ApplicationStatusCounter.counts_for('alice', CounterRole.APPLICANT)
+        self.assertEqual((alice['pending'], alice['approved']), (1, 1))
+
+    def test_reload_and_resave_does_not_double_count(self):
+        app = make_application()
+        app = Application.objects.get(pk=app.pk)
+        app.comment = 'edited'
+        app.save()
+        self.assertEqual(ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)['pending'], 1)
+
+    def test_delete_decrements(self):
+        make_application()
+        Application.objects.all().delete()
+        self.assertEqual(ApplicationStatusCounter.counts_for('alice', CounterRole.APPLICANT)['total'], 0)
+
+    def test_global_counts_and_rebuild(self):
+        make_application()
+        make_application(status=ApprovalStatus.REJECTED)
+        ApplicationStatusCounter.objects.all().delete()
+        self.assertEqual(ApplicationStatusCounter.global_counts()['total'], 0)
+        ApplicationStatusCounter.rebuild()
+        stats = ApplicationStatusCounter.global_counts()
+        self.assertEqual((stats['total'], stats['pending'], stats['rejected']), (2, 1, 1))
+        self.assertTrue(ApplicationStatusCounter.has_any('bob', CounterRole.APPROVER))
+        self.assertFalse(ApplicationStatusCounter.has_any('bob', CounterRole.APPLICANT))
+
+    def test_rebuild_updates_only_drifted_rows_in_place(self):
+        make_application()
+        make_application(status=ApprovalStatus.REJECTED)
+        ids = set(ApplicationStatusCounter.objects.values_list('pk', flat=True))
+        self.assertEqual(ApplicationStatusCounter.rebuild(), 0)
+        ApplicationStatusCounter.objects.filter(username='bob', status='pending').update(count=5)
+        ApplicationStatusCounter.objects.filter(username='alice', status='rejected').delete()
+        self.assertEqual(ApplicationStatusCounter.rebuild(), 2)
+        self.assertEqual(ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)['pending'], 1)
+        self.assertEqual(ApplicationStatusCounter.counts_for('alice', CounterRole.APPLICANT)['rejected'], 1)
+        # 既存行は作り直さない
+        self.assertTrue(ApplicationStatusCounter.objects.filter(pk__in=ids, username='bob', status='pending').exists())
+
+    def test_refresh_from_db_resets_counter_key(self):
+        app = make_application()
+        stale = Application.objects.get(pk=app.pk)
+        app.status = ApprovalStatus.APPROVED
+        app.save()
+        stale.refresh_from_db()
+        stale.status = ApprovalStatus.REJECTED
+        stale.save()
+        bob = ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)
+        self.assertEqual((bob['pending'], bob['approved'], bob['rejected']), (0, 0, 1))
+
+    def _bob(self):
+        bob = ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)
+        return bob['pending'], bob['approved'], bob['rejected']
+
+    def test_only_id_loads_and_saves_without_recursion(self):
+        app = make_application()
+        partial = Application.objects.only('id').get(pk=app.pk)
+        partial.status = ApprovalStatus.APPROVED
+        partial.save()
+        self.assertEqual(self._bob(), (0, 1, 0))
+        Application.objects.only('id').get(pk=app.pk).delete()
+        self.assertEqual(self._bob(), (0, 0, 0))
+
+    def test_defer_status_keeps_counter_deltas(self):
+        app = make_application()
+        Application.objects.filter(pk=app.pk).update(status=ApprovalStatus.REJECTED)
+        ApplicationStatusCounter.rebuild()
+        deferred = Application.objects.defer('status').get(pk=app.pk)
+        deferred.comment = 'edited'
+        deferred.save()
+        self.assertEqual(self._bob(), (0, 0, 1))
+        deferred.status = ApprovalStatus.APPROVED
+        deferred.save()
+        self.assertEqual(self._bob(), (0, 1, 0))
+
+    def test_partial_refresh_updates_only_refreshed_fields(self):
+        app = make_application()
+        other = Application.objects.get(pk=app.pk)
+        other.status = ApprovalStatus.APPROVED
+        other.save()
+        app.refresh_from_db(fields=['status'])
+        self.assertEqual(app.status, ApprovalStatus.APPROVED)
+        app.status = ApprovalStatus.REJECTED
+        app.save()
+        self.assertEqual(self._bob(), (0, 0, 1))
+
+
+class KeysetPaginationTests(TestCase):
+    """(created_at, id) キーセットによるページング"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.apps = [make_application() for _ in range(5)]
+        # created_at を同一にして id による同順位解消も確認する
+        Application.objects.filter(pk__in=[a.pk for a in cls.apps[1:4]]).update(
+            created_at=cls.apps[1].created_at
+        )
+
+    def _ids(self, page):
+        return [a.pk for a in page]
+
+    def test_walk_forward_and_back(self):
+        expected = list(Application.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        first = paginate_keyset(Application.objects.all(), None, 2)
+        self.assertEqual(self._ids(first), expected[:2])
+        self.assertFalse(first.has_previous())
+        second = paginate_keyset(Application.objects.all(), first.next_cursor, 2)
+        self.assertEqual(self._ids(second), expected[2:4])
+        third = paginate_keyset(Application.objects.all(), second.next_cursor, 2)
+        self.assertEqual(self._ids(third), expected[4:])
+        self.assertFalse(third.has_next())
+        back = paginate_keyset(Application.objects.all(), third.previous_cursor, 2)
+        self.assertEqual(self._ids(back), expected[2:4])
+        self.assertTrue(back.has_previous())
+
+    def test_html_mode_switch_and_invalid_cursor(self):
+        factory = RequestFactory()
+        offset_page = paginate_request(factory.get('/'), Application.objects.all(), 2)
+        self.assertFalse(getattr(offset_page, 'is_keyset', False))
+        page = paginate_request(factory.get('/', {'pagination': 'cursor', 'status': 'pending'}), Application.objects.all(), 2)
+        self.assertTrue(page.is_keyset)
+        self.assertIn('status=pending', page.next_url)
+        broken = paginate_request(factory.get('/', {'cursor': '!!'}), Application.objects.all(), 2)
+        self.assertEqual(len(broken), 2)
+
+    def test_api_cursor_links(self):
+        user = get_user_model().objects.create_user(username='alice', password='x')
+        self.client.force_login(user)
+        url = reverse('applications:api-my-applications')
+        body = self.client.get(url, {'pagination': 'cursor'}).json()
+        self.assertNotIn('count', body)
+        self.assertEqual(len(body['results']), 5)
+        self.assertIsNone(body['next'])
+        self.assertEqual(self.client.get(url, {'cursor': 'bogus'}).status_code, 404)
+
+
+class ApplicationUserLinkTests(TestCase):
+    """applicant_user / approver_user の自動解決と select_related によるシリアライズ"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', password='x')
+        self.bob = User.objects.create_user(username='bob', password='x')
+
+    def test_save_links_users_by_username(self):
+        app = make_application()
+        self.assertEqual((app.applicant_user, app.approver_user), (self.alice, self.bob))
+        orphan = make_application(approver='nobody')
+        self.assertIsNone(orphan.approver_user)
+        orphan.approver = 'bob'
+        orphan.save()
+        self.assertEqual(orphan.approver_user, self.bob)
+
+    def test_unlinked_user_is_not_looked_up_on_every_save(self):
+        orphan = make_application(approver='nobody')
+        orphan.comment = 'edited'
+        with CaptureQueriesContext(connection) as ctx:
+            orphan.save()
+        self.assertFalse(any('"users_user"' in q['sql'] for q in ctx.captured_queries))
+        # ユーザが作成された時点で既存の申請に紐づく
+        nobody = get_user_model().objects.create_user(username='nobody', password='x')
+        orphan = Application.objects.get(pk=orphan.pk)
+        self.assertEqual((orphan.approver_user, orphan.version), (nobody, 1))
+
+    def test_serializing_page_does_not_query_per_row(self):
+        for _ in range(20):
+            make_application()
+        qs = Application.objects.select_related('applicant_user', 'approver_user')
+        with self.assertNumQueries(1):
+            data = ApplicationSerializer(qs, many=True).data
+        self.assertEqual(data[0]['approver']['username'], 'bob')
+
+    def test_list_serializer_batches_unloaded_users(self):
+        for _ in range(20):
+            make_application()
+        make_application(approver='ghost')
+        with self.assertNumQueries(2):
+            data = ApplicationSerializer(Application.objects.all(), many=True).data
+        by_approver = {row['approver']['username']: row['approver'] for row in data}
+        self.assertEqual(by_approver['bob']['id'], self.bob.id)
+        self.assertEqual(by_approver['ghost']['full_name'], 'ghost')
+        self.assertIsNone(by_approver['ghost']['id'])
+
+
+class BoardColumnTests(TestCase):
+    """カンバンの各カラム先頭N件を1クエリで取得"""
+
+    def test_top_n_per_column_with_totals(self):
+        pending = [make_application() for _ in range(3)]
+        make_application(status=ApprovalStatus.APPROVED)
+        make_application(approver='carol')
+        with self.assertNumQueries(2):
+            columns = load_board_columns('bob', CounterRole.APPROVER, limit=2)
+        self.assertEqual(
+            [a.pk for a in columns['pending']['applications']],
+            [pending[2].pk, pending[1].pk],
+        )
+        self.assertEqual((columns['pending']['total'], columns['pending']['remaining']), (3, 1))
+        self.assertEqual((columns['approved']['total'], columns['approved']['remaining']), (1, 0))
+        self.assertEqual(columns['rejected']['applications'], [])
+
+    def test_column_page_endpoint_continues_from_board(self):
+        user = get_user_model().objects.create_user(username='bob', password='x')
+        self.client.force_login(user)
+        apps = [make_application() for _ in range(5)]
+        columns = load_board_columns('bob', CounterRole.APPROVER, limit=2)
+        url = reverse('applications:board-column')
+        cursor = columns['pending']['next_cursor']
+        seen = []
+        with self.settings(KANBAN_COLUMN_LIMIT=2):
+            while cursor:
+                response = self.client.get(url, {'role': 'approver', 'status': 'pending', 'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                seen += [a.pk for a in apps if f'data-id="{a.pk}"' in response.content.decode()]
+                cursor = response['X-Next-Cursor']
+        self.assertEqual(sorted(seen), sorted(a.pk for a in apps[:3]))
+        bad = self.client.get(url, {'role': 'admin', 'status': 'pending'})
+        self.assertEqual(bad.status_code, 400)
+
+
+class CardFragmentCacheTests(TestCase):
+    """申請カードのフラグメントキャッシュ"""
+
+    def setUp(self):
+        fragment_cache().clear()
+
+    def _render(self, application):
+        return render_to_string('applications/application_card.html', {'application': application})
+
+    def test_cached_per_version(self):
+        app = make_application(comment='first')
+        keys = card_fragment_keys(app.pk, app.updated_at)
+        self.assertIn('first', self._render(app))
+        self.assertTrue(any(fragment_cache().get(k) for k in keys))
+
+        # 同じ版ならキャッシュから返る (インスタンスだけ書き換えても反映されない)
+        app.comment = 'not saved'
+        self.assertIn('first', self._render(app))
+
+    def test_save_invalidates_previous_version(self):
+        app = make_application(comment='first')
+        app = Application.objects.get(pk=app.pk)
+        old_keys = card_fragment_keys(app.pk, app.updated_at)
+        self._render(app)
+        app.comment = 'second'
+        app.save()
+        self.assertFalse(any(fragment_cache().get(k) for k in old_keys))
+        self.assertIn('second', self._render(Application.objects.get(pk=app.pk)))
+
+
+class ApplicationSearchTests(TestCase):
+    """ファイル名・コメントの全文検索"""
+
+    def _search(self, query):
+        return set(search_applications(Application.objects.all(), query).values_list('pk', flat=True))
+
+    def test_matches_filename_and_comments(self):
+        report = make_application(original_filename='月次報告書.pdf', comment='経理部向け')
+        invoice = make_application(original_filename='invoice_2024.xlsx', comment='至急')
+        self.assertEqual(self._search('報告書'), {report.pk})
+        self.assertEqual(self._search('INVOICE'), {invoice.pk})
+        self.assertEqual(self._search('経理部 報告書'), {report.pk})
+        # trigram 未満の短い語は n-gram 索引で引く
+        self.assertEqual(self._search('至急'), {invoice.pk})
+        self.assertEqual(self._search(''), {report.pk, invoice.pk})
+
+    def test_short_terms_use_ngram_index(self):
+        report = make_application(original_filename='月次報告書.pdf', comment='経理部向け')
+        invoice = make_application(original_filename='Invoice_2024.xlsx', comment='至急')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._search('至急'), {invoice.pk})
+            self.assertEqual(self._search('経理 書'), {report.pk})
+            self.assertEqual(self._search('iN'), {invoice.pk})
+            self.assertEqual(self._search('急至'), set())
+        self.assertFalse(any(' LIKE ' in q['sql'] for q in ctx.captured_queries))
+
+    def test_terms_match_inside_words(self):
+        invoice = make_application(original_filename='invoice_2024.xlsx', comment='quarterly budget')
+        # 単語の途中でも一致する (trigram / n-gram のどちらでも)
+        self.assertEqual(self._search('voice'), {invoice.pk})
+        self.assertEqual(self._search('rterl'), {invoice.pk})
+        self.assertEqual(self._search('dg'), {invoice.pk})
+
+    def test_index_follows_updates_and_deletes(self):
+        app = make_application(comment='draft version')
+        app.approval_comment = '差し戻し理由あり'
+        app.save()
+        self.assertEqual(self._search('差し戻し'), {app.pk})
+        app.comment = 'final'
+        app.save()
+        self.assertEqual(self._search('draft'), set())
+        self.assertEqual(self._search('dr'), set())
+        self.assertEqual(self._search('理由'), {app.pk})
+        app.delete()
+        self.assertEqual(self._search('差し戻し'), set())
+        self.assertEqual(self._search('理由'), set())
+
+    def test_api_query_param(self):
+        user = get_user_model().objects.create_user(username='alice', password='x')
+        self.client.force_login(user)
+        make_application(original_filename='budget.csv')
+        make_application(original_filename='minutes.txt')
+        body = self.client.get('/applications/api/', {'q': 'budget'}).json()
+        self.assertEqual([row['original_filename'] for row in body['results']], ['budget.csv'])
+
+
+class ArchiveTests(TestCase):
+    """完了済み申請のアーカイブ移動"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        self.bob = User.objects.create_user(username='bob', password='x')
+        self.old = make_application(status=ApprovalStatus.APPROVED, original_filename='old_report.pdf')
+        self.recent = make_application(status=ApprovalStatus.REJECTED)
+        self.pending = make_application()
+        AuditLog.objects.create(user=self.bob, application=self.old, action='approved', details='ok')
+        Notification.objects.create(
+            recipient=self.bob, notification_type='application_approved',
+            title='承認', message='承認されました', related_application=self.old,
+        )
+        stale = timezone.now() - timedelta(days=400)
+        Application.objects.filter(pk__in=[self.old.pk, self.pending.pk]).update(updated_at=stale)
+
+    def test_moves_old_finished_rows_with_related(self):
+        moved = archive_applications(timezone.now() - timedelta(days=30), batch_size=1)
+        self.assertEqual(moved, 1)
+        self.assertEqual(
+            set(Application.objects.values_list('pk', flat=True)), {self.recent.pk, self.pending.pk}
+        )
+        archived = ArchivedApplication.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.created_at, self.old.created_at)
+        self.assertEqual(archived.audit_logs.get().action, 'approved')
+        self.assertEqual(archived.notifications.get().recipient, self.bob)
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)['approved'], 0)
+
+    def test_archived_rows_are_searchable_and_viewable(self):
+        archive_applications(timezone.now() - timedelta(days=30))
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('applications:application-detail-modal', args=[self.old.pk])
+        )
+        self.assertContains(response, 'アーカイブ済み')
+        archived = search_applications(ArchivedApplication.objects.all(), 'report')
+        self.assertEqual([a.pk for a in archived], [self.old.pk])
+
+
+class StatusTransitionTests(TestCase):
+    """条件付き UPDATE によるステータス遷移"""
+
+    def test_single_update_sets_all_columns(self):
+        app = make_application()
+        with CaptureQueriesContext(connection) as ctx:
+            transition_application(app, ApprovalStatus.APPROVED, 'OK')
+        writes = [q['sql'] for q in ctx.captured_queries
+                  if q['sql'].startswith('UPDATE "applications_application"')]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"version" = ', writes[0])
+        stored = Application.objects.get(pk=app.pk)
+        self.assertEqual((stored.status, stored.approval_comment, stored.version), ('approved', 'OK', 1))
+        self.assertIsNotNone(stored.approved_at)
+        self.assertEqual(stored.updated_at, app.updated_at)
+        bob = ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)
+        self.assertEqual((bob['pending'], bob['approved']), (0, 1))
+
+    def test_stale_or_repeated_transition_conflicts(self):
+        app = make_application()
+        stale = Application.objects.get(pk=app.pk)
+        transition_application(app, ApprovalStatus.REJECTED)
+        with self.assertRaises(TransitionConflict) as ctx:
+            transition_application(stale, ApprovalStatus.APPROVED)
+        self.assertEqual(ctx.exception.current_status, ApprovalStatus.REJECTED)
+
+        edited = make_application()
+        reader = Application.objects.get(pk=edited.pk)
+        edited.comment = 'changed'
+        edited.save()
+        with self.assertRaises(TransitionConflict):
+            transition_application(reader, ApprovalStatus.APPROVED)
+        self.assertEqual(ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)['approved'], 0)
+
+    def test_view_reports_conflict(self):
+        user = get_user_model().objects.create_user(username='bob', password='x')
+        self.client.force_login(user)
+        app = make_application()
+        url = reverse('applications:update-application-status')
+        data = {'application_id': app.pk, 'status': 'approved', 'version': app.version}
+        self.assertEqual(self.client.post(url, data).status_code, 200)
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'approved')
+        self.assertEqual(AuditLog.objects.filter(application=app).count(), 1)
+
+    def test_audit_log_is_written_with_transition(self):
+        user = get_user_model().objects.create_user(username='bob', password='x')
+        app = make_application()
+        with patch.object(AuditLog.objects, 'create', side_effect=RuntimeError('audit down')):
+            with self.assertRaises(RuntimeError):
+                transition_application(app, ApprovalStatus.APPROVED, actor=user)
+        # 監査ログを残せなければ遷移も巻き戻る
+        self.assertEqual(Application.objects.get(pk=app.pk).status, ApprovalStatus.PENDING)
+        self.assertEqual(ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)['approved'], 0)
+
+        app = Application.objects.get(pk=app.pk)
+        transition_application(app, ApprovalStatus.APPROVED, 'OK', actor=user)
+        log = AuditLog.objects.get(application=app)
+        self.assertEqual((log.user, log.action), (user, 'approve'))
+        self.assertIn('OK', log.details)
+
+
+class BulkTransitionTests(TestCase):
+    """一括承認・却下"""
+
+    def setUp(self):
+        self.bob = get_user_model().objects.create_user(username='bob', password='x')
+        get_user_model().objects.create_user(username='alice', password='x')
+        self.pending = [make_application() for _ in range(3)]
+        self.done = make_application(status=ApprovalStatus.REJECTED)
+        self.other = make_application(approver='carol')
+
+    def test_api_returns_per_id_results(self):
+        self.client.force_login(self.bob)
+        ids = [a.pk for a in self.pending] + [self.done.pk, self.other.pk, 9999]
+        response = self.client.post(
+            '/applications/api/bulk-status/',
+            {'ids': ids, 'status': 'approved', 'approval_comment': 'まとめて'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        results = {row['id']: row['result'] for row in body['results']}
+        self.assertEqual(body['updated'], 3)
+        self.assertEqual(results[self.done.pk], 'conflict')
+        self.assertEqual(results[self.other.pk], 'forbidden')
+        self.assertEqual(results[9999], 'not_found')
+        self.assertEqual(
+            set(Application.objects.filter(status='approved').values_list('approval_comment', flat=True)),
+            {'まとめて'},
+        )
+        self.assertEqual(AuditLog.objects.filter(action='approve').count(), 3)
+        bob = ApplicationStatusCounter.counts_for('bob', CounterRole.APPROVER)
+        self.assertEqual((bob['pending'], bob['approved']), (0, 3))
+
+    def test_notifications_go_through_outbox(self):
+        from notifications.models import OutboxEvent
+        from notifications.outbox import dispatch_outbox, enqueue_many
+        from .transitions import bulk_transition
+        with self.assertNumQueries(10):
+            bulk_transition([a.pk for a in self.pending], ApprovalStatus.REJECTED, self.bob)
+        self.assertEqual(
+            OutboxEvent.objects.filter(event='application_rejected', dispatched_at__isnull=True).count(), 3
+        )
+        # 同じ (申請, イベント, 版) の再登録は無視される
+        enqueue_many(Application.objects.filter(pk__in=[a.pk for a in self.pending]), 'application_rejected')
+        self.assertEqual(OutboxEvent.objects.filter(event='application_rejected').count(), 3)
+        self.assertFalse(Notification.objects.exists())
+
+        dispatched = dispatch_outbox()
+        self.assertEqual(dispatched, OutboxEvent.objects.count())
+        self.assertEqual(Notification.objects.filter(notification_type='application_rejected').count(), 3)
+        self.assertFalse(OutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
+        self.assertEqual(dispatch_outbox(), 0)
+
+    def test_failing_outbox_event_does_not_block_others(self):
+        from notifications.models import OutboxEvent
+        from notifications.outbox import dispatch_outbox, enqueue_many, retry_failed
+        from notifications.services import NotificationService
+        OutboxEvent.objects.all().delete()
+        enqueue_many(self.pending, 'application_rejected')
+        poisoned = self.pending[1]
+        notify_events = NotificationService.notify_events
+
+        def notify(pairs):
+            if any(application.pk == poisoned.pk for _, application in pairs):
+                raise ValueError('bad event')
+            notify_events(pairs)
+
+        with patch.object(NotificationService, 'notify_events', side_effect=notify), \
+                self.settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2):
+            self.assertEqual(dispatch_outbox(), 2)
+            self.assertEqual(Notification.objects.count(), 2)
+            event = OutboxEvent.objects.get(application_id=poisoned.pk)
+            self.assertEqual((event.attempts, event.failed_at), (1, None))
+            self.assertGreater(event.next_attempt_at, timezone.now())
+            # バックオフ中は取り出さない
+            self.assertEqual(dispatch_outbox(), 0)
+            OutboxEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(dispatch_outbox(), 0)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertIsNotNone(event.failed_at)
+        self.assertEqual(dispatch_outbox(), 0)
+        self.assertEqual(retry_failed(), 1)
+        self.assertEqual(dispatch_outbox(), 1)
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+    def test_outbox_sends_websocket_messages_only_after_commit(self):
+        from notifications.models import OutboxEvent
+        from notifications.outbox import dispatch_outbox, enqueue_many
+        from notifications.services import NotificationService
+        OutboxEvent.objects.all().delete()
+        enqueue_many(self.pending, 'application_rejected')
+        poisoned = self.pending[1]
+        notify_events = NotificationService.notify_events
+
+        def notify(pairs):
+            # 送信を登録した後で失敗する (ロールバックされた配信の分は送らない)
+            notify_events(pairs)
+            if any(application.pk == poisoned.pk for _, application in pairs):
+                raise ValueError('bad event')
+
+        layer = MagicMock()
+        layer.group_send = AsyncMock()
+        with patch('notifications.services.get_channel_layer', return_value=layer), \
+                patch.object(NotificationService, 'notify_events', side_effect=notify), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(dispatch_outbox(), 2)
+        sent = [
+            n['application_id']
+            for call in layer.group_send.await_args_list if call.args[1]['type'] == 'notification_batch'
+            for n in call.args[1]['notifications']
+        ]
+        self.assertCountEqual(sent, [self.pending[0].pk, self.pending[2].pk])
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = get_user_model().objects.create_user(username='alice', password='pw')
+        self.client.force_login(self.user)
+
+    def _create(self, data):
+        metadata = ','.join(
+            f"{key} {base64.b64encode(value.encode()).decode()}"
+            for key, value in {'filename': '報告書.pdf', 'filetype': 'application/pdf', 'approver': 'bob'}.items()
+        )
+        response = self.client.post(
+            '/applications/uploads/', HTTP_UPLOAD_LENGTH=str(len(data)), HTTP_UPLOAD_METADATA=metadata
+        )
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def _patch(self, location, offset, chunk):
+        return self.client.generic(
+            'PATCH', location, chunk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunks_resume_and_create_application(self):
+        data = bytes(range(256)) * 40
+        location = self._create(data)
+
+        response = self._patch(location, 0, data[:4000])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '4000')
+        self.assertFalse(Application.objects.exists())
+
+        # 再開時は HEAD で受信済み位置を確認する
+        response = self.client.head(location)
+        self.assertEqual(response['Upload-Offset'], '4000')
+        self.assertEqual(response['Upload-Length'], str(len(data)))
+
+        response = self._patch(location, 4000, data[4000:])
+        self.assertEqual(response.status_code, 204)
+        application = Application.objects.get(pk=response['X-Application-Id'])
+        self.assertEqual(application.applicant, 'alice')
+        self.assertEqual(application.original_filename, '報告書.pdf')
+        self.assertEqual(application.file_size, len(data))
+        with application.file.open('rb') as fh:
+            self.assertEqual(fh.read(), data)
+        self.assertEqual(application.sha256, hashlib.sha256(data).hexdigest())
+        self.assertTrue(AuditLog.objects.filter(application=application, action='create').exists())
+
+    def _create_for(self, approver):
+        metadata = ','.join(
+            f"{key} {base64.b64encode(value.encode()).decode()}"
+            for key, value in {'filename': 'a.txt', 'approver': approver}.items()
+        )
+        return self.client.post('/applications/uploads/', HTTP_UPLOAD_LENGTH='10', HTTP_UPLOAD_METADATA=metadata)
+
+    def test_approver_is_validated_like_the_form(self):
+        self.assertEqual(self._create_for('alice').status_code, 400)
+        candidates = [{'username': 'bob', 'display_name': 'Bob', 'email': '', 'ou': ''}]
+        with patch('users.utils.get_approvers_for_user', return_value=candidates):
+            self.assertEqual(self._create_for('mallory').status_code, 400)
+            self.assertEqual(self._create_for('bob').status_code, 201)
+        self.assertEqual(list(UploadSession.objects.values_list('approver', flat=True)), ['bob'])
+
+    def test_offset_mismatch_conflicts(self):
+        location = self._create(b'x' * 100)
+        self.assertEqual(self._patch(location, 0, b'x' * 10).status_code, 204)
+        response = self._patch(location, 0, b'x' * 10)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '10')
+
+    def test_pending_hashers_are_bounded(self):
+        from . import uploads
+        self.addCleanup(uploads._hashers.clear)
+        uploads._hashers.clear()
+        with patch.object(uploads, 'MAX_PENDING_HASHERS', 2):
+            for session_id in ('a', 'b', 'c'):
+                uploads._keep_hasher(session_id, 10, hashlib.sha256())
+        self.assertEqual(list(uploads._hashers), ['b', 'c'])
+        # セッションの有効期限を過ぎた途中状態も捨てる
+        with patch('applications.uploads.time.monotonic', return_value=time.monotonic() + 25 * 3600):
+            uploads._keep_hasher('d', 10, hashlib.sha256())
+        self.assertEqual(list(uploads._hashers), ['d'])
+        self.assertIsNone(uploads._take_hasher('b', 10))
+
+        location = self._create(b'x' * 100)
+        self.assertEqual(self._patch(location, 0, b'x' * 10).status_code, 204)
+        self.assertEqual(len(uploads._hashers), 2)
+        self.assertEqual(self.client.delete(location).status_code, 204)
+        self.assertEqual(list(uploads._hashers), ['d'])
+
+    def test_other_users_cannot_touch_session(self):
+        location = self._create(b'x' * 10)
+        other = get_user_model().objects.create_user(username='mallory', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.head(location).status_code, 404)
+        self.assertEqual(self._patch(location, 0, b'x' * 10).status_code, 404)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _create(self, approver, content=b'same content'):
+        return Application.objects.create(
+            applicant='alice', approver=approver, file=SimpleUploadedFile('a.txt', content),
+            original_filename='a.txt', file_size=len(content), content_type='text/plain',
+        )
+
+    def test_identical_content_is_stored_once(self):
+        first = self._create('bob')
+        second = self._create('carol')
+        self.assertEqual(first.sha256, hashlib.sha256(b'same content').hexdigest())
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.etag, f'"{first.sha256}"')
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+        self.assertNotEqual(self._create('dave', b'other').file.name, first.file.name)
+
+    def test_blob_deleted_with_last_reference(self):
+        first = self._create('bob')
+        second = self._create('carol')
+        path = first.file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_archive_keeps_reference(self):
+        application = self._create('bob')
+        Application.objects.filter(pk=application.pk).update(
+            status=ApprovalStatus.APPROVED, updated_at=timezone.now() - timedelta(days=400)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_applications()
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(application.file.path))
+
+    def test_blob_kept_when_delete_rolls_back(self):
+        application = self._create('bob')
+        path = application.file.path
+        StoredBlob.objects.update(ref_count=0)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.assertTrue(delete_if_unreferenced(application.sha256))
+            self.assertFalse(os.path.exists(path))
+            raise RuntimeError
+        # 外側のロールバックで行は戻る。退避した実体は掃除時に元の位置へ戻す
+        self.assertTrue(StoredBlob.objects.filter(sha256=application.sha256).exists())
+        self.assertEqual(purge_orphan_files(grace_seconds=-1), 0)
+        self.assertTrue(os.path.exists(path))
+
+    def test_orphan_file_from_rolled_back_save_is_swept(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            orphan = self._create('bob', b'rolled back').file.path
+            raise RuntimeError
+        self.assertTrue(os.path.exists(orphan))
+        kept = self._create('carol').file.path
+        self.assertEqual(purge_orphan_files(), 0)
+        self.assertEqual(purge_orphan_files(grace_seconds=-1), 1)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(kept))
+
+
+
+class DownloadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.data = bytes(range(256)) * 4
+        self.application = Application.objects.create(
+            applicant='alice', approver='bob', file=SimpleUploadedFile('a.bin', self.data),
+            original_filename='報告書.bin', file_size=len(self.data), content_type='application/octet-stream',
+        )
+        self.url = reverse('applications:application-download', args=[self.application.pk])
+        self.client.force_login(self.alice)
+
+    def test_full_download_with_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['ETag'], self.application.etag)
+        self.assertIn('attachment', response['Content-Disposition'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.application.etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(b''.join(response.streaming_content), self.data[1000:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+
+        # If-Range が一致しなければ全体を返す
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_streams_block_by_block_under_asgi(self):
+        import warnings
+        await self.async_client.aforce_login(self.alice)
+        with patch('applications.downloads.DOWNLOAD_BLOCK_SIZE', 100), warnings.catch_warnings():
+            # FileResponse のままだと全体を読み切る経路に入り Django が警告を出す
+            warnings.simplefilter('error')
+            response = await self.async_client.get(self.url)
+            chunks = [chunk async for chunk in response]
+        self.assertEqual(b''.join(chunks), self.data)
+        self.assertEqual(len(chunks), 11)
+
+    def test_only_parties_can_download(self):
+        other = get_user_model().objects.create_user(username='mallory', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(APPLICATION_DOWNLOAD_ACCEL='nginx', APPLICATION_DOWNLOAD_ACCEL_PREFIX='/protected/')
+    def test_proxy_handoff(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.application.file.name}')
+        self.assertEqual(response.content, b'')
+
+
+class ApprovedFileMoveTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=os.path.join(root, 'media'), APPROVED_DIR=os.path.join(root, 'approved')
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.application = Application.objects.create(
+            applicant='alice', approver='bob', file=SimpleUploadedFile('a.txt', b'approved body'),
+            original_filename='a.txt', file_size=13, content_type='text/plain',
+        )
+        self.source = self.application.file.path
+
+    def _approve_and_run(self):
+        from jobs.worker import run_pending
+        transition_application(self.application, ApprovalStatus.APPROVED)
+        updated_at = Application.objects.get(pk=self.application.pk).updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(run_pending(), 1)
+        application = Application.objects.get(pk=self.application.pk)
+        self.assertEqual(application.updated_at, updated_at)
+        return application
+
+    def _assert_moved(self, application):
+        from django.conf import settings
+        from .blobs import blob_name
+        self.assertTrue(application.file.name.startswith('approved/application/'))
+        self.assertTrue(application.file.path.startswith(settings.APPROVED_DIR))
+        with application.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'approved body')
+        # 共有の実体は blobs/ に残る
+        self.assertTrue(os.path.exists(self.source))
+        self.assertEqual(StoredBlob.objects.get().name, blob_name(application.sha256))
+
+    def test_approval_moves_file_in_background(self):
+        self._assert_moved(self._approve_and_run())
+
+    def test_cross_device_move_copies_and_verifies(self):
+        with patch('applications.approved_files.os.link', side_effect=OSError(errno.EXDEV, 'cross-device')):
+            application = self._approve_and_run()
+        self._assert_moved(application)
+        self.assertNotEqual(os.stat(application.file.path).st_ino, os.stat(self.source).st_ino)
+
+    def test_shared_content_stays_out_of_approved_dir(self):
+        from django.conf import settings
+        other = Application.objects.create(
+            applicant='carol', approver='bob', file=SimpleUploadedFile('b.txt', b'approved body'),
+            original_filename='b.txt', file_size=13, content_type='text/plain',
+        )
+        self.assertEqual(other.file.name, self.application.file.name)
+        approved = self._approve_and_run()
+        self._assert_moved(approved)
+
+        other.refresh_from_db()
+        self.assertEqual(other.status, ApprovalStatus.PENDING)
+        self.assertEqual(other.file.name, self.application.file.name)
+        self.assertFalse(other.file.path.startswith(settings.APPROVED_DIR))
+        later = Application.objects.create(
+            applicant='dave', approver='bob', file=SimpleUploadedFile('c.txt', b'approved body'),
+            original_filename='c.txt', file_size=13, content_type='text/plain',
+        )
+        self.assertEqual(later.file.name, self.application.file.name)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 3)
+
+        # 承認済みの申請を消すと申請専用ファイルだけが消え、共有の実体は残る
+        with self.captureOnCommitCallbacks(execute=True):
+            approved.delete()
+        self.assertFalse(os.path.exists(approved.file.path))
+        self.assertTrue(os.path.exists(self.source))
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+
+    def test_reconcile_restores_shared_blob_moved_by_old_layout(self):
+        from .approved_files import reconcile
+        from .storage import approved_name
+        # 旧実装: 実体ごと approved/ へ移し、申請中の行まで付け替えていた
+        old = approved_name(self.application.file.name)
+        old_path = Application.file.field.storage.path(old)
+        os.makedirs(os.path.dirname(old_path))
+        os.rename(self.source, old_path)
+        StoredBlob.objects.update(name=old)
+        Application.objects.update(file=old)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = reconcile()
+        self.assertEqual(result['blobs_restored'], 1)
+        application = Application.objects.get(pk=self.application.pk)
+        self.assertEqual(application.file.name, StoredBlob.objects.get().name)
+        self.assertEqual(application.file.path, self.source)
+        with application.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'approved body')
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_reconcile_finishes_interrupted_move(self):
+        from .approved_files import approved_target, reconcile
+        Application.objects.filter(pk=self.application.pk).update(status=ApprovalStatus.APPROVED)
+        # 移動先へのコピー後、付け替え前に止まった状態
+        target = approved_target(self.application)
+        os.makedirs(os.path.dirname(Application.file.field.storage.path(target)))
+        shutil.copy(self.source, Application.file.field.storage.path(target))
+        with self.captureOnCommitCallbacks(execute=True):
+            result = reconcile()
+        self.assertEqual(result['moved'], 1)
+        self._assert_moved(Application.objects.get(pk=self.application.pk))
+
+
+
+class ReshardTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _legacy(self, filename, content=b'legacy'):
+        os.makedirs(os.path.join(self.media_root, 'uploads'), exist_ok=True)
+        with open(os.path.join(self.media_root, 'uploads', filename), 'wb') as fh:
+            fh.write(content)
+        return make_application(file=f'uploads/{filename}')
+
+    def test_upload_path_is_sharded(self):
+        from .models import get_upload_path
+        name = get_upload_path(None, 'report.pdf')
+        directory, first, second, filename = name.split('/')
+        self.assertEqual(directory, 'uploads')
+        self.assertEqual(first + second, filename[:4])
+        self.assertTrue(filename.endswith('.pdf'))
+
+    def test_reshard_moves_files_and_resumes(self):
+        from .reshard import reshard, verify
+        done = self._legacy('abcdef01-0000-4000-8000-000000000000.txt')
+        interrupted = self._legacy('12345678-0000-4000-8000-000000000000.txt')
+        # 前回 rename 後・付け替え前に中断した行
+        os.makedirs(os.path.join(self.media_root, 'uploads', '12', '34'))
+        os.rename(interrupted.file.path, os.path.join(self.media_root, 'uploads', '12', '34', interrupted.file.name[8:]))
+        self.assertEqual(verify()['flat'], 2)
+
+        totals = reshard(batch_size=1)
+        self.assertEqual(totals, {'moved': 1, 'repointed': 1, 'missing': 0})
+        done.refresh_from_db()
+        self.assertEqual(done.file.name, 'uploads/ab/cd/abcdef01-0000-4000-8000-000000000000.txt')
+        with done.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'legacy')
+        self.assertEqual(verify(), {'flat': 0, 'missing': []})
+        self.assertEqual(reshard(), {'moved': 0, 'repointed': 0, 'missing': 0})
+
+
+class ZipExportTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.admin = get_user_model().objects.create_user(username='admin', password='pw', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def _create(self, filename, content, status=ApprovalStatus.APPROVED, content_type='text/plain'):
+        return Application.objects.create(
+            applicant='alice', approver='bob', status=status, file=SimpleUploadedFile(filename, content),
+            original_filename=filename, file_size=len(content), content_type=content_type,
+        )
+
+    def _read_zip(self, response):
+        import csv
+        import io
+        import zipfile
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        manifest = list(csv.DictReader(io.StringIO(archive.read('manifest.csv').decode('utf-8-sig'))))
+        return archive, manifest
+
+    def test_streams_approved_files_with_manifest(self):
+        import zipfile
+        text = self._create('memo.txt', b'hello ' * 100)
+        image = self._create('photo.png', b'\x89PNG' + b'\x00' * 100, content_type='image/png')
+        self._create('pending.txt', b'not yet', status=ApprovalStatus.PENDING)
+
+        response = self.client.get(reverse('applications:export-applications'))
+        archive, manifest = self._read_zip(response)
+        self.assertEqual(archive.read(f'{text.pk}_memo.txt'), b'hello ' * 100)
+        self.assertEqual(archive.getinfo(f'{text.pk}_memo.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.getinfo(f'{image.pk}_photo.png').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual([row['id'] for row in manifest], [str(text.pk), str(image.pk)])
+        self.assertEqual(manifest[0]['sha256'], text.sha256)
+        self.assertEqual(manifest[0]['approver'], 'bob')
+
+    def test_selected_ids_and_missing_files(self):
+        kept = self._create('a.txt', b'a')
+        missing = make_application(status=ApprovalStatus.APPROVED, file='uploads/gone.txt')
+        response = self.client.get(
+            reverse('applications:export-applications'), {'ids': f'{kept.pk},{missing.pk}'}
+        )
+        archive, manifest = self._read_zip(response)
+        self.assertEqual(archive.namelist(), [f'{kept.pk}_a.txt', 'manifest.csv'])
+        self.assertEqual([row['state'] for row in manifest], ['ok', 'missing'])
+
+    def test_staff_only(self):
+        self.client.force_login(get_user_model().objects.create_user(username='alice', password='pw'))
+        self.assertEqual(self.client.get(reverse('applications:export-applications')).status_code, 403)
+
+    async def test_streams_chunk_by_chunk_under_asgi(self):
+        import io
+        import warnings
+        import zipfile
+        from asgiref.sync import sync_to_async
+        from . import export
+
+        for i in range(3):
+            await sync_to_async(self._create)(f'file{i}.txt', b'x' * 1000)
+        pulled = []
+        real_export_queryset = export.export_queryset
+
+        def tracking(*querysets):
+            for application in real_export_queryset(*querysets):
+                pulled.append(application.pk)
+                yield application
+
+        await self.async_client.aforce_login(self.admin)
+        with patch('applications.export.export_queryset', tracking), warnings.catch_warnings():
+            # 同期イテレータを丸ごと読み切る経路に入ると Django が警告を出す
+            warnings.simplefilter('error')
+            response = await self.async_client.get(reverse('applications:export-applications'))
+            chunks = []
+            async for chunk in response:
+                chunks.append(chunk)
+                if len(chunks) == 1:
+                    # 最初のチャンクが届いた時点ではまだ1件目しか読んでいない
+                    self.assertEqual(len(pulled), 1)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(len(archive.namelist()), 4)
@@ -0,0 +1,214 @@
+"""申請ステータスの遷移 (承認 / 却下)
+
+読み込んだ行を Python で書き換えて save() する代わりに、
+
+    UPDATE applications_application
+       SET status = ?, approval_comment = ?, approved_at = ?, updated_at = ?, version = version + 1
+     WHERE id = ? AND status = 'pending' AND version = ?
+
+の条件付き UPDATE 1本で遷移させる。別の承認者やダブルクリックで先に更新されて
+いれば 0 行更新となり TransitionConflict を送出する (楽観的排他制御)。
+ステータスカウンタと通知アウトボックスへの登録、承認時のファイル移動ジョブの
+投入、監査ログ (actor 指定時) の記録も同じトランザクションで行う。
+QuerySet.update() のため post_save は発火しない。
+
+bulk_transition() は複数件を同じ1本の UPDATE (id IN (...) AND status='pending')
+で遷移させ、監査ログも1回の bulk_create で記録する。
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from audit.models import AuditLog
+from notifications.models import NotificationType
+from notifications.outbox import enqueue, enqueue_many
+
+from .approved_files import schedule_moves
+from .cards import invalidate_card_fragments
+from .models import Application, ApprovalStatus, ApplicationStatusCounter
+
+TRANSITION_STATUSES = (ApprovalStatus.APPROVED, ApprovalStatus.REJECTED)
+# 遷移先ステータス → 通知アウトボックスのイベント
+TRANSITION_EVENTS = {
+    ApprovalStatus.APPROVED: NotificationType.APPLICATION_APPROVED,
+    ApprovalStatus.REJECTED: NotificationType.APPLICATION_REJECTED,
+}
+# 遷移先ステータス → 監査ログの action と文言
+_AUDIT_ACTIONS = {
+    ApprovalStatus.APPROVED: ('approve', '承認'),
+    ApprovalStatus.REJECTED: ('reject', '却下'),
+}
+
+
+class TransitionError(Exception):
+    """ステータス遷移の失敗"""
+
+
+class InvalidTransition(TransitionError):
+    """遷移先ステータスまたは版番号が不正"""
+
+
+class TransitionConflict(TransitionError):
+    """条件付き UPDATE が 0 行 (既に処理済み・他者が更新済み・削除済み)"""
+
+    def __init__(self, application_id, current=None):
+        self.application_id = application_id
+        # 競合時点の最新行 (削除済みなら None)
+        self.current = current
+        if current is None:
+            message = "申請が見つかりません。"
+        elif current.status != ApprovalStatus.PENDING:
+            message = f"この申請は既に「{current.get_status_display()}」に更新されています。"
+        else:
+            message = "この申請は他のユーザーによって更新されています。再読み込みしてください。"
+        super().__init__(message)
+
+    @property
+    def current_status(self):
+        return self.current.status if self.current is not None else None
+
+
+def parse_version(value):
+    """フォーム / API から受け取った版番号。未指定は None"""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidTransition(f"版番号が不正です: {value!r}")
+
+
+def transition_application(application, new_status, comment='', expected_version=None,
+                           actor=None, audit_action=None, audit_details=None):
+    """申請中の application を new_status へ遷移させ、結果をインスタンスに反映して返す
+
+    expected_version 未指定時は application を読み込んだ時点の version と比較する。
+    actor を指定すると監査ログを遷移と同じトランザクションで記録する
+    (audit_action / audit_details 未指定時は承認・却下の既定の文言)。
+    """
+    if new_status not in TRANSITION_STATUSES:
+        raise InvalidTransition("承認または却下のみ選択可能です。")
+    version = application.version if expected_version is None else expected_version
+    now = timezone.now()
+    changes = {'status': new_status, 'updated_at': now}
+    if comment:
+        changes['approval_comment'] = comment
+    if new_status == ApprovalStatus.APPROVED:
+        changes['approved_at'] = now
+
+    previous_updated_at = application.updated_at
+    with transaction.atomic():
+        updated = Application.objects.filter(
+            pk=application.pk, status=ApprovalStatus.PENDING, version=version
+        ).update(version=F('version') + 1, **changes)
+        if not updated:
+            raise TransitionConflict(application.pk, Application.objects.filter(pk=application.pk).first())
+        # version が一致したので applicant / approver は読み込み時点のままと分かる
+        ApplicationStatusCounter.apply(
+            application.applicant, application.approver, ApprovalStatus.PENDING, delta=-1
+        )
+        ApplicationStatusCounter.apply(
+            application.applicant, application.approver, new_status, delta=1
+        )
+        for field, value in changes.items():
+            setattr(application, field, value)
+        application.version = version + 1
+        application._remember_counter_key()
+        if actor is not None:
+            action, label = _AUDIT_ACTIONS[new_status]
+            AuditLog.objects.create(
+                user=actor,
+                application=application,
+                action=audit_action or action,
+                details=audit_details or f"申請を{label}しました。コメント: {application.approval_comment or 'なし'}",
+            )
+        enqueue(application, TRANSITION_EVENTS[new_status])
+        if new_status == ApprovalStatus.APPROVED:
+            schedule_moves([application])
+
+    invalidate_card_fragments(application.pk, previous_updated_at)
+    return application
+
+
+# bulk_transition の結果 (遷移した申請は遷移先ステータスを返す)
+RESULT_NOT_FOUND = 'not_found'
+RESULT_FORBIDDEN = 'forbidden'
+RESULT_CONFLICT = 'conflict'
+
+BULK_TRANSITION_LIMIT = 500
+
+
+def bulk_transition(ids, new_status, actor, comment='', approver=None):
+    """申請中の ids をまとめて new_status へ遷移させる
+
+    approver を指定した場合はその承認者の申請のみ対象 (他は forbidden)。
+    戻り値は ({id: {'result': ..., 'status': 現在のステータス}}, 遷移した申請のリスト)。
+    通知はアウトボックス経由でコミット後にユーザ単位でまとめて送られる。
+    """
+    if new_status not in TRANSITION_STATUSES:
+        raise InvalidTransition("承認または却下のみ選択可能です。")
+    ids = list(dict.fromkeys(int(pk) for pk in ids))
+    if len(ids) > BULK_TRANSITION_LIMIT:
+        raise InvalidTransition(f"一度に処理できるのは {BULK_TRANSITION_LIMIT} 件までです。")
+    now = timezone.now()
+    changes = {'status': new_status, 'updated_at': now}
+    if comment:
+        changes['approval_comment'] = comment
+    if new_status == ApprovalStatus.APPROVED:
+        changes['approved_at'] = now
+
+    results = {}
+    changed = []
+    with transaction.atomic():
+        rows = Application.objects.select_for_update().in_bulk(ids)
+        for pk in ids:
+            application = rows.get(pk)
+            if application is None:
+                results[pk] = {'result': RESULT_NOT_FOUND, 'status': None}
+            elif approver is not None and application.approver != approver:
+                results[pk] = {'result': RESULT_FORBIDDEN, 'status': application.status}
+            elif application.status != ApprovalStatus.PENDING:
+                results[pk] = {'result': RESULT_CONFLICT, 'status': application.status}
+            else:
+                changed.append(application)
+        if not changed:
+            return results, changed
+
+        updated = Application.objects.filter(
+            pk__in=[a.pk for a in changed], status=ApprovalStatus.PENDING
+        ).update(version=F('version') + 1, **changes)
+        if updated != len(changed):
+            # 行ロックのない環境で読み込み後に他者が更新した。全体を巻き戻す
+            raise TransitionError("並行して更新された申請があります。再実行してください。")
+
+        pairs = Counter((a.applicant, a.approver) for a in changed)
+        for (applicant, approver_name), n in pairs.items():
+            ApplicationStatusCounter.apply(applicant, approver_name, ApprovalStatus.PENDING, delta=-n)
+            ApplicationStatusCounter.apply(applicant, approver_name, new_status, delta=n)
+
+        action, label = _AUDIT_ACTIONS[new_status]
+        AuditLog.objects.bulk_create([
+            AuditLog(
+                user=actor,
+                application=application,
+                action=action,
+                details=f"申請を一括{label}しました。コメント: {comment or 'なし'}",
+            )
+            for application in changed
+        ])
+
+        for application in changed:
+            previous_updated_at = application.updated_at
+            for field, value in changes.items():
+                setattr(application, field, value)
+            application.version += 1
+            application._remember_counter_key()
+            invalidate_card_fragments(application.pk, previous_updated_at)
+            results[application.pk] = {'result': new_status, 'status': new_status}
+
+        enqueue_many(changed, TRANSITION_EVENTS[new_status])
+        if new_status == ApprovalStatus.APPROVED:
+            schedule_moves(changed)
+    return results, changed
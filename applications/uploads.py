@@ -0,0 +1,315 @@
+"""分割・再開可能アップロード (tus 1.0 のコア部分に準拠)
+
+    POST   /applications/uploads/           セッション作成 (Upload-Length / Upload-Metadata)
+    HEAD   /applications/uploads/<id>/      受信済みオフセットの確認 (再開時)
+    PATCH  /applications/uploads/<id>/      Upload-Offset の位置からチャンクを追記
+    DELETE /applications/uploads/<id>/      中断 (部分ファイルを削除)
+
+チャンクは Django のアップロードハンドラ (multipart の解析) を通さず、
+リクエストボディを固定サイズずつ読んで最終保存先のファイルへ書き込む。
+ただし ASGI (daphne) では Django の ASGIHandler がビューを呼ぶ前にボディ全体を
+SpooledTemporaryFile に受け取るため、チャンク1つ分はメモリ/一時ファイルを経由する
+(その量は APPLICATION_UPLOAD_MAX_CHUNK_SIZE で抑える)。
+書き込み → fsync → offset 更新の順なので、接続が切れても受信済み分は確定し、
+クライアントは HEAD で得たオフセットから再送できる。最後のチャンクで
+Application を作成する。
+
+SHA-256 は書き込みと同じループで計算し、プロセス内にチャンク間の途中状態を
+保持する。別プロセスが続きを受けた場合など途中状態が使えないときは、
+完了時にファイルを読み直して計算する。途中状態は最近使われた
+MAX_PENDING_HASHERS 件まで、セッションの有効期限内に限って保持する
+(別プロセスで完了・削除されたセッションの分もここで追い出される)。完了したファイルは内容アドレス方式の
+実体 (applications.blobs) へ移動し、同じ内容が既にあれば共有する。
+
+保存先はローカルファイルシステム (default_storage.path が使えるストレージ) 前提。
+"""
+import base64
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from audit.models import AuditLog
+
+from .blobs import adopt_file, hash_file
+from .forms import validate_approver
+from .models import Application, UploadSession, get_upload_path
+
+logger = logging.getLogger(__name__)
+
+TUS_VERSION = '1.0.0'
+READ_BLOCK_SIZE = 1024 * 1024
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+DEFAULT_MAX_CHUNK_SIZE = 64 * 1024 ** 2
+# 1チャンクの書き込み中に保持するロック期間
+CHUNK_LEASE_SECONDS = 600
+DEFAULT_SESSION_EXPIRY_HOURS = 24
+
+# プロセス内に保持するハッシュ途中状態の上限 (超えたら最も古く使われたものから捨てる)
+MAX_PENDING_HASHERS = 1000
+
+# {セッションID: (ハッシュ済みバイト数, hashlib オブジェクト, 最終利用時刻)} (古い順)
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """アップロード要求の失敗 (status は HTTP ステータス、offset は受信済み位置)"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def max_upload_size():
+    return getattr(settings, 'APPLICATION_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE)
+
+
+def max_chunk_size():
+    return getattr(settings, 'APPLICATION_UPLOAD_MAX_CHUNK_SIZE', DEFAULT_MAX_CHUNK_SIZE)
+
+
+def session_expiry_hours():
+    return getattr(settings, 'APPLICATION_UPLOAD_EXPIRY_HOURS', DEFAULT_SESSION_EXPIRY_HOURS)
+
+
+def parse_metadata(header):
+    """Upload-Metadata ("key base64value,key2 base64value2") を dict にする"""
+    metadata = {}
+    for pair in (header or '').split(','):
+        pair = pair.strip()
+        if not pair:
+            continue
+        key, _, encoded = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(encoded).decode('utf-8') if encoded else ''
+        except (ValueError, UnicodeDecodeError):
+            raise UploadError(f"Upload-Metadata の {key} が不正です")
+    return metadata
+
+
+def create_session(user, length, metadata):
+    """セッションを作成し、保存先に空ファイルを確保する"""
+    try:
+        length = int(length)
+    except (TypeError, ValueError):
+        raise UploadError("Upload-Length が不正です")
+    if length <= 0:
+        raise UploadError("空のファイルはアップロードできません")
+    if length > max_upload_size():
+        raise UploadError("ファイルサイズが上限を超えています", status=413)
+    filename = os.path.basename(metadata.get('filename', '').strip())
+    if not filename:
+        raise UploadError("filename を指定してください")
+    if not metadata.get('approver', '').strip():
+        raise UploadError("approver を指定してください")
+    # 完了時にこの承認者で申請を作るので、フォームと同じ検証をここで済ませる
+    try:
+        approver = validate_approver(user, metadata['approver'])
+    except ValidationError as e:
+        raise UploadError(e.messages[0])
+
+    session = UploadSession(
+        owner=user,
+        approver=approver,
+        comment=metadata.get('comment', ''),
+        original_filename=filename[:255],
+        content_type=(metadata.get('filetype') or 'application/octet-stream')[:100],
+        length=length,
+    )
+    session.storage_name = default_storage.get_available_name(get_upload_path(session, filename))
+    path = default_storage.path(session.storage_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'xb').close()
+    session.save()
+    return session
+
+
+def _take_hasher(session_id, offset):
+    """offset バイト目まで計算済みの途中状態を取り出す。先頭からなら新規に作る"""
+    with _hashers_lock:
+        entry = _hashers.pop(session_id, None)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    return hashlib.sha256() if offset == 0 else None
+
+
+def _keep_hasher(session_id, offset, hasher):
+    now = time.monotonic()
+    expiry = now - session_expiry_hours() * 3600
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher, now)
+        _hashers.move_to_end(session_id)
+        # 期限切れ (放棄・他プロセスで完了したセッション) と上限超過分を古い順に捨てる
+        while _hashers and (
+            len(_hashers) > MAX_PENDING_HASHERS or next(iter(_hashers.values()))[2] < expiry
+        ):
+            _hashers.popitem(last=False)
+
+
+def _copy_body(stream, fh, limit, hasher=None):
+    """stream から最大 limit バイトを READ_BLOCK_SIZE ずつ fh に書き、書けたバイト数を返す
+
+    途中で接続が切れた場合もそれまでに受信した分は書き込んだまま返す。
+    hasher があれば書き込んだデータでハッシュを更新する。
+    """
+    written = 0
+    while written < limit:
+        try:
+            block = stream.read(min(READ_BLOCK_SIZE, limit - written))
+        except OSError:
+            logger.info("Upload stream interrupted | written=%s", written)
+            break
+        if not block:
+            break
+        fh.write(block)
+        if hasher is not None:
+            hasher.update(block)
+        written += len(block)
+    return written
+
+
+def append_chunk(session_id, user, offset, stream, content_length=None):
+    """offset の位置からチャンクを書き込み、更新後のセッションを返す
+
+    クライアントのオフセットが受信済み位置と異なれば 409、他の PATCH が
+    書き込み中なら 423。完了したチャンクでは Application を作成する。
+    """
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        raise UploadError("Upload-Offset が不正です")
+    session = UploadSession.objects.filter(pk=session_id, owner=user).first()
+    if session is None:
+        raise UploadError("アップロードが見つかりません", status=404)
+    if session.is_complete:
+        raise UploadError("このアップロードは完了しています", status=409, offset=session.offset)
+    if offset != session.offset:
+        raise UploadError(
+            f"オフセットが一致しません (受信済み: {session.offset})", status=409, offset=session.offset
+        )
+
+    remaining = session.length - offset
+    limit = min(remaining, max_chunk_size())
+    if content_length is not None:
+        try:
+            content_length = int(content_length)
+        except (TypeError, ValueError):
+            raise UploadError("Content-Length が不正です")
+        if content_length > remaining:
+            raise UploadError("Upload-Length を超えるデータです", status=413)
+        if content_length > limit:
+            raise UploadError("チャンクが大きすぎます", status=413)
+        limit = content_length
+
+    # 同じオフセットへの並行 PATCH (二重送信) を排他する
+    now = timezone.now()
+    claimed = UploadSession.objects.filter(
+        pk=session.pk, offset=offset, completed_at__isnull=True
+    ).filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now)).update(
+        locked_until=now + timedelta(seconds=CHUNK_LEASE_SECONDS)
+    )
+    if not claimed:
+        raise UploadError("別の転送が進行中です", status=423)
+
+    written = 0
+    hasher = _take_hasher(session.pk, offset)
+    try:
+        with open(default_storage.path(session.storage_name), 'r+b') as fh:
+            fh.seek(offset)
+            written = _copy_body(stream, fh, limit, hasher)
+            fh.flush()
+            os.fsync(fh.fileno())
+    finally:
+        UploadSession.objects.filter(pk=session.pk).update(
+            offset=offset + written, locked_until=None, updated_at=timezone.now()
+        )
+    session.offset = offset + written
+    if hasher is not None:
+        _keep_hasher(session.pk, session.offset, hasher)
+    if session.offset == session.length:
+        _complete(session)
+    return session
+
+
+def _complete(session):
+    """全データ受信後に申請を作成する"""
+    path = default_storage.path(session.storage_name)
+    with open(path, 'r+b') as fh:
+        # 中断・再送で末尾に残った余分なデータを切り詰める
+        fh.truncate(session.length)
+    hasher = _take_hasher(session.pk, session.length)
+    sha256 = hasher.hexdigest() if hasher is not None else hash_file(path)
+    with transaction.atomic():
+        # 完了処理の二重実行を防ぐ
+        if not UploadSession.objects.filter(pk=session.pk, completed_at__isnull=True).update(
+            completed_at=timezone.now()
+        ):
+            session.refresh_from_db()
+            return session.application
+        blob = adopt_file(path, sha256, session.length)
+        application = Application(
+            applicant=session.owner.username,
+            approver=session.approver,
+            original_filename=session.original_filename,
+            file_size=session.length,
+            content_type=session.content_type,
+            comment=session.comment,
+            sha256=sha256,
+        )
+        # ファイルは実体として配置済みなので名前だけ設定する
+        application.file.name = blob.name
+        application.save()
+        AuditLog.objects.create(
+            user=session.owner,
+            application=application,
+            action="create",
+            details=f"申請を作成しました。ファイル: {application.original_filename}（分割アップロード）"
+        )
+        UploadSession.objects.filter(pk=session.pk).update(application=application)
+    session.application = application
+    session.completed_at = timezone.now()
+    logger.info("Upload completed | session=%s application=%s size=%s",
+                session.pk, application.pk, session.length)
+    return application
+
+
+def terminate_session(session_id, user):
+    """未完了セッションを部分ファイルごと削除する"""
+    session = UploadSession.objects.filter(pk=session_id, owner=user).first()
+    if session is None:
+        raise UploadError("アップロードが見つかりません", status=404)
+    if session.is_complete:
+        raise UploadError("完了したアップロードは削除できません", status=409)
+    _discard(session)
+
+
+def _discard(session):
+    with _hashers_lock:
+        _hashers.pop(session.pk, None)
+    default_storage.delete(session.storage_name)
+    session.delete()
+
+
+def purge_stale_sessions(hours=None):
+    """一定時間更新のない未完了セッションを削除し、件数を返す"""
+    if hours is None:
+        hours = session_expiry_hours()
+    cutoff = timezone.now() - timedelta(hours=hours)
+    stale = UploadSession.objects.filter(completed_at__isnull=True, updated_at__lt=cutoff)
+    count = 0
+    for session in stale.iterator():
+        _discard(session)
+        count += 1
+    return count
@@ -11,20 +11,25 @@ urlpatterns = [
     # Template views - 詳細なパターンを先に配置
     path('<int:pk>/detail/', views.application_detail_modal, name='application-detail-modal'),
     path('<int:pk>/card/', views.application_card, name='application-card'),
+    path('<int:pk>/download/', views.download_application_file, name='application-download'),
     path('create/', views.create_application, name='create-application'),
+    path('uploads/', views.upload_session_create, name='upload-sessions'),
+    path('uploads/<uuid:pk>/', views.upload_session_detail, name='upload-session'),
     path('list/', views.application_list, name='application-list'),
     path('admin/list/', views.admin_application_list, name='admin-application-list'),
+    path('admin/export/', views.export_applications, name='export-applications'),
     path('my/', views.my_applications, name='my-applications-list'),
     path('my/board/', views.my_applications_board, name='my-applications-board'),
     path('pending/', views.pending_approvals, name='pending-approvals'),
     path('approval/board/', views.approval_board, name='approval-board'),
+    path('board/column/', views.board_column_page, name='board-column'),
     path('approval/history/', views.my_approval_history, name='my-approval-history'),
     path('update-status/', views.update_application_status, name='update-application-status'),
     
-    # API endpoints
-    path('api/', include(router.urls)),
+    # API endpoints (router の api/<pk>/ に吸収されないよう固定パスを先に配置)
     path('api/my/', views.MyApplicationListView.as_view(), name='api-my-applications'),
     path('api/pending/', views.PendingApplicationListView.as_view(), name='api-pending-applications'),
+    path('api/', include(router.urls)),
     
     # カンバンボード（最後に配置）
     path('', views.kanban_board, name='kanban-board'),
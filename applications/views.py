@@ -1,37 +1,64 @@
+import logging
+
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, JsonResponse, HttpResponse
+from django.views.decorators.http import require_http_methods, require_POST
 from django.contrib import messages
 from django.db import transaction
 from django.db import models
 from django.template.loader import render_to_string
-from django.utils import timezone
-from .models import Application, ApprovalStatus
-from .serializers import ApplicationSerializer, ApplicationCreateSerializer, ApplicationStatusUpdateSerializer
-from .forms import ApplicationCreateForm, ApplicationFilterForm
+from .models import (
+    Application, ApprovalStatus, ApplicationStatusCounter, ArchivedApplication, CounterRole, UploadSession,
+)
+from .serializers import (
+    ApplicationBulkStatusSerializer, ApplicationSerializer, ApplicationCreateSerializer,
+    ApplicationStatusUpdateSerializer,
+)
+from .forms import ApplicationCreateForm, ApplicationExportForm, ApplicationFilterForm
+from .pagination import ApplicationPagination, paginate_request
+from .board import board_context, load_column_page
+from .search import search_applications
+from .archive import get_application_or_archived
+from .downloads import can_download, serve_application_file
+from .export import export_response
+from .uploads import (
+    TUS_VERSION, UploadError, append_chunk, create_session, max_upload_size, parse_metadata,
+    terminate_session,
+)
+from .transitions import (
+    InvalidTransition, TransitionConflict, TransitionError, bulk_transition, parse_version,
+    transition_application,
+)
 from audit.models import AuditLog
 
+logger = logging.getLogger(__name__)
+
 
 class ApplicationViewSet(viewsets.ModelViewSet):
     """申請のViewSet"""
     queryset = Application.objects.all()
     serializer_class = ApplicationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ApplicationPagination
     
     def get_queryset(self):
         """ユーザーに応じたクエリセットを返す"""
         user = self.request.user
+        queryset = Application.objects.select_related('applicant_user', 'approver_user')
+        # ?q= でファイル名・コメントの全文検索
+        queryset = search_applications(queryset, self.request.query_params.get('q'))
         if user.is_staff:
             # 管理者は全ての申請を閲覧可能
-            return Application.objects.all()
+            return queryset
         else:
             # 一般ユーザーは自分の申請と自分が承認者の申請のみ
-            return Application.objects.filter(
+            return queryset.filter(
                 models.Q(applicant=user.username) | models.Q(approver=user.username)
             ).distinct()
     
@@ -41,6 +68,8 @@ class ApplicationViewSet(viewsets.ModelViewSet):
             return ApplicationCreateSerializer
         elif self.action == 'update_status':
             return ApplicationStatusUpdateSerializer
+        elif self.action == 'bulk_status':
+            return ApplicationBulkStatusSerializer
         return ApplicationSerializer
     
     def perform_create(self, serializer):
@@ -53,8 +82,7 @@ class ApplicationViewSet(viewsets.ModelViewSet):
             action="create",
             details=f"申請を作成しました。ファイル: {application.original_filename}"
         )
-        from notifications.services import NotificationService
-        NotificationService.notify_new_application(application)
+        # 承認者への通知は post_save で通知アウトボックスに登録される
     
     @action(detail=True, methods=['patch'], permission_classes=[IsAuthenticated])
     def update_status(self, request, pk=None):
@@ -66,46 +94,67 @@ class ApplicationViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(application, data=request.data, partial=True)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        with transaction.atomic():
-            old_status = application.status
-            serializer.save()
-            from notifications.services import NotificationService
-            if application.status == ApprovalStatus.APPROVED:
-                action = "approve"
-                details = f"申請を承認しました。コメント: {application.approval_comment or 'なし'}"
-                NotificationService.notify_application_approved(application)
-            elif application.status == ApprovalStatus.REJECTED:
-                action = "reject"
-                details = f"申請を拒否しました。コメント: {application.approval_comment or 'なし'}"
-                NotificationService.notify_application_rejected(application)
-            else:
-                action = "update_status"
-                details = f"ステータスを {old_status} から {application.status} に変更しました。"
-            AuditLog.objects.create(
-                user=request.user,
-                application=application,
-                action=action,
-                details=details
+        new_status = serializer.validated_data.get('status')
+        if new_status is None:
+            return Response({'status': ['この項目は必須です。']}, status=status.HTTP_400_BAD_REQUEST)
+        comment = serializer.validated_data.get('approval_comment', '')
+        try:
+            # 監査ログは遷移と同じトランザクションで記録する
+            transition_application(
+                application, new_status, comment,
+                expected_version=parse_version(request.data.get('version')),
+                actor=request.user,
+            )
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TransitionConflict as e:
+            return Response(
+                {'error': str(e), 'status': e.current_status},
+                status=status.HTTP_409_CONFLICT,
             )
-        return Response(serializer.data)
+        # 通知は transition_application が通知アウトボックスに登録済み
+        return Response(self.get_serializer(application).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status', permission_classes=[IsAuthenticated])
+    def bulk_status(self, request):
+        """申請の一括承認・却下 (1トランザクション)。結果は申請IDごとに返す"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        # 管理者以外は自分が承認者の申請のみ
+        approver = None if request.user.is_staff else request.user.username
+        try:
+            results, changed = bulk_transition(
+                data['ids'], data['status'], request.user, data['approval_comment'], approver=approver
+            )
+        except TransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            'updated': len(changed),
+            'results': [{'id': pk, **result} for pk, result in results.items()],
+        })
 
 
 class MyApplicationListView(generics.ListAPIView):
     """自分の申請一覧"""
     serializer_class = ApplicationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ApplicationPagination
     
     def get_queryset(self):
-        return Application.objects.filter(applicant=self.request.user.username)
+        return Application.objects.select_related('applicant_user', 'approver_user').filter(
+            applicant=self.request.user.username
+        )
 
 
 class PendingApplicationListView(generics.ListAPIView):
     """承認待ち申請一覧"""
     serializer_class = ApplicationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ApplicationPagination
     
     def get_queryset(self):
-        return Application.objects.filter(
+        return Application.objects.select_related('applicant_user', 'approver_user').filter(
             approver=self.request.user.username,
             status=ApprovalStatus.PENDING
         )
@@ -128,36 +177,25 @@ def update_application_status(request):
             return JsonResponse({'error': '権限がありません'}, status=403)
         
         old_status = application.status
-        application.status = new_status
-        
-        if comment:
-            application.approval_comment = comment
-            
-        if new_status == ApprovalStatus.APPROVED:
-            application.approved_at = timezone.now()
-            
-        application.save()
-        
-        # 通知サービスのインポート
-        from notifications.services import NotificationService
+        # 条件付き UPDATE 1本で遷移 (先に他者が処理していれば 409)。監査ログも同じトランザクションで記録
+        try:
+            transition_application(
+                application, new_status, comment,
+                expected_version=parse_version(request.POST.get('version')),
+                actor=request.user,
+                audit_action=f"status_change_{new_status}",
+                audit_details=f"ステータスを {old_status} から {new_status} に変更。コメント: {comment or 'なし'}",
+            )
+        except InvalidTransition as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except TransitionConflict as e:
+            return JsonResponse({'error': str(e), 'status': e.current_status}, status=409)
         
-        # 通知を送信
-        if new_status == ApprovalStatus.APPROVED:
-            NotificationService.notify_application_approved(application)
-        elif new_status == ApprovalStatus.REJECTED:
-            NotificationService.notify_application_rejected(application)
-        
-        # 監査ログを記録
-        AuditLog.objects.create(
-            user=request.user,
-            application=application,
-            action=f"status_change_{new_status}",
-            details=f"ステータスを {old_status} から {new_status} に変更。コメント: {comment or 'なし'}"
-        )
+        # 通知は transition_application が通知アウトボックスに登録済み (送信はコミット後)
         
         # 更新されたカードのHTMLを返す
         card_html = render_to_string('applications/application_card.html', {
-            'application': application
+            'application': application,
         }, request=request)
         
         return HttpResponse(card_html)
@@ -168,8 +206,10 @@ def update_application_status(request):
 
 @login_required
 def application_detail_modal(request, pk):
-    """申請詳細のモーダル表示（HTMX用）"""
-    application = get_object_or_404(Application, pk=pk)
+    """申請詳細のモーダル表示（HTMX用）。アーカイブ済みの申請も表示する"""
+    application = get_application_or_archived(pk)
+    if application is None:
+        raise Http404
     
     return render(request, 'applications/application_detail_modal.html', {
         'application': application,
@@ -177,6 +217,21 @@ def application_detail_modal(request, pk):
     })
 
 
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+def download_application_file(request, pk):
+    """申請ファイルのダウンロード（申請者・承認者・スタッフのみ。アーカイブ済みも可）
+
+    ?inline=1 でブラウザ内表示 (画像プレビュー等)。
+    """
+    application = get_application_or_archived(pk)
+    if application is None:
+        raise Http404
+    if not can_download(application, request.user):
+        return JsonResponse({'error': 'アクセス権限がありません'}, status=403)
+    return serve_application_file(request, application, as_attachment=not request.GET.get('inline'))
+
+
 @login_required
 def application_card(request, pk):
     """申請カード取得（リアルタイム更新用）"""
@@ -190,12 +245,34 @@ def application_card(request, pk):
     
     # カードHTMLを返す
     card_html = render_to_string('applications/application_card.html', {
-        'application': application
+        'application': application,
     }, request=request)
     
     return HttpResponse(card_html, content_type='text/html')
 
 
+@login_required
+def board_column_page(request):
+    """カンバンのカラム続き読み込み（カードHTML断片 + X-Next-Cursor ヘッダー）"""
+    role = request.GET.get('role')
+    column_status = request.GET.get('status')
+    if role not in CounterRole.values or column_status not in ApprovalStatus.values:
+        return JsonResponse({'error': 'role または status が不正です'}, status=400)
+    try:
+        page = load_column_page(
+            request.user.username, role, column_status, request.GET.get('cursor')
+        )
+    except ValueError:
+        return JsonResponse({'error': 'カーソルが不正です'}, status=400)
+
+    cards_html = render_to_string('applications/board_column_cards.html', {
+        'applications': page,
+    }, request=request)
+    response = HttpResponse(cards_html, content_type='text/html')
+    response['X-Next-Cursor'] = page.next_cursor or ''
+    return response
+
+
 @login_required
 def create_application(request):
     """申請作成ページ"""
@@ -214,9 +291,7 @@ def create_application(request):
                         details=f"申請を作成しました。ファイル: {application.original_filename}"
                     )
                     
-                    # 承認者に通知を送信
-                    from notifications.services import NotificationService
-                    NotificationService.notify_new_application(application)
+                    # 承認者への通知は post_save で通知アウトボックスに登録される
                     
                     messages.success(request, '申請が正常に作成されました。')
                     return redirect('applications:kanban-board')
@@ -250,6 +325,84 @@ def create_application(request):
     })
 
 
+def _tus_response(response, session=None):
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Cache-Control'] = 'no-store'
+    if session is not None:
+        response['Upload-Offset'] = str(session.offset)
+        response['Upload-Length'] = str(session.length)
+        if session.application_id:
+            response['X-Application-Id'] = str(session.application_id)
+    return response
+
+
+def _upload_error(error):
+    response = _tus_response(JsonResponse({'error': str(error)}, status=error.status))
+    if error.offset is not None:
+        response['Upload-Offset'] = str(error.offset)
+    return response
+
+
+@login_required
+@require_POST
+def upload_session_create(request):
+    """分割アップロードのセッション作成 (tus の Creation)
+
+    Upload-Length と Upload-Metadata (filename / filetype / approver / comment) を受け取り、
+    201 + Location を返す。以降のチャンクは Location へ PATCH する。
+    """
+    try:
+        session = create_session(
+            request.user,
+            request.headers.get('Upload-Length'),
+            parse_metadata(request.headers.get('Upload-Metadata')),
+        )
+    except UploadError as e:
+        return _upload_error(e)
+    location = reverse('applications:upload-session', args=[session.pk])
+    response = JsonResponse({'id': str(session.pk), 'offset': 0, 'location': location}, status=201)
+    response['Location'] = location
+    return _tus_response(response, session)
+
+
+@login_required
+@require_http_methods(['HEAD', 'PATCH', 'DELETE', 'OPTIONS'])
+def upload_session_detail(request, pk):
+    """分割アップロードの再開位置確認 (HEAD)・チャンク追記 (PATCH)・中断 (DELETE)"""
+    if request.method == 'OPTIONS':
+        response = HttpResponse(status=204)
+        response['Tus-Version'] = TUS_VERSION
+        response['Tus-Extension'] = 'creation,termination'
+        response['Tus-Max-Size'] = str(max_upload_size())
+        return _tus_response(response)
+    if request.method == 'DELETE':
+        try:
+            terminate_session(pk, request.user)
+        except UploadError as e:
+            return _upload_error(e)
+        return _tus_response(HttpResponse(status=204))
+    if request.method == 'HEAD':
+        session = UploadSession.objects.filter(pk=pk, owner=request.user).first()
+        if session is None:
+            return _tus_response(HttpResponse(status=404))
+        return _tus_response(HttpResponse(status=200), session)
+
+    if request.content_type != 'application/offset+octet-stream':
+        return _tus_response(JsonResponse(
+            {'error': 'Content-Type は application/offset+octet-stream を指定してください'}, status=415
+        ))
+    try:
+        # request.body / request.POST には触れず、ボディを READ_BLOCK_SIZE ずつ読んで書き込む
+        # (ASGI ではボディはこの時点で一時領域に受信済み。uploads のモジュール docstring 参照)
+        session = append_chunk(
+            pk, request.user, request.headers.get('Upload-Offset'), request,
+            content_length=request.headers.get('Content-Length') or None,
+        )
+    except UploadError as e:
+        return _upload_error(e)
+    return _tus_response(HttpResponse(status=204), session)
+
+
 @login_required
 def application_list(request):
     """申請一覧ページ（テーブル表示） - 一般ユーザー用"""
@@ -263,6 +416,8 @@ def application_list(request):
     
     # フィルタ適用
     if filter_form.is_valid():
+        if filter_form.cleaned_data.get('q'):
+            queryset = search_applications(queryset, filter_form.cleaned_data['q'])
         if filter_form.cleaned_data.get('status'):
             queryset = queryset.filter(status=filter_form.cleaned_data['status'])
         if filter_form.cleaned_data.get('applicant'):
@@ -273,11 +428,8 @@ def application_list(request):
     # 承認者としての表示かどうかを判定
     is_approval_view = queryset.filter(approver=request.user.username).exists()
     
-    # ページネーション
-    from django.core.paginator import Paginator
-    paginator = Paginator(queryset, 20)  # 1ページあたり20件
-    page_number = request.GET.get('page')
-    applications = paginator.get_page(page_number)
+    # ページネーション（1ページあたり20件、カーソル指定時はキーセット方式）
+    applications = paginate_request(request, queryset, 20)
     
     context = {
         'applications': applications,
@@ -300,11 +452,15 @@ def admin_application_list(request):
     # フィルタフォーム
     filter_form = ApplicationFilterForm(request.GET, user=request.user)
     
-    # 全ての申請を取得
-    queryset = Application.objects.all().order_by('-created_at')
+    # 全ての申請を取得 (アーカイブ指定時はアーカイブテーブルから)
+    show_archived = filter_form.is_valid() and filter_form.cleaned_data.get('archived')
+    model = ArchivedApplication if show_archived else Application
+    queryset = model.objects.all().order_by('-created_at')
     
     # フィルタ適用
     if filter_form.is_valid():
+        if filter_form.cleaned_data.get('q'):
+            queryset = search_applications(queryset, filter_form.cleaned_data['q'])
         if filter_form.cleaned_data.get('status'):
             queryset = queryset.filter(status=filter_form.cleaned_data['status'])
         if filter_form.cleaned_data.get('applicant'):
@@ -312,20 +468,11 @@ def admin_application_list(request):
         if filter_form.cleaned_data.get('approver'):
             queryset = queryset.filter(approver=filter_form.cleaned_data['approver'])
     
-    # 統計情報を取得
-    from django.db.models import Count
-    stats = Application.objects.aggregate(
-        total=Count('id'),
-        pending=Count('id', filter=models.Q(status='pending')),
-        approved=Count('id', filter=models.Q(status='approved')),
-        rejected=Count('id', filter=models.Q(status='rejected'))
-    )
+    # 統計情報を取得 (集計済みカウンタから読むためテーブル件数に依存しない)
+    stats = ApplicationStatusCounter.global_counts()
     
-    # ページネーション
-    from django.core.paginator import Paginator
-    paginator = Paginator(queryset, 20)  # 1ページあたり20件
-    page_number = request.GET.get('page')
-    applications = paginator.get_page(page_number)
+    # ページネーション（1ページあたり20件、カーソル指定時はキーセット方式）
+    applications = paginate_request(request, queryset, 20)
     
     context = {
         'applications': applications,
@@ -333,11 +480,33 @@ def admin_application_list(request):
         'title': '全申請一覧（管理者）',
         'is_admin_view': True,
         'stats': stats,
+        'show_archived': show_archived,
     }
     
     return render(request, 'applications/admin_application_list.html', context)
 
 
+@login_required
+def export_applications(request):
+    """申請ファイルの ZIP エクスポート（管理者用、ストリーミング）
+
+    管理者一覧と同じ GET パラメータ (status / applicant / approver / archived) に加え、
+    ids・department・approved_from・approved_to で絞り込める。status 未指定は承認済み。
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': '管理者権限が必要です'}, status=403)
+    params = request.GET.copy()
+    params.setdefault('status', ApprovalStatus.APPROVED)
+    form = ApplicationExportForm(params)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    querysets = [form.filter(Application.objects.all())]
+    if form.cleaned_data['archived']:
+        querysets.append(form.filter(ArchivedApplication.objects.all()))
+    logger.info("Application export | user=%s params=%s", request.user.username, params.urlencode())
+    return export_response(*querysets)
+
+
 @login_required
 def my_applications(request):
     """自分の申請一覧"""
@@ -346,10 +515,7 @@ def my_applications(request):
     ).order_by('-created_at')
     
     # ページネーション
-    from django.core.paginator import Paginator
-    paginator = Paginator(applications, 20)
-    page_number = request.GET.get('page')
-    applications = paginator.get_page(page_number)
+    applications = paginate_request(request, applications, 20)
     
     context = {
         'applications': applications,
@@ -362,23 +528,13 @@ def my_applications(request):
 @login_required
 def my_applications_board(request):
     """自分の申請状況ボード（申請者として）"""
-    applications = Application.objects.filter(
-    applicant=request.user.username
-    ).order_by('-created_at')
-    
-    # ステータスごとに分類
-    pending_applications = applications.filter(status=ApprovalStatus.PENDING)
-    approved_applications = applications.filter(status=ApprovalStatus.APPROVED)
-    rejected_applications = applications.filter(status=ApprovalStatus.REJECTED)
-    
-    context = {
-        'pending_applications': pending_applications,
-        'approved_applications': approved_applications,
-        'rejected_applications': rejected_applications,
+    # ステータスごとに分類（1クエリで各カラム先頭N件）
+    context = board_context(request.user.username, CounterRole.APPLICANT)
+    context.update({
         'approval_choices': ApprovalStatus.choices,
         'title': '申請状況ボード',
         'is_applicant_view': True,
-    }
+    })
     
     return render(request, 'applications/applicant_kanban_board.html', context)
 
@@ -392,10 +548,7 @@ def pending_approvals(request):
     ).order_by('-created_at')
     
     # ページネーション
-    from django.core.paginator import Paginator
-    paginator = Paginator(applications, 20)
-    page_number = request.GET.get('page')
-    applications = paginator.get_page(page_number)
+    applications = paginate_request(request, applications, 20)
     
     context = {
         'applications': applications,
@@ -409,23 +562,13 @@ def pending_approvals(request):
 @login_required
 def approval_board(request):
     """承認管理ボード（承認者として）"""
-    applications = Application.objects.filter(
-    approver=request.user.username
-    ).order_by('-created_at')
-    
-    # ステータスごとに分類
-    pending_applications = applications.filter(status=ApprovalStatus.PENDING)
-    approved_applications = applications.filter(status=ApprovalStatus.APPROVED)
-    rejected_applications = applications.filter(status=ApprovalStatus.REJECTED)
-    
-    context = {
-        'pending_applications': pending_applications,
-        'approved_applications': approved_applications,
-        'rejected_applications': rejected_applications,
+    # ステータスごとに分類（1クエリで各カラム先頭N件）
+    context = board_context(request.user.username, CounterRole.APPROVER)
+    context.update({
         'approval_choices': ApprovalStatus.choices,
         'title': '承認管理ボード',
         'is_approval_view': True,
-    }
+    })
     
     return render(request, 'applications/approver_kanban_board.html', context)
 
@@ -437,11 +580,8 @@ def my_approval_history(request):
     approver=request.user.username
     ).exclude(status=ApprovalStatus.PENDING).order_by('-updated_at')
     
-    # ページネーション
-    from django.core.paginator import Paginator
-    paginator = Paginator(applications, 20)
-    page_number = request.GET.get('page')
-    applications = paginator.get_page(page_number)
+    # ページネーション（更新日時順のためキーセットも updated_at をキーにする）
+    applications = paginate_request(request, applications, 20, field='updated_at')
     
     context = {
         'applications': applications,
@@ -456,9 +596,9 @@ def my_approval_history(request):
 def kanban_board(request):
     """カンバンボード - ユーザーのロールに応じて適切なボードにリダイレクト"""
     # 承認者として何かの申請を持っている場合は承認ボードを表示
-    has_approvals = Application.objects.filter(approver=request.user.username).exists()
+    has_approvals = ApplicationStatusCounter.has_any(request.user.username, CounterRole.APPROVER)
     # 申請者として何かの申請を持っている場合は申請ボードを表示
-    has_applications = Application.objects.filter(applicant=request.user.username).exists()
+    has_applications = ApplicationStatusCounter.has_any(request.user.username, CounterRole.APPLICANT)
     
     # URLパラメータで表示モードを指定できるようにする
     view_mode = request.GET.get('view', None)
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0007_archivedapplication'),
+        ('audit', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=50, verbose_name='アクション')),
+                ('details', models.TextField(verbose_name='詳細')),
+                ('created_at', models.DateTimeField(verbose_name='実行日時')),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_logs', to='applications.archivedapplication', verbose_name='対象申請')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='実行ユーザー')),
+            ],
+            options={
+                'verbose_name': '監査ログ（アーカイブ）',
+                'verbose_name_plural': '監査ログ（アーカイブ）',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -35,3 +35,37 @@ class AuditLog(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.action} - {self.created_at}"
+
+
+class ArchivedAuditLog(models.Model):
+    """アーカイブ済み申請の監査ログ (applications.ArchivedApplication と同時に移動)"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="実行ユーザー"
+    )
+    application = models.ForeignKey(
+        'applications.ArchivedApplication',
+        on_delete=models.CASCADE,
+        related_name='audit_logs',
+        verbose_name="対象申請"
+    )
+    action = models.CharField(
+        max_length=50,
+        verbose_name="アクション"
+    )
+    details = models.TextField(
+        verbose_name="詳細"
+    )
+    created_at = models.DateTimeField(
+        verbose_name="実行日時"
+    )
+
+    class Meta:
+        verbose_name = "監査ログ（アーカイブ）"
+        verbose_name_plural = "監査ログ（アーカイブ）"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.action} - {self.created_at}"
@@ -54,10 +54,16 @@ INSTALLED_APPS = [
     'users', 
     'audit',
     'notifications',
+    'jobs',
 ]
 
-# 通知機能 ON/OFF フラグ（後で復活予定）
-NOTIFICATIONS_ENABLED = False  # 一時停止中。復活時 True に変更または環境変数化
+# 通知機能 ON/OFF フラグ
+# 通知は通知アウトボックス (notifications.OutboxEvent) に登録され、コミット後に配信される
+NOTIFICATIONS_ENABLED = config('NOTIFICATIONS_ENABLED', default=True, cast=bool)
+# True: コミット後にプロセス内の配信スレッドで即時配信 / False: dispatch_outbox コマンドのみで配信
+NOTIFICATION_OUTBOX_AUTODISPATCH = config('NOTIFICATION_OUTBOX_AUTODISPATCH', default=True, cast=bool)
+# この回数配信に失敗したイベントは打ち切り (管理画面から再配信できる)
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = config('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
@@ -161,8 +167,31 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # File storage settings
 UPLOAD_DIR = BASE_DIR / 'storage' / 'uploads'
+# 承認済みファイルの移動先 (ストレージ上の名前は approved/ で始まる)
 APPROVED_DIR = BASE_DIR / 'storage' / 'approved'
 
+STORAGES = {
+    'default': {'BACKEND': 'applications.storage.ApplicationFileStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Cache
+# template_fragments: 申請カードの {% cache %} 用。MAX_ENTRIES 超過時は古いものから間引かれる
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CARD_FRAGMENT_CACHE_MAX_ENTRIES', default=5000, cast=int),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -183,6 +212,46 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# 申請一覧をキーセット(カーソル)方式で常にページングするか
+# False の場合も ?pagination=cursor / ?cursor= 指定でリクエスト単位に切り替え可能
+APPLICATIONS_KEYSET_PAGINATION = config('APPLICATIONS_KEYSET_PAGINATION', default=False, cast=bool)
+
+# カンバンボードの各カラムに初期表示するカード数 (超過分は「他 N 件」と表示)
+KANBAN_COLUMN_LIMIT = config('KANBAN_COLUMN_LIMIT', default=50, cast=int)
+
+# 承認済み/却下済みの申請をアーカイブテーブルへ移すまでの日数 (archive_applications コマンド)
+APPLICATION_ARCHIVE_AFTER_DAYS = config('APPLICATION_ARCHIVE_AFTER_DAYS', default=180, cast=int)
+
+# 申請ファイルのダウンロードをフロントのプロキシに任せる
+# '' (Django が FileResponse で返す) / 'nginx' (X-Accel-Redirect) / 'sendfile' (X-Sendfile: Apache mod_xsendfile 等)
+APPLICATION_DOWNLOAD_ACCEL = config('APPLICATION_DOWNLOAD_ACCEL', default='')
+# nginx の internal location (MEDIA_ROOT を alias したもの)
+APPLICATION_DOWNLOAD_ACCEL_PREFIX = config('APPLICATION_DOWNLOAD_ACCEL_PREFIX', default='/protected-media/')
+
+# 分割・再開可能アップロード (/applications/uploads/)
+APPLICATION_UPLOAD_MAX_SIZE = config('APPLICATION_UPLOAD_MAX_SIZE', default=10 * 1024 ** 3, cast=int)
+# PATCH 1回で受け付ける最大バイト数
+APPLICATION_UPLOAD_MAX_CHUNK_SIZE = config('APPLICATION_UPLOAD_MAX_CHUNK_SIZE', default=64 * 1024 ** 2, cast=int)
+# この時間更新のない未完了アップロードは削除される
+APPLICATION_UPLOAD_EXPIRY_HOURS = config('APPLICATION_UPLOAD_EXPIRY_HOURS', default=24, cast=int)
+
+# バックグラウンドジョブ (run_workers コマンド)
+JOB_WORKER_THREADS = config('JOB_WORKER_THREADS', default=2, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+# 取得したジョブをこの秒数内に完了しないと、他のワーカーが再取得する
+JOB_LEASE_SECONDS = config('JOB_LEASE_SECONDS', default=300, cast=int)
+# 定期ジョブ {タスク名: {'interval': 秒, 'payload': {...}, 'priority': n}}
+# カウンタの再集計 (applications.rebuild_counters) は実行中カウンタの増減を止めるため定期実行しない。
+# ずれが疑われるときに rebuild_application_counters コマンドか同タスクの投入で行う
+JOB_SCHEDULE = {
+    'notifications.dispatch_outbox': {'interval': 30},
+    'notifications.purge_outbox': {'interval': 24 * 3600},
+    'applications.archive_applications': {'interval': 24 * 3600},
+    'applications.purge_stale_uploads': {'interval': 3600},
+    'applications.purge_unreferenced_blobs': {'interval': 24 * 3600},
+    'jobs.purge_finished': {'interval': 3600},
+}
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -279,6 +348,19 @@ LDAP_UPN_SUFFIX = config('LDAP_UPN_SUFFIX', default=None)
 LDAP_FORCE_STARTTLS = config('LDAP_FORCE_STARTTLS', default=False, cast=bool)
 LDAP_ALLOW_PLAIN_FALLBACK = config('LDAP_ALLOW_PLAIN_FALLBACK', default=False, cast=bool)
 LDAP_TLS_INSECURE = config('LDAP_TLS_INSECURE', default=False, cast=bool)  # True: 証明書検証緩和 (開発用途のみ)
+# ログイン用 Server が取得するサーバ情報: NONE / DSA (RootDSE) / ALL (RootDSE + スキーマ。AD では重い)
+LDAP_SERVER_GET_INFO = config('LDAP_SERVER_GET_INFO', default='NONE')
+
+# サービスアカウント接続プール (users.ldap_pool)
+LDAP_POOL_SIZE = config('LDAP_POOL_SIZE', default=4, cast=int)  # 同時に貸し出す接続数の上限
+LDAP_POOL_IDLE_SECONDS = config('LDAP_POOL_IDLE_SECONDS', default=300, cast=int)  # これ以上使われない接続は閉じる
+LDAP_POOL_CHECK_SECONDS = config('LDAP_POOL_CHECK_SECONDS', default=30, cast=int)  # これ以上空いたら再利用前に応答確認
+LDAP_POOL_WAIT_SECONDS = config('LDAP_POOL_WAIT_SECONDS', default=10, cast=int)  # 空き待ちの上限
+# 承認者検索 (Simple Paged Results) の1ページの件数。AD の MaxPageSize (既定 1000) 以下にする
+LDAP_APPROVER_PAGE_SIZE = config('LDAP_APPROVER_PAGE_SIZE', default=500, cast=int)
+# 承認者候補の OU 単位キャッシュ (users.approver_cache。DB に置き全プロセスで共有する)
+LDAP_APPROVER_CACHE_TTL = config('LDAP_APPROVER_CACHE_TTL', default=600, cast=int)  # 秒
+LDAP_APPROVER_CACHE_MAX_ENTRIES = config('LDAP_APPROVER_CACHE_MAX_ENTRIES', default=1000, cast=int)  # 超えると最終参照の古いものから捨てる
 
 # Backward compatibility / django_python3_ldap expected names
 LDAP_AUTH_URL = LDAP_SERVER_URL
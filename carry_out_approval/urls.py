@@ -17,7 +17,6 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.shortcuts import redirect
 from django.shortcuts import render
 
@@ -42,11 +41,11 @@ urlpatterns = [
     path('websocket-test/', websocket_test, name='websocket-test'),
 ]
 
-# 開発環境でのstatic・mediaファイル配信
+# 開発環境でのstaticファイル配信
+# (申請ファイルは権限チェック付きの applications:application-download で配信する)
 if settings.DEBUG:
     from django.contrib.staticfiles.views import serve
     from django.views.static import serve as static_serve
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     # 開発環境では django.contrib.staticfiles を使用
     urlpatterns += [
         path('static/<path:path>', serve),
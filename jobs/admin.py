@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'priority', 'run_at', 'attempts', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'unique_key']
+    readonly_fields = ['created_at', 'finished_at', 'locked_by', 'locked_until', 'last_error']
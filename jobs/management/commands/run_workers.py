@@ -0,0 +1,60 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from jobs.worker import (
+    DEFAULT_POLL_INTERVAL,
+    SchedulerThread,
+    WorkerThread,
+    default_worker_id,
+    run_pending,
+    schedule_due,
+)
+
+
+class Command(BaseCommand):
+    help = "バックグラウンドジョブのワーカー (と定期実行スケジューラ) を起動する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=None,
+                            help='ワーカースレッド数 (既定: JOB_WORKER_THREADS)')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='ジョブがないときの待機秒数')
+        parser.add_argument('--no-scheduler', action='store_true',
+                            help='定期ジョブを投入しない (複数プロセス起動時に1つだけ有効にする場合など)')
+        parser.add_argument('--once', action='store_true',
+                            help='実行可能なジョブを処理したら終了する (cron 用)')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            if not options['no_scheduler']:
+                schedule_due()
+            count = run_pending(default_worker_id())
+            self.stdout.write(self.style.SUCCESS(f'{count} 件のジョブを実行しました'))
+            return
+
+        threads = options['threads'] or getattr(settings, 'JOB_WORKER_THREADS', 2)
+        poll = options['poll_interval'] or getattr(settings, 'JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        stop = threading.Event()
+        base_id = default_worker_id()
+        runners = [WorkerThread(f"{base_id}:{i}", stop, poll) for i in range(threads)]
+        if not options['no_scheduler']:
+            runners.append(SchedulerThread(stop))
+
+        def shutdown(signum, frame):
+            self.stdout.write('停止要求を受け付けました。実行中のジョブの完了を待ちます...')
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        for runner in runners:
+            runner.start()
+        self.stdout.write(self.style.SUCCESS(f'ワーカーを起動しました (スレッド数: {threads})'))
+        # シグナルを受け取れるようメインスレッドは短い間隔で待つ
+        while not stop.is_set():
+            stop.wait(1.0)
+        for runner in runners:
+            runner.join()
+        self.stdout.write('ワーカーを停止しました')
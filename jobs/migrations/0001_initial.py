@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='タスク名')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='引数')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='優先度')),
+                ('status', models.CharField(choices=[('queued', '待機中'), ('running', '実行中'), ('succeeded', '完了'), ('failed', '失敗')], default='queued', max_length=20, verbose_name='状態')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='実行予定日時')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='試行回数')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='最大試行回数')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='取得ワーカー')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='リース期限')),
+                ('unique_key', models.CharField(blank=True, max_length=200, null=True, unique=True, verbose_name='重複防止キー')),
+                ('last_error', models.TextField(blank=True, verbose_name='最終エラー')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+            ],
+            options={
+                'verbose_name': 'ジョブ',
+                'verbose_name_plural': 'ジョブ',
+                'ordering': ['-priority', 'run_at', 'id'],
+                'indexes': [models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_claim_order')],
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+from django.db import models
+from django.utils import timezone
+
+
+class JobStatus(models.TextChoices):
+    """ジョブの状態"""
+    QUEUED = 'queued', '待機中'
+    RUNNING = 'running', '実行中'
+    SUCCEEDED = 'succeeded', '完了'
+    FAILED = 'failed', '失敗'
+
+
+class Job(models.Model):
+    """バックグラウンドジョブ
+
+    run_workers コマンドのワーカーが取得して実行する。取得時に locked_until
+    (リース期限) を設定し、期限内に完了しなかったジョブは別のワーカーが再取得する。
+    """
+    name = models.CharField(
+        max_length=100,
+        verbose_name="タスク名"
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="引数"
+    )
+    # 大きいほど先に実行する
+    priority = models.SmallIntegerField(
+        default=0,
+        verbose_name="優先度"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=JobStatus.choices,
+        default=JobStatus.QUEUED,
+        verbose_name="状態"
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="実行予定日時"
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name="試行回数"
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=3,
+        verbose_name="最大試行回数"
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="取得ワーカー"
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="リース期限"
+    )
+    # 同一キーのジョブは1件のみ (定期実行の重複登録防止など)
+    unique_key = models.CharField(
+        max_length=200,
+        null=True,
+        blank=True,
+        unique=True,
+        verbose_name="重複防止キー"
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name="最終エラー"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="作成日時"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="終了日時"
+    )
+
+    class Meta:
+        verbose_name = "ジョブ"
+        verbose_name_plural = "ジョブ"
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            # ワーカーの取得順 (状態で絞り込み、優先度降順・実行予定順)
+            models.Index(
+                fields=['status', '-priority', 'run_at', 'id'],
+                name='job_claim_order',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
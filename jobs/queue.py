@@ -0,0 +1,94 @@
+"""ジョブの登録 (@task) と投入 (enqueue)
+
+    # applications/tasks.py
+    from jobs.queue import task
+
+    @task('applications.move_approved_file', max_attempts=5)
+    def move_approved_file(application_id):
+        ...
+
+    enqueue('applications.move_approved_file', {'application_id': 1})
+
+タスクは各アプリの tasks.py に置く (jobs アプリの ready() で自動読み込み)。
+引数は JSON にできる値のみ。トランザクション内で enqueue した場合は
+コミットされるまでワーカーからは見えない (ロールバックすればジョブも消える)。
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Job
+
+_registry = {}
+
+
+class TaskSpec:
+    def __init__(self, name, func, max_attempts, priority):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.priority = priority
+
+
+def task(name, max_attempts=3, priority=0):
+    """関数をジョブとして登録するデコレータ"""
+    def decorator(func):
+        _registry[name] = TaskSpec(name, func, max_attempts, priority)
+        func.task_name = name
+        return func
+    return decorator
+
+
+def get_task(name):
+    """登録済みタスク。未登録は KeyError"""
+    return _registry[name]
+
+
+def registered_tasks():
+    return dict(_registry)
+
+
+def enqueue_many(name, payloads, priority=None, delay=None):
+    """同じタスクを payload ごとに1回の INSERT でまとめて投入し、Job のリストを返す"""
+    spec = get_task(getattr(name, 'task_name', name))
+    run_at = timezone.now() + timedelta(seconds=delay or 0)
+    jobs = [
+        Job(
+            name=spec.name,
+            payload=payload or {},
+            priority=spec.priority if priority is None else priority,
+            max_attempts=spec.max_attempts,
+            run_at=run_at,
+        )
+        for payload in payloads
+    ]
+    return Job.objects.bulk_create(jobs) if jobs else []
+
+
+def enqueue(name, payload=None, priority=None, run_at=None, delay=None, unique_key=None):
+    """ジョブを投入して Job を返す
+
+    unique_key が既存ジョブと重複する場合は投入せず None を返す。
+    """
+    spec = get_task(getattr(name, 'task_name', name))
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    job = Job(
+        name=spec.name,
+        payload=payload or {},
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts,
+        run_at=run_at,
+        unique_key=unique_key,
+    )
+    if unique_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
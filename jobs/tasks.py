@@ -0,0 +1,13 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Job, JobStatus
+from .queue import task
+
+
+@task('jobs.purge_finished')
+def purge_finished(days=7):
+    """完了して一定期間を過ぎたジョブを削除する (失敗ジョブは調査用に残す)"""
+    cutoff = timezone.now() - timedelta(days=days)
+    Job.objects.filter(status=JobStatus.SUCCEEDED, finished_at__lt=cutoff).delete()
@@ -0,0 +1,103 @@
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Job, JobStatus
+from .queue import enqueue, task
+from .worker import LeaseHeartbeat, claim_jobs, extend_lease, run_job, run_pending, schedule_due
+
+calls = []
+
+
+@task('jobs.tests.record', max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@task('jobs.tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    """DB バックエンドのジョブキュー"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_priority_order_and_success(self):
+        enqueue('jobs.tests.record', {'value': 'low'})
+        enqueue(record, {'value': 'high'}, priority=5)
+        enqueue('jobs.tests.record', {'value': 'later'}, delay=3600)
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual(Job.objects.filter(status=JobStatus.SUCCEEDED).count(), 2)
+        self.assertEqual(Job.objects.get(status=JobStatus.QUEUED).payload, {'value': 'later'})
+
+    def test_retry_with_backoff_then_fail(self):
+        job = enqueue('jobs.tests.fail')
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 2))
+
+    def test_expired_lease_is_reclaimed(self):
+        enqueue('jobs.tests.record', {'value': 1})
+        (stale,) = claim_jobs('w1')
+        self.assertEqual(claim_jobs('w2'), [])
+        Job.objects.filter(pk=stale.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        (job,) = claim_jobs('w2')
+        self.assertTrue(run_job(job))
+        # 先に取得していたワーカーの結果は記録されない
+        run_job(stale)
+        job = Job.objects.get(pk=job.pk)
+        # 落ちたワーカーの試行も数える
+        self.assertEqual((job.status, job.attempts), (JobStatus.SUCCEEDED, 2))
+
+    def test_job_killed_on_last_attempt_is_not_retried(self):
+        enqueue('jobs.tests.record', {'value': 1})
+        for worker_id in ('w1', 'w2'):
+            (job,) = claim_jobs(worker_id)
+            # 実行中にワーカーごと落ちた (結果を記録しないままリース切れ)
+            Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        (job,) = claim_jobs('w3')
+        self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 3))
+        self.assertEqual(calls, [])
+
+    def test_extend_lease(self):
+        enqueue('jobs.tests.record', {'value': 1})
+        (job,) = claim_jobs('w1')
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() + timedelta(seconds=1))
+        self.assertTrue(extend_lease(job))
+        self.assertGreater(Job.objects.get(pk=job.pk).locked_until, timezone.now() + timedelta(seconds=60))
+        self.assertEqual(claim_jobs('w2'), [])
+        Job.objects.filter(pk=job.pk).update(locked_by='w2:other')
+        self.assertFalse(extend_lease(job))
+
+    def test_heartbeat_extends_lease_while_running(self):
+        enqueue('jobs.tests.record', {'value': 1})
+        (job,) = claim_jobs('w1')
+        with patch('jobs.worker.extend_lease', return_value=True) as extend:
+            with LeaseHeartbeat(job, interval=0.01):
+                time.sleep(0.1)
+        self.assertGreater(extend.call_count, 1)
+
+    def test_schedule_enqueues_once_per_interval(self):
+        schedule = {'jobs.tests.record': {'interval': 60, 'payload': {'value': 'tick'}}}
+        now = timezone.now()
+        with self.settings(JOB_SCHEDULE=schedule):
+            self.assertEqual(schedule_due(now), 1)
+            self.assertEqual(schedule_due(now), 0)
+            self.assertEqual(schedule_due(now + timedelta(seconds=60)), 1)
+        self.assertEqual(Job.objects.count(), 2)
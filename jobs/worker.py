@@ -0,0 +1,277 @@
+"""ジョブの取得・実行と定期実行スケジューラ
+
+取得 (claim) はバックエンドに応じて2通り:
+
+- PostgreSQL 等 (SKIP LOCKED 対応): SELECT ... FOR UPDATE SKIP LOCKED で行ロックを
+  取りつつ他ワーカーがロック中の行を飛ばし、同じトランザクションで実行中にする。
+- SQLite: 行ロックがないため、候補 ID に対し「待機中またはリース切れ」を条件にした
+  UPDATE で locked_by に取得トークンを書き込み、書き込めた行だけを実行する。
+
+どちらも locked_until (リース期限) を設定し、ワーカーが落ちたジョブは期限後に
+再取得される。失敗時は指数バックオフで run_at を先送りし、max_attempts で打ち切る。
+
+- 実行中はハートビートのスレッドがリース期間の 1/3 ごとに locked_until を延ばすため、
+  リース期間より長くかかるジョブ (大きいファイルのコピー等) も二重に実行されない
+- attempts は取得時に増やす。OOM や SIGKILL でワーカーごと落ちたジョブも試行回数に
+  数えられ、max_attempts を超えて再取得されたものは実行せずに失敗にする
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job, JobStatus
+from .queue import enqueue, get_task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_POLL_INTERVAL = 1.0
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 3600
+
+
+def lease_seconds():
+    return getattr(settings, 'JOB_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+
+
+def backoff_seconds(attempts):
+    """attempts 回目の失敗後の待ち時間 (指数バックオフ + 揺らぎ)"""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _ready(now):
+    return Job.objects.filter(
+        Q(status=JobStatus.QUEUED, run_at__lte=now)
+        | Q(status=JobStatus.RUNNING, locked_until__lt=now)
+    )
+
+
+def claim_jobs(worker_id, limit=1):
+    """実行可能なジョブを最大 limit 件取得して実行中にし、attempts を1つ増やす"""
+    now = timezone.now()
+    lease = now + timedelta(seconds=lease_seconds())
+    order = ('-priority', 'run_at', 'id')
+    # 取得ごとに一意なトークン (同じワーカーがリース切れ後に再取得しても区別できる)
+    token = f"{worker_id}:{uuid.uuid4().hex[:8]}"
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            jobs = list(_ready(now).select_for_update(skip_locked=True).order_by(*order)[:limit])
+            if jobs:
+                Job.objects.filter(id__in=[j.id for j in jobs]).update(
+                    status=JobStatus.RUNNING, locked_by=token, locked_until=lease,
+                    attempts=F('attempts') + 1,
+                )
+        for job in jobs:
+            job.status, job.locked_by, job.locked_until = JobStatus.RUNNING, token, lease
+            job.attempts += 1
+        return jobs
+
+    ids = list(_ready(now).order_by(*order).values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    _ready(now).filter(id__in=ids).update(
+        status=JobStatus.RUNNING, locked_by=token, locked_until=lease, attempts=F('attempts') + 1
+    )
+    return list(Job.objects.filter(id__in=ids, locked_by=token).order_by(*order))
+
+
+def extend_lease(job):
+    """取得中のジョブのリース期限を延ばす。既に他のワーカーに再取得されていれば False"""
+    lease = timezone.now() + timedelta(seconds=lease_seconds())
+    extended = Job.objects.filter(
+        id=job.id, locked_by=job.locked_by, status=JobStatus.RUNNING
+    ).update(locked_until=lease)
+    if extended:
+        job.locked_until = lease
+    return bool(extended)
+
+
+class LeaseHeartbeat(threading.Thread):
+    """ジョブの実行中、リース期間の 1/3 ごとにリース期限を延ばすスレッド
+
+    with で囲んだ処理の間だけ動く。DB 接続はこのスレッド専用のものを使い、終了時に閉じる。
+    """
+
+    def __init__(self, job, interval=None):
+        super().__init__(name=f"job-heartbeat-{job.id}", daemon=True)
+        self.job = job
+        self.interval = interval if interval is not None else lease_seconds() / 3
+        self._stop_event = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.interval):
+                try:
+                    if not extend_lease(self.job):
+                        logger.warning("Job lease lost | job=%s name=%s", self.job.id, self.job.name)
+                        return
+                except Exception:
+                    # 一時的な DB エラーは次の周期で再試行する
+                    logger.exception("Job lease extension failed | job=%s", self.job.id)
+        finally:
+            connections.close_all()
+
+
+def run_job(job):
+    """取得済みジョブを1件実行し、結果を記録する。成功なら True
+
+    リース切れで他のワーカーに再取得されていた場合、結果は記録しない。
+    job.attempts は取得時に増やした後の値 (今回の試行を含む)。
+    """
+    owned = Job.objects.filter(id=job.id, locked_by=job.locked_by, status=JobStatus.RUNNING)
+    attempts = job.attempts
+    if attempts > job.max_attempts:
+        # 前回の試行中にワーカーごと落ち、リース切れで再取得された
+        logger.error("Job exceeded max attempts | job=%s name=%s attempts=%s",
+                     job.id, job.name, attempts)
+        owned.update(
+            status=JobStatus.FAILED, locked_by='', locked_until=None,
+            last_error=f"完了しないまま最大試行回数 ({job.max_attempts}) を超えました",
+            finished_at=timezone.now(),
+        )
+        return False
+    try:
+        spec = get_task(job.name)
+    except KeyError:
+        logger.error("Unknown job task | job=%s name=%s", job.id, job.name)
+        owned.update(
+            status=JobStatus.FAILED, locked_by='', locked_until=None,
+            last_error=f"未登録のタスクです: {job.name}", finished_at=timezone.now(),
+        )
+        return False
+    try:
+        with LeaseHeartbeat(job):
+            spec.func(**job.payload)
+    except Exception:
+        final = attempts >= job.max_attempts
+        logger.warning("Job failed | job=%s name=%s attempts=%s final=%s",
+                       job.id, job.name, attempts, final, exc_info=True)
+        now = timezone.now()
+        owned.update(
+            status=JobStatus.FAILED if final else JobStatus.QUEUED,
+            run_at=now if final else now + timedelta(seconds=backoff_seconds(attempts)),
+            locked_by='',
+            locked_until=None,
+            last_error=traceback.format_exc(),
+            finished_at=now if final else None,
+        )
+        return False
+    owned.update(
+        status=JobStatus.SUCCEEDED, locked_by='', locked_until=None,
+        finished_at=timezone.now(),
+    )
+    return True
+
+
+def run_pending(worker_id='inline', limit=None):
+    """実行可能なジョブがなくなるまで実行し、実行件数を返す (テスト・--once 用)"""
+    count = 0
+    while limit is None or count < limit:
+        jobs = claim_jobs(worker_id)
+        if not jobs:
+            break
+        for job in jobs:
+            run_job(job)
+            count += 1
+    return count
+
+
+def schedule_due(now=None, seen=None):
+    """settings.JOB_SCHEDULE の定期ジョブのうち、現在の周期分が未投入のものを投入する
+
+    JOB_SCHEDULE = {'タスク名': {'interval': 秒, 'payload': {...}, 'priority': n}}
+    周期番号を unique_key に含めるため、複数ワーカーで同時に動かしても1回だけ投入される。
+    seen ({タスク名: 周期番号}) を渡すと、同じ周期の投入を再試行しない。
+    """
+    now = now or timezone.now()
+    created = 0
+    for name, entry in getattr(settings, 'JOB_SCHEDULE', {}).items():
+        interval = int(entry['interval'])
+        slot = int(now.timestamp()) // interval
+        if seen is not None and seen.get(name) == slot:
+            continue
+        job = enqueue(
+            name,
+            entry.get('payload'),
+            priority=entry.get('priority'),
+            unique_key=f"schedule:{name}:{slot}",
+        )
+        created += job is not None
+        if seen is not None:
+            seen[name] = slot
+    return created
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkerThread(threading.Thread):
+    """ジョブを取得して実行し続けるスレッド。stop_event で停止する"""
+
+    def __init__(self, worker_id, stop_event, poll_interval=DEFAULT_POLL_INTERVAL):
+        super().__init__(name=worker_id, daemon=True)
+        self.worker_id = worker_id
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                try:
+                    jobs = claim_jobs(self.worker_id)
+                except Exception:
+                    logger.exception("Job claim failed | worker=%s", self.worker_id)
+                    jobs = []
+                for job in jobs:
+                    try:
+                        run_job(job)
+                    except Exception:
+                        # 結果の記録に失敗した場合はリース切れ後に再実行される
+                        logger.exception("Job bookkeeping failed | job=%s", job.id)
+                if not jobs:
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+
+class SchedulerThread(threading.Thread):
+    """定期ジョブを投入するスレッド"""
+
+    def __init__(self, stop_event, tick=1.0):
+        super().__init__(name='job-scheduler', daemon=True)
+        self.stop_event = stop_event
+        self.tick = tick
+
+    def run(self):
+        seen = {}
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                try:
+                    schedule_due(seen=seen)
+                except Exception:
+                    logger.exception("Job scheduling failed")
+                self.stop_event.wait(self.tick)
+        finally:
+            connections.close_all()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Notification
+from .models import Notification, OutboxEvent
+from .outbox import retry_failed
 
 
 @admin.register(Notification)
@@ -12,3 +13,18 @@ class NotificationAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('recipient', 'sender', 'related_application')
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event', 'application_id', 'version', 'created_at', 'dispatched_at', 'attempts',
+                    'failed_at']
+    list_filter = ['event', 'dispatched_at', 'failed_at']
+    search_fields = ['application_id']
+    readonly_fields = ['created_at', 'claimed_at', 'dispatched_at', 'last_error']
+    actions = ('retry_selected',)
+
+    @admin.action(description="選択した配信打ち切りのイベントを再配信")
+    def retry_selected(self, request, queryset):
+        count = retry_failed(queryset)
+        self.message_user(request, f"{count} 件のイベントを再配信待ちに戻しました")
@@ -71,6 +71,20 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'application': event['application']
         }))
     
+    async def notification_batch(self, event):
+        """一括承認/却下時の通知をまとめて送信"""
+        await self.send(text_data=json.dumps({
+            'type': 'notification_batch',
+            'data': event['notifications']
+        }))
+    
+    async def kanban_batch_update(self, event):
+        """一括承認/却下時のカンバン更新をまとめて送信"""
+        await self.send(text_data=json.dumps({
+            'type': 'kanban_batch_update',
+            'updates': event['updates']
+        }))
+    
     @database_sync_to_async
     def mark_notification_as_read(self, notification_id):
         """通知を既読にする（非同期対応）"""
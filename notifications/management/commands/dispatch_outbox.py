@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from notifications.outbox import DEFAULT_BATCH_SIZE, dispatch_outbox, purge_dispatched
+
+
+class Command(BaseCommand):
+    help = "通知アウトボックスの未配信イベントを配信する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='1回に取り出すイベント数')
+        parser.add_argument('--loop', type=float, default=None, metavar='SECONDS',
+                            help='指定秒ごとに配信を繰り返す (常駐)')
+        parser.add_argument('--purge-days', type=int, default=None,
+                            help='配信済みで指定日数を過ぎた行を削除する')
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            deleted = purge_dispatched(options['purge_days'])
+            self.stdout.write(f'配信済みイベントを {deleted} 件削除しました')
+        while True:
+            dispatched = dispatch_outbox(options['batch_size'])
+            if dispatched or options['loop'] is None:
+                self.stdout.write(self.style.SUCCESS(f'{dispatched} 件のイベントを配信しました'))
+            if options['loop'] is None:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0007_archivedapplication'),
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('new_application', '新規申請'), ('application_approved', '申請承認'), ('application_rejected', '申請却下'), ('application_updated', '申請更新')], max_length=50, verbose_name='通知タイプ')),
+                ('title', models.CharField(max_length=255, verbose_name='タイトル')),
+                ('message', models.TextField(verbose_name='メッセージ')),
+                ('is_read', models.BooleanField(default=False, verbose_name='既読')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='既読日時')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='受信者')),
+                ('related_application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='applications.archivedapplication', verbose_name='関連申請')),
+                ('sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='送信者')),
+            ],
+            options={
+                'verbose_name': '通知（アーカイブ）',
+                'verbose_name_plural': '通知（アーカイブ）',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
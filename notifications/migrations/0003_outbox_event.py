@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_archivednotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('application_id', models.IntegerField(verbose_name='申請ID')),
+                ('event', models.CharField(choices=[('new_application', '新規申請'), ('application_approved', '申請承認'), ('application_rejected', '申請却下'), ('application_updated', '申請更新')], max_length=50, verbose_name='イベント')),
+                ('version', models.PositiveIntegerField(verbose_name='申請の版')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('claim_token', models.CharField(blank=True, max_length=32, null=True, verbose_name='取得トークン')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='取得日時')),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True, verbose_name='配信日時')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='失敗回数')),
+                ('last_error', models.TextField(blank=True, verbose_name='最終エラー')),
+            ],
+            options={
+                'verbose_name': '通知アウトボックス',
+                'verbose_name_plural': '通知アウトボックス',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['dispatched_at', 'id'], name='outbox_pending')],
+                'constraints': [models.UniqueConstraint(fields=('application_id', 'event', 'version'), name='outbox_event_unique')],
+            },
+        ),
+    ]
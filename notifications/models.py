@@ -77,3 +77,142 @@ class Notification(models.Model):
             self.is_read = True
             self.read_at = timezone.now()
             self.save(update_fields=['is_read', 'read_at'])
+
+
+class ArchivedNotification(models.Model):
+    """アーカイブ済み申請に紐づく通知 (applications.ArchivedApplication と同時に移動)"""
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="受信者"
+    )
+    sender = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+        blank=True,
+        verbose_name="送信者"
+    )
+    notification_type = models.CharField(
+        max_length=50,
+        choices=NotificationType.choices,
+        verbose_name="通知タイプ"
+    )
+    title = models.CharField(
+        max_length=255,
+        verbose_name="タイトル"
+    )
+    message = models.TextField(
+        verbose_name="メッセージ"
+    )
+    related_application = models.ForeignKey(
+        'applications.ArchivedApplication',
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name="関連申請"
+    )
+    is_read = models.BooleanField(
+        default=False,
+        verbose_name="既読"
+    )
+    created_at = models.DateTimeField(
+        verbose_name="作成日時"
+    )
+    read_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="既読日時"
+    )
+
+    class Meta:
+        verbose_name = "通知（アーカイブ）"
+        verbose_name_plural = "通知（アーカイブ）"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.recipient.username}への通知: {self.title}"
+
+
+class OutboxEvent(models.Model):
+    """通知アウトボックス
+
+    申請の状態変更と同じトランザクションで書き込み、コミット後に
+    notifications.outbox.dispatch_outbox() がまとめて通知・WebSocket 送信する。
+    (申請, イベント, 版) で一意なので、同じ遷移を複数経路から登録しても1件になる。
+    配信に失敗し続けた行は failed_at を付けて残す (管理画面で確認・再投入する)。
+    """
+    application_id = models.IntegerField(
+        verbose_name="申請ID"
+    )
+    event = models.CharField(
+        max_length=50,
+        choices=NotificationType.choices,
+        verbose_name="イベント"
+    )
+    version = models.PositiveIntegerField(
+        verbose_name="申請の版"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="作成日時"
+    )
+    # 配信中の取り込みトークンと取得日時 (一定時間で期限切れとなり再取得される)
+    claim_token = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        verbose_name="取得トークン"
+    )
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="取得日時"
+    )
+    dispatched_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="配信日時"
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name="失敗回数"
+    )
+    # 失敗後の再配信はこの日時以降 (指数バックオフ)
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="次回配信日時"
+    )
+    # 最大失敗回数に達して配信を打ち切った日時 (以後は取り出さない)
+    failed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="配信打ち切り日時"
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name="最終エラー"
+    )
+
+    class Meta:
+        verbose_name = "通知アウトボックス"
+        verbose_name_plural = "通知アウトボックス"
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['application_id', 'event', 'version'],
+                name='outbox_event_unique',
+            ),
+        ]
+        indexes = [
+            # 未配信イベントの取り出し
+            models.Index(
+                fields=['dispatched_at', 'id'],
+                name='outbox_pending',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event} #{self.application_id} v{self.version}"
@@ -0,0 +1,205 @@
+"""通知アウトボックス (OutboxEvent) の登録と配信
+
+登録 (enqueue / enqueue_many) は申請の状態変更と同じトランザクションで行い、
+通知行の作成や channel layer への送信は一切しない。コミット後に
+request_dispatch() が配信スレッドを起こし、dispatch_outbox() が未配信イベントを
+バッチ単位で取り出して NotificationService.notify_events() でまとめて送る。
+承認処理のリクエストには INSERT 1行分のコストしか乗らない。
+
+配信スレッドが落ちても未配信行は残るので、`dispatch_outbox` コマンドで回収できる。
+
+通知行の作成と配信済みの印は同じトランザクションで行い、WebSocket への送信は
+そのコミット後にする (送信済みなのに未配信のまま残って二重に送ることがない)。
+バッチでの送信に失敗したときは1件ずつ送り直し、失敗したイベントだけを
+指数バックオフで後回しにする (1件の不正なイベントで他の配信を止めない)。
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS 回失敗したイベントは failed_at を付けて打ち切る。
+"""
+import logging
+import random
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+# 取得後この秒数を過ぎても配信済みにならない行は、配信側が落ちたとみなして再取得する
+CLAIM_TIMEOUT_SECONDS = 60
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+
+def _enabled():
+    return getattr(settings, 'NOTIFICATIONS_ENABLED', True)
+
+
+def enqueue_many(applications, event):
+    """申請ごとに event を登録する。(申請, イベント, 版) が既にあれば何もしない"""
+    if not _enabled():
+        return
+    rows = [
+        OutboxEvent(application_id=application.pk, event=event, version=application.version)
+        for application in applications
+    ]
+    if not rows:
+        return
+    OutboxEvent.objects.bulk_create(rows, ignore_conflicts=True)
+    transaction.on_commit(request_dispatch)
+
+
+def enqueue(application, event):
+    enqueue_many([application], event)
+
+
+def max_attempts():
+    return getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def backoff_seconds(attempts):
+    """attempts 回目の失敗後の待ち時間 (指数バックオフ + 揺らぎ)"""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claimable():
+    now = timezone.now()
+    expired = now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)
+    return OutboxEvent.objects.filter(dispatched_at__isnull=True, failed_at__isnull=True).filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired),
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+    )
+
+
+def _claim_batch(batch_size):
+    """未配信イベントを最大 batch_size 件取得済みにする (並行する配信側とは重ならない)"""
+    ids = list(_claimable().order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    _claimable().filter(id__in=ids).update(claim_token=token, claimed_at=timezone.now())
+    return list(OutboxEvent.objects.filter(claim_token=token, dispatched_at__isnull=True).order_by('id'))
+
+
+def _deliver(pairs, event_ids):
+    """通知行の作成と配信済みの印を1つのトランザクションで行う
+
+    WebSocket への送信は NotificationService.notify_events がコミット後に行うので、
+    ロールバックした配信や送り直しで同じ通知が二重に届くことはない。
+    """
+    from .services import NotificationService
+
+    with transaction.atomic():
+        NotificationService.notify_events(pairs)
+        OutboxEvent.objects.filter(id__in=event_ids).update(dispatched_at=timezone.now())
+
+
+def _record_failure(event, exc):
+    """失敗回数を数え、再配信日時を先送りする。上限に達したら打ち切る"""
+    attempts = event.attempts + 1
+    final = attempts >= max_attempts()
+    now = timezone.now()
+    logger.warning("Outbox event failed | id=%s event=%s application=%s attempts=%s final=%s",
+                   event.id, event.event, event.application_id, attempts, final, exc_info=exc)
+    OutboxEvent.objects.filter(id=event.id, claim_token=event.claim_token).update(
+        claim_token=None,
+        claimed_at=None,
+        attempts=attempts,
+        last_error=str(exc),
+        next_attempt_at=None if final else now + timedelta(seconds=backoff_seconds(attempts)),
+        failed_at=now if final else None,
+    )
+
+
+def dispatch_outbox(batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """未配信イベントがなくなるまで (または max_batches 回) 配信し、配信件数を返す"""
+    from applications.models import Application
+
+    dispatched = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        events = _claim_batch(batch_size)
+        if not events:
+            break
+        batches += 1
+        applications = Application.objects.select_related('applicant_user', 'approver_user').in_bulk(
+            {e.application_id for e in events}
+        )
+        # 配信前に削除・アーカイブされた申請のイベントは捨てる
+        pairs = [(e, applications.get(e.application_id)) for e in events]
+        try:
+            _deliver([(e.event, application) for e, application in pairs if application is not None],
+                     [e.id for e in events])
+            delivered = len(events)
+        except Exception:
+            logger.exception("Outbox batch dispatch failed, retrying one by one | events=%s", len(events))
+            delivered = 0
+            for event, application in pairs:
+                try:
+                    _deliver([(event.event, application)] if application is not None else [], [event.id])
+                except Exception as exc:
+                    _record_failure(event, exc)
+                else:
+                    delivered += 1
+        dispatched += delivered
+    return dispatched
+
+
+def retry_failed(queryset=None):
+    """配信を打ち切ったイベントを再配信待ちに戻し、件数を返す"""
+    queryset = OutboxEvent.objects.all() if queryset is None else queryset
+    count = queryset.filter(failed_at__isnull=False, dispatched_at__isnull=True).update(
+        failed_at=None, next_attempt_at=None, attempts=0
+    )
+    if count:
+        transaction.on_commit(request_dispatch)
+    return count
+
+
+def purge_dispatched(older_than_days=7):
+    """配信済みで一定期間を過ぎた行を削除し、削除件数を返す"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = OutboxEvent.objects.filter(dispatched_at__lt=cutoff).delete()
+    return deleted
+
+
+_dispatch_lock = threading.Lock()
+_dispatch_requested = threading.Event()
+_dispatcher = None
+
+
+def request_dispatch():
+    """コミット後フック。配信スレッドがなければ起動し、あれば再走査を依頼する"""
+    global _dispatcher
+    if not getattr(settings, 'NOTIFICATION_OUTBOX_AUTODISPATCH', True):
+        return
+    _dispatch_requested.set()
+    with _dispatch_lock:
+        if _dispatcher is not None:
+            return
+        _dispatcher = threading.Thread(target=_dispatch_loop, name='notification-outbox', daemon=True)
+        _dispatcher.start()
+
+
+def _dispatch_loop():
+    global _dispatcher
+    try:
+        while True:
+            _dispatch_requested.clear()
+            try:
+                dispatch_outbox()
+            except Exception:
+                logger.exception("Outbox dispatcher error")
+            with _dispatch_lock:
+                if not _dispatch_requested.is_set():
+                    _dispatcher = None
+                    return
+    finally:
+        connections.close_all()
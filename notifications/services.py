@@ -1,5 +1,6 @@
 from .models import Notification, NotificationType
 from django.conf import settings
+from django.db import transaction
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.contrib.auth import get_user_model
@@ -26,6 +27,27 @@ def _resolve_user(maybe_user_or_username):
         return None
 
 
+# notify_events() のイベント別設定
+# (受信者, 送信者, タイトル, 本文, カンバン更新の送信先)。受信者等は申請のフィールド名
+_EVENT_MESSAGES = {
+    NotificationType.NEW_APPLICATION: (
+        'approver', 'applicant', "新しい申請が提出されました",
+        "{application.applicant}さんから新しい申請「{application.original_filename}」が提出されました。",
+        ('approver',),
+    ),
+    NotificationType.APPLICATION_APPROVED: (
+        'applicant', 'approver', "申請が承認されました",
+        "申請「{application.original_filename}」が{application.approver}さんによって承認されました。",
+        ('approver', 'applicant'),
+    ),
+    NotificationType.APPLICATION_REJECTED: (
+        'applicant', 'approver', "申請が却下されました",
+        "申請「{application.original_filename}」が{application.approver}さんによって却下されました。",
+        ('approver', 'applicant'),
+    ),
+}
+
+
 class NotificationService:
     """通知サービス"""
     
@@ -79,15 +101,26 @@ class NotificationService:
             )
     
     @staticmethod
-    def send_kanban_update_notification(user, action, application):
-        """カンバンボード更新通知を送信"""
+    def serialize_applications(applications):
+        """申請をまとめてシリアライズ (申請者/承認者の解決は1クエリ)"""
+        from applications.serializers import ApplicationSerializer
+        return ApplicationSerializer(list(applications), many=True).data
+
+    @staticmethod
+    def send_kanban_update_notification(user, action, application, application_data=None):
+        """カンバンボード更新通知を送信
+        application_data を渡した場合は再シリアライズしない (同一申請を複数ユーザへ送る場合用)。
+        """
         if not getattr(settings, 'NOTIFICATIONS_ENABLED', True):
             return
-        from applications.serializers import ApplicationSerializer
-        
+        user = _resolve_user(user)
+        if user is None:
+            return
+
         channel_layer = get_channel_layer()
         if channel_layer:
-            application_data = ApplicationSerializer(application).data
+            if application_data is None:
+                application_data = NotificationService.serialize_applications([application])[0]
             
             # ユーザー固有のグループに送信
             group_name = f"user_{user.id}"
@@ -118,7 +151,7 @@ class NotificationService:
             related_application=application
         )
         NotificationService.send_kanban_update_notification(
-            user=application.approver,
+            user=application.approver_user or application.approver,
             action='new_application',
             application=application
         )
@@ -139,15 +172,18 @@ class NotificationService:
             sender=application.approver,
             related_application=application
         )
+        application_data = NotificationService.serialize_applications([application])[0]
         NotificationService.send_kanban_update_notification(
-            user=application.approver,
+            user=application.approver_user or application.approver,
             action='application_approved',
-            application=application
+            application=application,
+            application_data=application_data
         )
         NotificationService.send_kanban_update_notification(
-            user=application.applicant,
+            user=application.applicant_user or application.applicant,
             action='application_approved',
-            application=application
+            application=application,
+            application_data=application_data
         )
     
     @staticmethod
@@ -166,13 +202,79 @@ class NotificationService:
             sender=application.approver,
             related_application=application
         )
+        application_data = NotificationService.serialize_applications([application])[0]
         NotificationService.send_kanban_update_notification(
-            user=application.approver,
+            user=application.approver_user or application.approver,
             action='application_rejected',
-            application=application
+            application=application,
+            application_data=application_data
         )
         NotificationService.send_kanban_update_notification(
-            user=application.applicant,
+            user=application.applicant_user or application.applicant,
             action='application_rejected',
-            application=application
+            application=application,
+            application_data=application_data
         )
+
+    @staticmethod
+    def notify_events(events):
+        """(イベント, 申請) のリストをまとめて通知する (アウトボックス配信用)
+
+        通知行は1回の bulk_create で作成し、WebSocket 送信は受信者ごとに
+        notification_batch / kanban_batch_update を1回ずつにまとめる。
+        """
+        if not getattr(settings, 'NOTIFICATIONS_ENABLED', True):
+            return
+        events = [(event, application) for event, application in events if event in _EVENT_MESSAGES]
+        if not events:
+            return
+        usernames = set()
+        for _, application in events:
+            usernames.update((application.applicant, application.approver))
+        users = {u.username: u for u in User.objects.filter(username__in=usernames)}
+
+        notifications = []
+        for event, application in events:
+            recipient_field, sender_field, title, message, _ = _EVENT_MESSAGES[event]
+            recipient = users.get(getattr(application, recipient_field))
+            if recipient is None:
+                continue
+            notifications.append(Notification(
+                recipient=recipient,
+                sender=users.get(getattr(application, sender_field)),
+                notification_type=event,
+                title=title,
+                message=message.format(application=application),
+                related_application=application,
+            ))
+        notifications = Notification.objects.bulk_create(notifications)
+
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+        from .serializers import NotificationSerializer
+
+        messages = []
+        by_recipient = {}
+        for notification, data in zip(notifications, NotificationSerializer(notifications, many=True).data):
+            by_recipient.setdefault(notification.recipient_id, []).append(data)
+        for user_id, items in by_recipient.items():
+            messages.append((f"user_{user_id}", {'type': 'notification_batch', 'notifications': items}))
+
+        updates = {}
+        serialized = NotificationService.serialize_applications(application for _, application in events)
+        for (event, application), application_data in zip(events, serialized):
+            update = {'action': event, 'application': application_data}
+            targets = {users.get(getattr(application, field)) for field in _EVENT_MESSAGES[event][4]}
+            for user in targets - {None}:
+                updates.setdefault(user.id, []).append(update)
+        for user_id, items in updates.items():
+            messages.append((f"user_{user_id}", {'type': 'kanban_batch_update', 'updates': items}))
+        # 送信は通知行 (とアウトボックスの配信済み印) がコミットされてから。ロールバック・
+        # 再配信で同じ通知を二重に送らないよう、送信の失敗は配信の失敗として扱わない (robust)
+        transaction.on_commit(lambda: _group_send_all(channel_layer, messages), robust=True)
+
+
+def _group_send_all(channel_layer, messages):
+    for group, message in messages:
+        async_to_sync(channel_layer.group_send)(group, message)
@@ -0,0 +1,14 @@
+from jobs.queue import task
+
+from .outbox import dispatch_outbox, purge_dispatched
+
+
+@task('notifications.dispatch_outbox', priority=10)
+def dispatch_outbox_task():
+    """配信スレッドで送りきれなかった通知アウトボックスを回収する"""
+    dispatch_outbox()
+
+
+@task('notifications.purge_outbox')
+def purge_outbox_task(days=7):
+    purge_dispatched(days)
@@ -215,6 +215,16 @@ class NotificationManager {
             case 'notification':
                 this.displayNotification(data.data);
                 break;
+            case 'notification_batch':
+                // 通知アウトボックスからのまとめ送信: 表示はまとめて行い、音とカウント更新は1回だけ
+                if (data.data.length === 1) {
+                    this.displayNotification(data.data[0]);
+                    break;
+                }
+                data.data.forEach(notification => this.showNotificationItem(notification));
+                this.updateUnreadCount();
+                this.playNotificationSound();
+                break;
             case 'pong':
                 // ping応答を受信
                 break;
@@ -0,0 +1,131 @@
+"""承認者候補のキャッシュ (所属 OU ごと)
+
+承認者候補は利用者本人ではなく所属 OU の DN (とその上位 OU) だけで決まるため、
+同じ OU の利用者は同じ LDAP 検索結果を共有できる。結果は所属 OU の DN を
+キーに ApproverCacheEntry (DB) へ置き、全ワーカープロセスで共有する。
+
+- TTL: LDAP_APPROVER_CACHE_TTL (秒)
+- 上限: LDAP_APPROVER_CACHE_MAX_ENTRIES。超えると最終参照時刻の古いものから捨てる (LRU)
+- 最終参照時刻はヒットのたびではなく ACCESS_RESOLUTION 経過ごとに更新し、
+  ヒット時の書き込みを抑える
+- 手動の無効化は users:approver-cache (POST) から行う
+- ヒット/ミス件数はプロセス内で数え、stats() と users:approver-cache (GET) で見られる
+
+DB エラー (テーブル未作成・接続断など) はキャッシュ無しとして扱い、呼び出し側は
+LDAP へ直接問い合わせる。
+"""
+from collections import Counter
+from datetime import timedelta
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import ApproverCacheEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 600
+DEFAULT_MAX_ENTRIES = 1000
+# 最終参照時刻の更新間隔 (LRU の順序はこの粒度で決まる)
+ACCESS_RESOLUTION = timedelta(seconds=60)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def cache_key(ou_dn):
+    """OU の DN (大文字小文字・空白の揺れを吸収) からキーを作る"""
+    normalized = ','.join(part.strip() for part in ou_dn.split(',')).lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get(ou_dn):
+    """キャッシュ済みの承認者候補 (dict のリスト)。無ければ (DB エラー時も) None"""
+    key = cache_key(ou_dn)
+    now = timezone.now()
+    try:
+        row = (
+            ApproverCacheEntry.objects.filter(key=key, expires_at__gt=now)
+            .values('approvers', 'last_accessed_at').first()
+        )
+        if row is not None and row['last_accessed_at'] < now - ACCESS_RESOLUTION:
+            ApproverCacheEntry.objects.filter(key=key).update(last_accessed_at=now)
+    except DatabaseError:
+        logger.warning("Approver cache unavailable; falling back to LDAP | ou=%s", ou_dn, exc_info=True)
+        row = None
+    _count('misses' if row is None else 'hits')
+    logger.debug("Approver cache %s | ou=%s", 'miss' if row is None else 'hit', ou_dn)
+    return None if row is None else row['approvers']
+
+
+def store(ou_dn, approvers):
+    """承認者候補を保存し、上限を超えた分を最終参照時刻の古い順に捨てる"""
+    now = timezone.now()
+    ttl = getattr(settings, 'LDAP_APPROVER_CACHE_TTL', DEFAULT_TTL)
+    try:
+        with transaction.atomic():
+            ApproverCacheEntry.objects.update_or_create(
+                key=cache_key(ou_dn),
+                defaults={
+                    'ou_dn': ou_dn,
+                    'approvers': approvers,
+                    'expires_at': now + timedelta(seconds=ttl),
+                    'last_accessed_at': now,
+                },
+            )
+            _evict(now)
+    except DatabaseError:
+        logger.warning("Approver cache store failed | ou=%s", ou_dn, exc_info=True)
+
+
+def _evict(now):
+    ApproverCacheEntry.objects.filter(expires_at__lte=now).delete()
+    max_entries = getattr(settings, 'LDAP_APPROVER_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    excess = ApproverCacheEntry.objects.count() - max_entries
+    if excess > 0:
+        stale = list(
+            ApproverCacheEntry.objects.order_by('last_accessed_at', 'pk').values_list('pk', flat=True)[:excess]
+        )
+        ApproverCacheEntry.objects.filter(pk__in=stale).delete()
+
+
+def invalidate(ou_dn=None):
+    """ou_dn の承認者候補を破棄する。None なら全 OU 分を破棄する
+
+    下位 OU のメンバーは上位 OU の候補 (SUBTREE 検索) にも含まれるため、
+    組織変更など影響範囲が読めないときは全破棄を使う。
+    """
+    entries = ApproverCacheEntry.objects.all()
+    if ou_dn is not None:
+        entries = entries.filter(key=cache_key(ou_dn))
+    try:
+        entries.delete()
+    except DatabaseError:
+        logger.warning("Approver cache invalidation failed | ou=%s", ou_dn, exc_info=True)
+        return
+    if ou_dn is None:
+        logger.info("Approver cache cleared")
+    else:
+        logger.info("Approver cache invalidated | ou=%s", ou_dn)
+
+
+def stats():
+    """このプロセスのヒット/ミス件数とヒット率"""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
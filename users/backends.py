@@ -28,6 +28,7 @@ from django.contrib import messages
 from django.conf import settings
 import logging
 import re
+import threading
 from urllib.parse import urlparse
 from typing import List, Tuple, Optional, Iterable, Any, cast
 from dataclasses import dataclass
@@ -38,6 +39,9 @@ LDAP_ATTRS_USER = [
     'memberOf', 'givenName', 'sn', 'displayName'
 ]
 LDAP_SEARCH_FILTER_USER = '(sAMAccountName={username})'
+# LDAP_SERVER_GET_INFO の値 → ldap3 の get_info
+# (ALL はスキーマ全体を取得するため重い。ログイン処理自体はどちらの情報も使わない)
+LDAP_INFO_LEVELS = ('NONE', 'DSA', 'ALL')
 
 
 @dataclass(frozen=True)
@@ -50,6 +54,8 @@ class LDAPRuntimeConfig:
     use_ssl: bool
     force_starttls: bool
     allow_plain: bool
+    get_info: str = 'NONE'
+    tls_insecure: bool = False
 
     @staticmethod
     def load() -> 'LDAPRuntimeConfig':
@@ -61,8 +67,43 @@ class LDAPRuntimeConfig:
             use_ssl=bool(getattr(settings, 'LDAP_USE_SSL', False)),
             force_starttls=bool(getattr(settings, 'LDAP_FORCE_STARTTLS', False)),
             allow_plain=bool(getattr(settings, 'LDAP_ALLOW_PLAIN_FALLBACK', False)),
+            get_info=str(getattr(settings, 'LDAP_SERVER_GET_INFO', 'NONE') or 'NONE').upper(),
+            tls_insecure=bool(getattr(settings, 'LDAP_TLS_INSECURE', False)),
         )
 
+    @property
+    def requires_starttls(self) -> bool:
+        """StartTLS 強制条件: 明示 force_starttls OR (暗号化手段が無 & allow_plain=False)"""
+        return self.force_starttls or (not self.use_ssl and not self.allow_plain)
+
+
+# LDAPRuntimeConfig ごとの ldap3.Server (Tls を含む) をプロセス内で共有する。
+# Server は取得済みの DSA/スキーマ情報を保持するので、2回目以降のログインでは再取得しない。
+_server_cache = {}
+_server_cache_lock = threading.Lock()
+
+
+def reset_server_cache():
+    """共有 Server を破棄する (設定変更時・テスト用)"""
+    with _server_cache_lock:
+        _server_cache.clear()
+
+
+def get_shared_server(cfg: LDAPRuntimeConfig):
+    """cfg に対応する共有 Server (Tls 込み)。サービスアカウントのプール (users.ldap_pool) も使う"""
+    backend = WindowsLDAPBackend()
+    host, port = backend._parse_host_port(cfg.server_url, cfg.use_ssl)
+    return backend._get_server(cfg, host, port)
+
+
+# (サーバ URL, ドメイン) ごとに直近で bind に成功した候補ラベル。次回はその形式から試す。
+_preferred_candidates = {}
+
+
+def reset_preferred_candidates():
+    """記憶している成功候補を忘れる (テスト用)"""
+    _preferred_candidates.clear()
+
 
 # Django標準の方法でロガーを取得
 logger = logging.getLogger('django.security.authentication')
@@ -141,9 +182,11 @@ class WindowsLDAPBackend(ModelBackend):
         """利用者資格情報で AD (LDAP) に直接バインドして認証するメインフロー。
 
         流れ (成功した時点で即 return):
-          1. 設定ロード & Server/TLS 初期化
+          1. 設定ロード & Server/TLS 取得 (設定ごとにプロセス内で共有)
           2. ユーザ名表記の揺れを吸収する複数のバインド候補生成
-          3. 各候補で順次: Connection 準備 → (必要なら StartTLS) → bind → ユーザ検索
+             (同じドメインで前回成功した形式を先頭に並べ替え)
+          3. Connection を1本だけ準備し (必要なら StartTLS も1回だけ)、
+             各候補で順次 rebind → ユーザ検索
           4. 最初に成功したエントリでローカルユーザ作成/取得 & プロファイル同期し返却
           5. 全候補失敗時は詳細ログを残して None
 
@@ -155,19 +198,16 @@ class WindowsLDAPBackend(ModelBackend):
             # 1) 設定ロード (毎回: 動的に設定変更される可能性を考慮 / キャッシュは不要な軽コスト)
             cfg = LDAPRuntimeConfig.load()
             # 2) ldap3 のインポートを遅延させることで: (a) 起動時コスト削減 (b) モジュール未導入時に他機能を壊さない
-            from ldap3 import Server, ALL  # 遅延 import
-            import ssl  # TLS 設定用 (証明書検証モード選択に利用)
+            import ldap3  # noqa: F401  遅延 import (未導入なら下の except ImportError へ)
             # --- 接続パラメータ準備 ---
             # URL から (host, port) を抽出
             host, port = self._parse_host_port(cfg.server_url, cfg.use_ssl)
-            # LDAPS or StartTLS を使う場合のみ TLS オブジェクト生成
-            tls = self._build_tls(cfg.use_ssl, cfg.force_starttls, ssl)
-            # get_info=ALL: スキーマ等のメタ情報取得 (軽量)
-            server = Server(host, port=port, use_ssl=cfg.use_ssl, get_info=ALL, tls=tls)
+            # Server/Tls は設定が同じ間は使い回す (DSA/スキーマ情報の取得は初回のみ)
+            server = self._get_server(cfg, host, port)
             # IP 指定かどうか (証明書 CN 不一致ログ判断用)
             host_is_ip = self._is_ipv4_like(host)
             # StartTLS 強制条件: 明示 force_starttls OR (暗号化手段が無 & allow_plain=False)
-            force_starttls = cfg.force_starttls or (not cfg.use_ssl and not cfg.allow_plain)
+            force_starttls = cfg.requires_starttls
             # 失敗試行の (label, last_error, result) 蓄積
             last_errors: List[Tuple[str, str, object]] = []
             # 認証候補 credential 群 (順序維持: 最初に成功したものを採用)
@@ -177,30 +217,45 @@ class WindowsLDAPBackend(ModelBackend):
                 self._log_no_candidates(username, cfg.domain, cfg.upn_suffix, cfg.use_ssl, force_starttls, cfg.allow_plain)
                 return None, "認証に必要なドメイン情報が不足しています。システム管理者に連絡してください。"
             
+            candidates = self._order_candidates(candidates, cfg)
             logger.debug("LDAP bind candidates | user=%s candidates=%s", username, [(c[0], c[1]) for c in candidates])
-            for label, bind_user, auth_kind in candidates:
-                user, error_msg = self._attempt_single_candidate(
-                    username=username,
-                    password=password,
-                    server=server,
-                    host=host,
-                    host_is_ip=host_is_ip,
-                    cfg=cfg,
-                    force_starttls=force_starttls,
-                    label=label,
-                    bind_user=bind_user,
-                    auth_kind=auth_kind,
-                    last_errors=last_errors,
-                )
-                # 特殊ケース: エントリ無し (bind 成功だが検索 0 件) → 全体として None を確定
-                if user is False:  # sentinel (検索なし早期終了)
-                    return None, (
-                        "【LDAPユーザー未登録】LDAPには接続できましたが該当ユーザー情報が見つかりません。"  # 事象概要
-                        "運用窓口へ『LDAPにユーザー未登録（追加/同期要確認）』と連絡してください。"
+            conn = None
+            try:
+                for label, bind_user, auth_kind in candidates:
+                    # 接続は候補間で使い回す。切れていたら (StartTLS 含め) 張り直す
+                    if conn is None or conn.closed:
+                        conn = self._open_connection(
+                            server=server, host=host, cfg=cfg, force_starttls=force_starttls, label=label,
+                            bind_user=bind_user, password=password, auth_kind=auth_kind, last_errors=last_errors,
+                        )
+                        if conn is None:
+                            continue
+                    user, error_msg = self._attempt_single_candidate(
+                        conn=conn,
+                        username=username,
+                        password=password,
+                        host=host,
+                        host_is_ip=host_is_ip,
+                        cfg=cfg,
+                        force_starttls=force_starttls,
+                        label=label,
+                        bind_user=bind_user,
+                        auth_kind=auth_kind,
+                        last_errors=last_errors,
                     )
-                # User インスタンスが返れば成功
-                if user is not None:
-                    return user, None
+                    # 特殊ケース: エントリ無し (bind 成功だが検索 0 件) → 全体として None を確定
+                    if user is False:  # sentinel (検索なし早期終了)
+                        return None, (
+                            "【LDAPユーザー未登録】LDAPには接続できましたが該当ユーザー情報が見つかりません。"  # 事象概要
+                            "運用窓口へ『LDAPにユーザー未登録（追加/同期要確認）』と連絡してください。"
+                        )
+                    # User インスタンスが返れば成功
+                    if user is not None:
+                        _preferred_candidates[(cfg.server_url, cfg.domain)] = label
+                        return user, None
+            finally:
+                if conn is not None:
+                    self._close_connection(conn)
             
             # 全候補失敗: 蓄積した失敗情報を DEBUG 出力し None
             self._log_all_attempt_fail(username, host, host_is_ip, cfg.domain, last_errors, cfg.use_ssl, force_starttls)
@@ -216,22 +271,47 @@ class WindowsLDAPBackend(ModelBackend):
             logger.exception("LDAP unexpected error | user=%s", username)
             return None, "認証処理中に予期せぬエラーが発生しました。システム管理者に連絡してください。"
 
-    def _attempt_single_candidate(self, *, username, password, server, host, host_is_ip, cfg, force_starttls,
+    def _order_candidates(self, candidates, cfg: LDAPRuntimeConfig):
+        """同じドメインで前回成功した形式の候補を先頭へ (無ければ元の順序のまま)。"""
+        preferred = _preferred_candidates.get((cfg.server_url, cfg.domain))
+        return sorted(candidates, key=lambda c: c[0] != preferred)
+
+    def _open_connection(self, *, server, host, cfg, force_starttls, label, bind_user, password, auth_kind, last_errors):
+        """ログイン1回分の Connection を用意し、必要なら StartTLS まで済ませる (失敗時は None)。"""
+        try:
+            conn = self._prepare_connection(server, bind_user, password, auth_kind)
+            if not cfg.use_ssl and force_starttls and not self._start_tls_if_needed(conn, host, bind_user, label, last_errors):
+                return None
+            return conn
+        except Exception as e:  # noqa: BLE001
+            logger.debug(
+                "LDAP connection exception | host=%s label=%s error=%s", host, label, e,
+                extra={'ldap': {'attempt': label}}
+            )
+            last_errors.append((label, str(e), {'description': 'exception'}))
+            return None
+
+    @staticmethod
+    def _close_connection(conn):
+        try:
+            conn.unbind()
+        except Exception:  # noqa: BLE001 - 切断済み接続の後始末
+            pass
+
+    def _attempt_single_candidate(self, *, conn, username, password, host, host_is_ip, cfg, force_starttls,
                                    label, bind_user, auth_kind, last_errors):
-        """単一のバインド候補 (label, bind_user, auth_kind) を試行し結果を返す。
+        """単一のバインド候補 (label, bind_user, auth_kind) で conn を rebind して試行し結果を返す。
+
+        conn は候補間で共有するため、ここでは閉じない (呼び出し側が最後に unbind)。
 
         戻り値:
           - (User インスタンス, None): 認証 + 検索成功
           - (False, None): bind 成功したが検索結果 0 件 → 早期に全体 None を返すべきシグナル
           - (None, エラーメッセージ): 失敗 (次候補継続)
         """
-        from ldap3 import NTLM, SIMPLE  # 遅延 import (各候補で失敗を局所化)
         try:
-            conn = self._prepare_connection(server, bind_user, password, auth_kind)
-            if not cfg.use_ssl and force_starttls and not self._start_tls_if_needed(conn, host, bind_user, label, last_errors):
-                return None, "セキュアな接続（STARTTLS）の確立に失敗しました。"
-            
-            if not self._bind_connection(conn, host, host_is_ip, cfg.use_ssl, force_starttls, label, auth_kind, last_errors):
+            if not self._bind_connection(conn, host, host_is_ip, cfg.use_ssl, force_starttls, label, auth_kind, last_errors,
+                                         bind_user=bind_user, password=password):
                 # 最後のエラーからメッセージを生成
                 if last_errors:
                     _, _, result = last_errors[-1]
@@ -241,12 +321,10 @@ class WindowsLDAPBackend(ModelBackend):
             
             entry = self._search_user_entry(conn, username, host, label, cfg.search_base, last_errors)
             if not entry:
-                conn.unbind()
                 return False, None  # 認証は通ったがユーザが居ない
             
             user = self._ensure_local_user(username, entry, cfg.upn_suffix, cfg.domain)
             self._sync_profile_from_ldap(user, entry)
-            conn.unbind()
             logger.info(
                 "LDAP auth success | user=%s attempt=%s bind_user=%s host=%s",
                 username, label, bind_user, host,
@@ -391,13 +469,42 @@ class WindowsLDAPBackend(ModelBackend):
         port = parsed.port or (636 if use_ssl else 389)
         return host, port
 
-    def _build_tls(self, use_ssl, force_starttls, ssl_mod):
+    def _get_server(self, cfg: LDAPRuntimeConfig, host, port):
+        """cfg に対応する共有 Server (無ければ生成してキャッシュ)."""
+        with _server_cache_lock:
+            server = _server_cache.get(cfg)
+            if server is None:
+                from ldap3 import Server, NONE, DSA, ALL  # 遅延 import
+                import ssl  # TLS 設定用 (証明書検証モード選択に利用)
+                levels = {'NONE': NONE, 'DSA': DSA, 'ALL': ALL}
+                if cfg.get_info not in levels:
+                    logger.warning("Unknown LDAP_SERVER_GET_INFO=%s (use one of %s); falling back to NONE",
+                                   cfg.get_info, '/'.join(LDAP_INFO_LEVELS))
+                # LDAPS or StartTLS を使う場合のみ TLS オブジェクト生成
+                tls = self._build_tls(cfg.use_ssl, cfg.force_starttls, ssl, insecure=cfg.tls_insecure)
+                server = Server(host, port=port, use_ssl=cfg.use_ssl, get_info=levels.get(cfg.get_info, NONE), tls=tls)
+                _server_cache[cfg] = server
+                logger.debug("LDAP server object created | host=%s port=%s get_info=%s", host, port, cfg.get_info)
+        return server
+
+    @staticmethod
+    def _needs_server_info(server) -> bool:
+        """共有 Server がまだ DSA/スキーマ情報を持っていなければ True (bind/StartTLS 時に取得させる)."""
+        from ldap3 import DSA, SCHEMA, ALL
+        level = getattr(server, 'get_info', None)
+        if level in (DSA, ALL) and server.info is None:
+            return True
+        return level in (SCHEMA, ALL) and server.schema is None
+
+    def _build_tls(self, use_ssl, force_starttls, ssl_mod, insecure=None):
         """LDAPS/StartTLS 用 Tls オブジェクト (不要なら None)."""
         if not (use_ssl or force_starttls):
             return None
+        if insecure is None:
+            insecure = getattr(settings, 'LDAP_TLS_INSECURE', False)
         try:
             from ldap3 import Tls  # 局所 import
-            validate_mode = ssl_mod.CERT_NONE if getattr(settings, 'LDAP_TLS_INSECURE', False) else ssl_mod.CERT_REQUIRED
+            validate_mode = ssl_mod.CERT_NONE if insecure else ssl_mod.CERT_REQUIRED
             return Tls(validate=validate_mode)
         except Exception:  # noqa: BLE001
             return None
@@ -432,7 +539,7 @@ class WindowsLDAPBackend(ModelBackend):
 
     def _start_tls_if_needed(self, conn, host, bind_user, label, last_errors):
         """必要条件を満たす場合に StartTLS を実行 (失敗時は記録して False)."""
-        if conn.start_tls():
+        if conn.start_tls(read_server_info=self._needs_server_info(conn.server)):
             return True
         logger.warning(
             "LDAP StartTLS failed | host=%s user=%s label=%s last_error=%s result=%s",
@@ -444,9 +551,19 @@ class WindowsLDAPBackend(ModelBackend):
         conn.unbind()
         return False
 
-    def _bind_connection(self, conn, host, host_is_ip, use_ssl, force_starttls, label, auth_method, last_errors):
-        """Connection.bind を実行し成功可否 (失敗時詳細を蓄積)."""
-        if conn.bind():
+    def _bind_connection(self, conn, host, host_is_ip, use_ssl, force_starttls, label, auth_method, last_errors,
+                         bind_user=None, password=None):
+        """bind_user/password で Connection.rebind を実行し成功可否 (失敗時詳細を蓄積).
+
+        失敗しても接続は閉じない (同じ接続・同じ TLS セッションのまま次候補で rebind する)。
+        """
+        from ldap3 import NTLM, SIMPLE
+        if conn.rebind(
+            user=bind_user or conn.user,
+            password=password if password is not None else conn.password,
+            authentication=NTLM if auth_method == 'NTLM' else SIMPLE,
+            read_server_info=self._needs_server_info(conn.server),
+        ):
             return True
         result_dict = conn.result if isinstance(conn.result, dict) else {}
         result_code = result_dict.get('result')
@@ -468,7 +585,6 @@ class WindowsLDAPBackend(ModelBackend):
             }}
         )
         last_errors.append((label, conn.last_error, conn.result))
-        conn.unbind()
         return False
 
     def _search_user_entry(self, conn, username, host, label, search_base, last_errors):
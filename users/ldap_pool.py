@@ -0,0 +1,222 @@
+"""サービスアカウントで bind 済みの LDAP 接続のプロセス内プール
+
+承認者検索などの読み取り系処理は呼び出しごとに 接続 → bind → unbind を
+行っていたが、bind は TCP 接続 (LDAPS なら TLS ハンドシェイク) と認証を伴い、
+検索本体より高くつく。ここでは bind 済みの接続をプロセス内で使い回す。
+
+- 同時に貸し出す接続は LDAP_POOL_SIZE 本まで。空きがなければ
+  LDAP_POOL_WAIT_SECONDS 待ち、それでも空かなければ LDAPPoolExhausted
+- LDAP_POOL_IDLE_SECONDS 以上使われなかった接続は閉じる
+  (AD やファイアウォールのアイドル切断より短くしておく)
+- 再利用前に生存確認を行う。閉じている・bound でない接続は対象外。最後の
+  利用から LDAP_POOL_CHECK_SECONDS 以上経っていれば RootDSE を読んで
+  実際に応答を確かめる
+- 生存確認に失敗した接続は bind し直し、それも失敗すれば閉じて別の接続を使う
+- 利用中に例外が出た接続はプールに戻さず閉じる
+- Server (LDAPS/StartTLS・証明書検証・LDAP_SERVER_GET_INFO) は認証バックエンドと
+  同じ設定から作り、同じものを共有する。平文で bind しない設定なら StartTLS してから bind する
+
+ldap3 の SYNC 接続はスレッドセーフではないため、1本の接続を同時に複数の
+呼び出し元へ貸すことはない。プールは (サーバ URL, bind DN, パスワード) ごとに
+1つで、承認者検索と今後の同期処理で共有する。
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import replace
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_IDLE_SECONDS = 300
+DEFAULT_CHECK_SECONDS = 30
+DEFAULT_WAIT_SECONDS = 10
+
+
+class LDAPPoolError(Exception):
+    """プールから接続を用意できなかった"""
+
+
+class LDAPPoolBindError(LDAPPoolError):
+    """サービスアカウントでの bind に失敗した"""
+
+
+class LDAPPoolExhausted(LDAPPoolError):
+    """待ち時間内に空きの接続ができなかった"""
+
+
+class _PooledConnection:
+    __slots__ = ('conn', 'last_used')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_used = time.monotonic()
+
+
+class LDAPConnectionPool:
+    """bind 済み接続のプール。connection() で借りて with を抜けると返却される"""
+
+    def __init__(self, server_url, bind_dn, password, *, max_size=DEFAULT_POOL_SIZE,
+                 idle_seconds=DEFAULT_IDLE_SECONDS, check_seconds=DEFAULT_CHECK_SECONDS,
+                 wait_seconds=DEFAULT_WAIT_SECONDS):
+        self.server_url = server_url
+        self.bind_dn = bind_dn
+        self.password = password
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self.check_seconds = check_seconds
+        self.wait_seconds = wait_seconds
+        self._server = None
+        self._starttls = False
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    @contextmanager
+    def connection(self):
+        item = self._checkout()
+        try:
+            yield item.conn
+        except BaseException:
+            self._close(item.conn)
+            self._slots.release()
+            raise
+        item.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(item)
+        self._slots.release()
+
+    def close_all(self):
+        """待機中の接続をすべて閉じる (貸し出し中のものは返却時にプールへ戻る)"""
+        with self._lock:
+            items = list(self._idle)
+            self._idle.clear()
+        for item in items:
+            self._close(item.conn)
+
+    def idle_count(self):
+        with self._lock:
+            return len(self._idle)
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise LDAPPoolExhausted(
+                f"LDAP 接続プールに空きがありません (size={self.max_size}, server={self.server_url})"
+            )
+        try:
+            while True:
+                item, expired = self._pop_idle()
+                for old in expired:
+                    self._close(old.conn)
+                if item is None:
+                    return _PooledConnection(self._open())
+                if self._is_alive(item) or self._rebind(item.conn):
+                    return item
+                self._close(item.conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _pop_idle(self):
+        """アイドル期限切れを取り除き、最も最近使われた接続を1本取り出す"""
+        deadline = time.monotonic() - self.idle_seconds
+        with self._lock:
+            expired = []
+            # 返却順に並んでいるので先頭ほど古い
+            while self._idle and self._idle[0].last_used < deadline:
+                expired.append(self._idle.popleft())
+            item = self._idle.pop() if self._idle else None
+        return item, expired
+
+    def _open(self):
+        from ldap3 import Connection
+        if self._server is None:
+            self._server, self._starttls = self._build_server()
+        conn = Connection(self._server, user=self.bind_dn, password=self.password, raise_exceptions=False)
+        if not self._bind(conn):
+            self._close(conn)
+            raise LDAPPoolBindError(f"LDAP サービスアカウントの bind に失敗しました (server={self.server_url})")
+        logger.debug("LDAP pool opened connection | server=%s", self.server_url)
+        return conn
+
+    def _build_server(self):
+        """認証バックエンドと同じ設定 (LDAPS/StartTLS・証明書検証・get_info) の共有 Server"""
+        from .backends import LDAPRuntimeConfig, get_shared_server
+        cfg = replace(LDAPRuntimeConfig.load(), server_url=self.server_url)
+        return get_shared_server(cfg), cfg.requires_starttls
+
+    def _bind(self, conn):
+        """必要なら StartTLS を済ませてから bind する。成功したら True
+
+        DSA/スキーマ情報は共有 Server がまだ持っていないときだけ読む (既定の NONE では読まない)。
+        """
+        from .backends import WindowsLDAPBackend
+        read_info = WindowsLDAPBackend._needs_server_info(conn.server)
+        if self._starttls and not conn.start_tls(read_server_info=read_info):
+            logger.warning("LDAP pool StartTLS failed | server=%s last_error=%s", self.server_url, conn.last_error)
+            return False
+        return bool(conn.bind(read_server_info=read_info))
+
+    def _is_alive(self, item):
+        conn = item.conn
+        if conn.closed or not conn.bound:
+            return False
+        if time.monotonic() - item.last_used < self.check_seconds:
+            return True
+        from ldap3 import BASE
+        try:
+            return bool(conn.search('', '(objectClass=*)', search_scope=BASE, attributes=['1.1']))
+        except Exception:  # noqa: BLE001 - ソケット切断等は生存確認の失敗として扱う
+            return False
+
+    def _rebind(self, conn):
+        """切れた接続を開き直して bind する。成功したら True"""
+        self._close(conn)
+        try:
+            ok = self._bind(conn)
+        except Exception:  # noqa: BLE001
+            ok = False
+        logger.info("LDAP pool rebind | server=%s ok=%s", self.server_url, ok)
+        return ok
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.unbind()
+        except Exception:  # noqa: BLE001 - 既に切れている接続の後始末
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(server_url, bind_dn, password):
+    """資格情報ごとのプロセス共通プール"""
+    key = (server_url, bind_dn, password)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = LDAPConnectionPool(
+                server_url, bind_dn, password,
+                max_size=getattr(settings, 'LDAP_POOL_SIZE', DEFAULT_POOL_SIZE),
+                idle_seconds=getattr(settings, 'LDAP_POOL_IDLE_SECONDS', DEFAULT_IDLE_SECONDS),
+                check_seconds=getattr(settings, 'LDAP_POOL_CHECK_SECONDS', DEFAULT_CHECK_SECONDS),
+                wait_seconds=getattr(settings, 'LDAP_POOL_WAIT_SECONDS', DEFAULT_WAIT_SECONDS),
+            )
+    return pool
+
+
+def reset_pools():
+    """全プールを閉じて破棄する (設定変更時・テスト用)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
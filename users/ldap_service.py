@@ -4,13 +4,36 @@ Django AUTHENTICATION_BACKENDS に登録する ModelBackend 実装からは純
 ユーザ認証の責務のみを扱いたいため、承認者探索等を分離する。
 """
 from __future__ import annotations
-from typing import List
+from typing import Iterator, List, Optional
 from dataclasses import dataclass
 import logging
 from django.conf import settings
 
+from . import approver_cache
+from .ldap_pool import LDAPPoolBindError, get_pool
+
 logger = logging.getLogger(__name__)
 
+APPROVER_OBJECT_FILTER = '(objectClass=user)(!(objectClass=computer))'
+APPROVER_SEARCH_FILTER = f'(&{APPROVER_OBJECT_FILTER})'
+APPROVER_ATTRIBUTES = ['sAMAccountName', 'cn', 'displayName', 'mail', 'distinguishedName']
+# 名前の前方一致で見る LDAP 属性と、キャッシュする dict のキーの対応
+# (サーバ側のフィルタとキャッシュ側の絞り込みの両方をここから作り、一致規則を揃える)
+NAME_MATCH_FIELDS = (
+    ('sAMAccountName', 'username'),
+    ('cn', 'display_name'),
+    ('displayName', 'ldap_display_name'),
+)
+# AD の MaxPageSize (既定 1000) 未満にしておく
+DEFAULT_APPROVER_PAGE_SIZE = 500
+
+
+def _first_value(value) -> str:
+    """paged_search の属性値 (スキーマ無しだとリストで返る) を文字列にする"""
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else ''
+    return str(value or '')
+
 @dataclass
 class Approver:
     username: str
@@ -18,11 +41,14 @@ class Approver:
     email: str
     dn: str
     ou: str
+    # displayName 属性 (前方一致の対象。表示には cn 由来の display_name を使う)
+    ldap_display_name: str = ''
 
     def to_dict(self):
         return {
             'username': self.username,
             'display_name': self.display_name,
+            'ldap_display_name': self.ldap_display_name,
             'email': self.email,
             'dn': self.dn,
             'ou': self.ou,
@@ -31,6 +57,7 @@ class Approver:
 class LDAPReadOnlyService:
     """サービスアカウント (Bind DN) を利用した読み取り専用操作。
     認証バックエンドからは使用しない (利用者資格情報のみでの bind 方針のため)。
+    接続は users.ldap_pool のプロセス共通プールから借りる。
     """
     def __init__(self):
         self.config = self._load_config()
@@ -43,46 +70,121 @@ class LDAPReadOnlyService:
             'service_password': getattr(settings, 'LDAP_BIND_PASSWORD', getattr(settings, 'LDAP_AUTH_CONNECTION_PASSWORD', None)),
         }
 
-    def get_approvers_for_dn(self, user_dn: str) -> List[dict]:
+    def connection(self):
+        """サービスアカウントで bind 済みの接続を借りる (with で使う)"""
+        return get_pool(
+            self.config['server'], self.config['service_user'], self.config['service_password']
+        ).connection()
+
+    def get_approvers_for_dn(self, user_dn: str, use_cache: bool = True,
+                             name_prefix: Optional[str] = None, limit: Optional[int] = None,
+                             refresh: bool = False) -> List[dict]:
+        """user_dn の所属 OU と上位 OU から承認者候補を返す。
+
+        name_prefix: 名前 (sAMAccountName / cn / displayName) の前方一致で絞り込む
+        limit: 返す件数の上限
+        refresh: キャッシュを読まずにサーバから取り直す。絞り込み無しなら結果でキャッシュを
+            置き換え、絞り込み付きなら古いキャッシュを破棄する (絞った結果は保存しない)
+
+        絞り込み無しの結果は所属 OU ごとに users.approver_cache へ保存し、同じ OU の
+        利用者で共有する (検索に失敗したときの空リストは保存しない)。絞り込み付きの
+        呼び出しはキャッシュがあればそれを絞り、無ければ条件 (前方一致フィルタ・件数上限)
+        をそのままサーバへ送る。
+        """
+        ou_list = self._extract_ou_hierarchy(user_dn)[:2]
+        narrowed = bool(name_prefix) or limit is not None
+        if refresh and narrowed and ou_list:
+            approver_cache.invalidate(ou_list[0])
+        if use_cache and not refresh and ou_list:
+            cached = approver_cache.get(ou_list[0])
+            if cached is not None:
+                return self._narrow(cached, name_prefix, limit) if narrowed else cached
         try:
             if not self.config['service_user']:
                 logger.error("LDAP service account not configured for approver lookup")
                 return []
-            from ldap3 import Server, Connection, ALL, SUBTREE, LEVEL
-            server = Server(self.config['server'], get_info=ALL)
-            conn = Connection(server, user=self.config['service_user'], password=self.config['service_password'])
-            if not conn.bind():
-                logger.error("LDAP service bind failed for approver lookup | server=%s", self.config['server'])
-                return []
-            ou_list = self._extract_ou_hierarchy(user_dn)[:2]
-            approvers: List[Approver] = []
-            for idx, ou_dn in enumerate(ou_list):
-                scope = SUBTREE if idx == 0 else LEVEL
-                if conn.search(
-                    search_base=ou_dn,
-                    search_filter='(&(objectClass=user)(!(objectClass=computer)))',
-                    search_scope=scope,
-                    attributes=['sAMAccountName', 'cn', 'mail', 'distinguishedName']
-                ):
-                    for entry in conn.entries:
-                        username = str(getattr(entry, 'sAMAccountName', '') or '')
-                        display_name = str(getattr(entry, 'cn', '') or '')
-                        if not (username and display_name):
-                            continue
-                        approvers.append(
-                            Approver(
-                                username=username,
-                                display_name=display_name,
-                                email=str(getattr(entry, 'mail', '') or ''),
-                                dn=str(getattr(entry, 'distinguishedName', '') or ''),
-                                ou=ou_dn,
-                            )
-                        )
-            conn.unbind()
-            return [a.to_dict() for a in approvers]
+            with self.connection() as conn:
+                approvers = [
+                    a.to_dict() for a in self.iter_approvers(conn, ou_list, name_prefix=name_prefix, limit=limit)
+                ]
+        except LDAPPoolBindError:
+            logger.error("LDAP service bind failed for approver lookup | server=%s", self.config['server'])
+            return []
         except Exception:
             logger.exception("Error during approver lookup | user_dn=%s", user_dn)
             return []
+        if (use_cache or refresh) and ou_list and not narrowed:
+            approver_cache.store(ou_list[0], approvers)
+        return approvers
+
+    def iter_approvers(self, conn, ou_list: List[str], name_prefix: Optional[str] = None,
+                       limit: Optional[int] = None, page_size: Optional[int] = None) -> Iterator[Approver]:
+        """ou_list の各 OU (先頭は SUBTREE、以降は LEVEL) を Simple Paged Results で検索し、
+        Approver を1件ずつ返すジェネレータ。
+
+        ページ単位で取得するため AD の MaxPageSize で結果が切れず、全件を一度に
+        メモリへ載せることもない。limit 件に達した時点で検索を打ち切る (残り件数は
+        sizeLimit としてサーバにも送り、余分なページを返させない)。
+        """
+        from ldap3 import SUBTREE, LEVEL
+        if page_size is None:
+            page_size = getattr(settings, 'LDAP_APPROVER_PAGE_SIZE', DEFAULT_APPROVER_PAGE_SIZE)
+        search_filter = self._approver_filter(name_prefix)
+        count = 0
+        for idx, ou_dn in enumerate(ou_list):
+            if limit is not None and count >= limit:
+                return
+            entries = conn.extend.standard.paged_search(
+                search_base=ou_dn,
+                search_filter=search_filter,
+                search_scope=SUBTREE if idx == 0 else LEVEL,
+                attributes=APPROVER_ATTRIBUTES,
+                paged_size=page_size,
+                size_limit=limit - count if limit is not None else 0,
+                generator=True,
+            )
+            for entry in entries:
+                if entry.get('type') != 'searchResEntry':  # 参照 (referral) 等
+                    continue
+                attrs = entry.get('attributes') or {}
+                username = _first_value(attrs.get('sAMAccountName'))
+                display_name = _first_value(attrs.get('cn'))
+                if not (username and display_name):
+                    continue
+                yield Approver(
+                    username=username,
+                    display_name=display_name,
+                    email=_first_value(attrs.get('mail')),
+                    dn=_first_value(attrs.get('distinguishedName')) or str(entry.get('dn') or ''),
+                    ou=ou_dn,
+                    ldap_display_name=_first_value(attrs.get('displayName')),
+                )
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+
+    @staticmethod
+    def _approver_filter(name_prefix: Optional[str]) -> str:
+        if not name_prefix:
+            return APPROVER_SEARCH_FILTER
+        from ldap3.utils.conv import escape_filter_chars
+        prefix = escape_filter_chars(name_prefix)
+        names = ''.join(f'({attr}={prefix}*)' for attr, _ in NAME_MATCH_FIELDS)
+        return f'(&{APPROVER_OBJECT_FILTER}(|{names}))'
+
+    @staticmethod
+    def _narrow(approvers: List[dict], name_prefix: Optional[str], limit: Optional[int]) -> List[dict]:
+        """キャッシュ済みの候補をサーバ側と同じ条件 (NAME_MATCH_FIELDS の前方一致・件数上限) で絞る
+
+        AD の文字列比較 (caseIgnoreMatch) に合わせ、大文字小文字は区別しない。
+        """
+        if name_prefix:
+            prefix = name_prefix.casefold()
+            approvers = [
+                a for a in approvers
+                if any((a.get(key) or '').casefold().startswith(prefix) for _, key in NAME_MATCH_FIELDS)
+            ]
+        return approvers[:limit] if limit is not None else approvers
 
     def _extract_ou_hierarchy(self, user_dn: str):
         ou_parts = []
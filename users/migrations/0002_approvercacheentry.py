@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApproverCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='キー')),
+                ('ou_dn', models.TextField(verbose_name='所属 OU')),
+                ('approvers', models.JSONField(verbose_name='承認者候補')),
+                ('expires_at', models.DateTimeField(verbose_name='有効期限')),
+                ('last_accessed_at', models.DateTimeField(db_index=True, verbose_name='最終参照時刻')),
+            ],
+            options={
+                'verbose_name': '承認者候補キャッシュ',
+                'verbose_name_plural': '承認者候補キャッシュ',
+            },
+        ),
+    ]
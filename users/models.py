@@ -51,3 +51,23 @@ class User(AbstractUser):
 
     def __str__(self):  # noqa: D401 - シンプル表示
         return self.username
+
+
+class ApproverCacheEntry(models.Model):
+    """承認者候補キャッシュの1エントリ (所属 OU ごと。users.approver_cache が読み書きする)
+
+    全プロセスで共有するため DB に置く。件数の上限を超えたら last_accessed_at の
+    古いものから捨てる (LRU)。
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name="キー")
+    ou_dn = models.TextField(verbose_name="所属 OU")
+    approvers = models.JSONField(verbose_name="承認者候補")
+    expires_at = models.DateTimeField(verbose_name="有効期限")
+    last_accessed_at = models.DateTimeField(db_index=True, verbose_name="最終参照時刻")
+
+    class Meta:
+        verbose_name = "承認者候補キャッシュ"
+        verbose_name_plural = "承認者候補キャッシュ"
+
+    def __str__(self):
+        return self.ou_dn
@@ -1,19 +1,43 @@
+import time
+from datetime import timedelta
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
 from django.test import TestCase, override_settings
-from ldap3 import SUBTREE, LEVEL
+from django.urls import reverse
+from django.utils import timezone
+from ldap3 import SUBTREE, LEVEL, NONE, DSA, ALL, Server
+from users.backends import LDAPRuntimeConfig, WindowsLDAPBackend, reset_preferred_candidates, reset_server_cache
+from users import approver_cache
+from users.ldap_pool import LDAPConnectionPool, LDAPPoolBindError, LDAPPoolExhausted, reset_pools
 from users.ldap_service import LDAPReadOnlyService
+from users.models import ApproverCacheEntry
 
 
 class ApproverBackendTests(TestCase):
     """LDAPReadOnlyService.get_approvers_for_dn のテスト"""
 
+    def setUp(self):
+        reset_pools()
+        reset_server_cache()
+        self.addCleanup(reset_pools)
+        self.addCleanup(reset_server_cache)
+        approver_cache.invalidate()
+        approver_cache.reset_stats()
+
     def _build_entry(self, username, display_name, email, dn):
-        e = MagicMock()
-        e.sAMAccountName = username
-        e.cn = display_name
-        e.mail = email
-        e.distinguishedName = dn
-        return e
+        # paged_search(generator=True) が返すエントリ (スキーマ無しだと値はリスト)
+        return {
+            'type': 'searchResEntry',
+            'dn': dn,
+            'attributes': {
+                'sAMAccountName': username,
+                'cn': [display_name],
+                'mail': email,
+                'distinguishedName': dn,
+            },
+        }
 
     @override_settings(
         LDAP_SERVER_URL="ldap://ldap.example.com:389",
@@ -35,28 +59,31 @@ class ApproverBackendTests(TestCase):
         mock_conn = MagicMock()
         mock_conn.bind.return_value = True
 
-        def search_side_effect(search_base=None, search_filter=None, search_scope=None, attributes=None):
+        def search_side_effect(search_base=None, search_filter=None, search_scope=None, attributes=None,
+                               paged_size=None, size_limit=None, generator=None):
             if search_base and search_base.startswith("OU=Dept1"):
-                mock_conn.entries = [self._build_entry(
+                return iter([self._build_entry(
                     "bob", "Bob Builder", "bob@example.com", "CN=Bob,OU=Dept1,OU=Div,DC=example,DC=com"
-                )]
+                ), {'type': 'searchResRef', 'uri': ['ldap://other.example.com/']}])
             elif search_base and search_base.startswith("OU=Div"):
-                mock_conn.entries = [self._build_entry(
+                return iter([self._build_entry(
                     "charlie", "Charlie Chaplin", "charlie@example.com", "CN=Charlie,OU=Div,DC=example,DC=com"
-                )]
-            else:
-                mock_conn.entries = []
-            return True
+                )])
+            return iter([])
 
-        mock_conn.search.side_effect = search_side_effect
+        paged_search = mock_conn.extend.standard.paged_search
+        paged_search.side_effect = search_side_effect
         mock_conn_cls.return_value = mock_conn
         approvers = service.get_approvers_for_dn(user_dn)
         self.assertEqual(len(approvers), 2)
         self.assertSetEqual({a['username'] for a in approvers}, {"bob", "charlie"})
-        self.assertEqual(mock_conn.search.call_count, 2)
-        scopes = [kw['search_scope'] for _, kw in mock_conn.search.call_args_list]
+        self.assertEqual(approvers[0]['display_name'], "Bob Builder")
+        self.assertEqual(paged_search.call_count, 2)
+        scopes = [kw['search_scope'] for _, kw in paged_search.call_args_list]
         self.assertEqual(scopes, [SUBTREE, LEVEL])
-        mock_conn.unbind.assert_called_once()
+        self.assertTrue(all(kw['generator'] and kw['paged_size'] for _, kw in paged_search.call_args_list))
+        # 接続は閉じずにプールへ戻る
+        mock_conn.unbind.assert_not_called()
 
     @override_settings(
         LDAP_SERVER_URL="ldap://ldap.example.com:389",
@@ -73,8 +100,9 @@ class ApproverBackendTests(TestCase):
         mock_conn.bind.return_value = False
         mock_conn_cls.return_value = mock_conn
         self.assertEqual(service.get_approvers_for_dn(user_dn), [])
-        mock_conn.search.assert_not_called()
-        mock_conn.unbind.assert_not_called()
+        mock_conn.extend.standard.paged_search.assert_not_called()
+        # bind に失敗した接続はプールに入れず閉じる
+        mock_conn.unbind.assert_called_once()
 
     @override_settings(
         LDAP_SERVER_URL="ldap://ldap.example.com:389",
@@ -102,7 +130,460 @@ class ApproverBackendTests(TestCase):
         mock_conn.bind.return_value = True
         def raise_err(*a, **kw):
             raise RuntimeError("LDAP search error")
-        mock_conn.search.side_effect = raise_err
+        mock_conn.extend.standard.paged_search.side_effect = raise_err
         mock_conn_cls.return_value = mock_conn
         self.assertEqual(service.get_approvers_for_dn(user_dn), [])
+        # 例外が出た接続はプールに戻さず閉じる
+        mock_conn.unbind.assert_called_once()
+
+    @override_settings(
+        LDAP_SERVER_URL="ldap://ldap.example.com:389",
+        LDAP_SEARCH_BASE="DC=example,DC=com",
+        LDAP_BIND_DN="CN=svc,DC=example,DC=com",
+        LDAP_BIND_PASSWORD="secret",
+    )
+    @patch("ldap3.Connection")
+    @patch("ldap3.Server")
+    def test_reuses_pooled_connection(self, mock_server, mock_conn_cls):
+        user_dn = "CN=Alice,OU=Dept1,OU=Div,DC=example,DC=com"
+        mock_conn = MagicMock(closed=False, bound=True)
+        mock_conn.bind.return_value = True
+        mock_conn.extend.standard.paged_search.return_value = iter([])
+        mock_conn_cls.return_value = mock_conn
+        LDAPReadOnlyService().get_approvers_for_dn(user_dn, use_cache=False)
+        LDAPReadOnlyService().get_approvers_for_dn(user_dn, use_cache=False)
+        self.assertEqual(mock_conn_cls.call_count, 1)
+        self.assertEqual(mock_server.call_count, 1)
+        mock_conn.bind.assert_called_once()
         mock_conn.unbind.assert_not_called()
+
+
+class LDAPConnectionPoolTests(TestCase):
+    """users.ldap_pool.LDAPConnectionPool のテスト"""
+
+    def setUp(self):
+        reset_server_cache()
+        self.addCleanup(reset_server_cache)
+
+    def _pool(self, **kwargs):
+        return LDAPConnectionPool("ldap://ldap.example.com:389", "CN=svc,DC=example,DC=com", "secret", **kwargs)
+
+    @override_settings(LDAP_SERVER_URL="ldaps://ldap.example.com:636", LDAP_USE_SSL=True, LDAP_SERVER_GET_INFO="NONE")
+    @patch("ldap3.Connection")
+    def test_server_follows_runtime_tls_settings(self, mock_conn_cls):
+        mock_conn_cls.return_value.bind.return_value = True
+        pool = LDAPConnectionPool("ldaps://ldap.example.com:636", "CN=svc,DC=example,DC=com", "secret")
+        with pool.connection():
+            pass
+        server = mock_conn_cls.call_args.args[0]
+        self.assertTrue(server.ssl)
+        self.assertEqual(server.get_info, NONE)
+        self.assertIsNotNone(server.tls)
+        # 認証バックエンドと同じ Server を使う
+        self.assertIs(server, WindowsLDAPBackend()._get_server(LDAPRuntimeConfig.load(), "ldap.example.com", 636))
+        mock_conn_cls.return_value.start_tls.assert_not_called()
+
+    @override_settings(LDAP_USE_SSL=False, LDAP_ALLOW_PLAIN_FALLBACK=False)
+    @patch("ldap3.Connection")
+    def test_starttls_before_bind_when_plain_not_allowed(self, mock_conn_cls):
+        conn = mock_conn_cls.return_value
+        conn.start_tls.return_value = False
+        with self.assertRaises(LDAPPoolBindError):
+            with self._pool().connection():
+                pass
+        conn.start_tls.assert_called_once()
+        conn.bind.assert_not_called()
+
+    @patch("ldap3.Connection")
+    @patch("ldap3.Server")
+    def test_dead_connection_is_rebound(self, mock_server, mock_conn_cls):
+        mock_conn = MagicMock(closed=False, bound=True)
+        mock_conn.bind.return_value = True
+        mock_conn_cls.return_value = mock_conn
+        pool = self._pool()
+        with pool.connection():
+            pass
+        # サーバ側で切断された
+        mock_conn.closed = True
+        with pool.connection() as conn:
+            self.assertIs(conn, mock_conn)
+        self.assertEqual(mock_conn.bind.call_count, 2)
+        self.assertEqual(mock_conn_cls.call_count, 1)
+
+    @patch("ldap3.Connection")
+    @patch("ldap3.Server")
+    def test_stale_connection_is_pinged_and_replaced_on_failure(self, mock_server, mock_conn_cls):
+        stale = MagicMock(closed=False, bound=True)
+        stale.bind.side_effect = [True, False]
+        stale.search.side_effect = OSError("connection reset")
+        fresh = MagicMock(closed=False, bound=True)
+        fresh.bind.return_value = True
+        mock_conn_cls.side_effect = [stale, fresh]
+        pool = self._pool(check_seconds=0)
+        with pool.connection():
+            pass
+        with pool.connection() as conn:
+            self.assertIs(conn, fresh)
+        stale.search.assert_called_once()
+        self.assertEqual(pool.idle_count(), 1)
+
+    @patch("ldap3.Connection")
+    @patch("ldap3.Server")
+    def test_idle_connections_expire(self, mock_server, mock_conn_cls):
+        first, second = MagicMock(closed=False, bound=True), MagicMock(closed=False, bound=True)
+        first.bind.return_value = second.bind.return_value = True
+        mock_conn_cls.side_effect = [first, second]
+        pool = self._pool(idle_seconds=0)
+        with pool.connection():
+            pass
+        with pool.connection() as conn:
+            self.assertIs(conn, second)
+        first.unbind.assert_called_once()
+
+    @patch("ldap3.Connection")
+    @patch("ldap3.Server")
+    def test_size_limit(self, mock_server, mock_conn_cls):
+        mock_conn_cls.return_value.bind.return_value = True
+        pool = self._pool(max_size=1, wait_seconds=0)
+        with pool.connection():
+            with self.assertRaises(LDAPPoolExhausted):
+                with pool.connection():
+                    pass
+        with pool.connection():
+            pass
+
+
+@override_settings(
+    LDAP_SERVER_URL="ldaps://ldap.example.com:636",
+    LDAP_USE_SSL=True,
+    LDAP_SERVER_GET_INFO="NONE",
+)
+class LDAPServerCacheTests(TestCase):
+    """WindowsLDAPBackend の Server/Tls 共有のテスト"""
+
+    def setUp(self):
+        reset_server_cache()
+        self.addCleanup(reset_server_cache)
+        self.backend = WindowsLDAPBackend()
+
+    def _server(self):
+        cfg = LDAPRuntimeConfig.load()
+        host, port = self.backend._parse_host_port(cfg.server_url, cfg.use_ssl)
+        return self.backend._get_server(cfg, host, port)
+
+    def test_server_shared_per_config(self):
+        first = self._server()
+        self.assertIs(self._server(), first)
+        self.assertEqual(first.get_info, NONE)
+        self.assertIsNotNone(first.tls)
+        with override_settings(LDAP_SERVER_GET_INFO="all"):
+            other = self._server()
+        self.assertIsNot(other, first)
+        self.assertEqual(other.get_info, ALL)
+
+    def test_unknown_info_level_falls_back_to_none(self):
+        with override_settings(LDAP_SERVER_GET_INFO="SCHEMA_PLEASE"):
+            self.assertEqual(self._server().get_info, NONE)
+
+    def test_server_info_read_only_until_cached(self):
+        server = Server("ldap.example.com", get_info=DSA)
+        self.assertTrue(WindowsLDAPBackend._needs_server_info(server))
+        server._dsa_info = MagicMock()
+        self.assertFalse(WindowsLDAPBackend._needs_server_info(server))
+        self.assertFalse(WindowsLDAPBackend._needs_server_info(Server("ldap.example.com", get_info=NONE)))
+
+    @patch("ldap3.Server")
+    def test_cached_server_is_faster_than_per_login(self, mock_server):
+        # 新しい Server は初回 bind で DSA/スキーマを取り直すため、その往復を sleep で代用する
+        def build_server(*args, **kwargs):
+            time.sleep(0.005)
+            return MagicMock()
+        mock_server.side_effect = build_server
+        logins = 20
+
+        started = time.perf_counter()
+        for _ in range(logins):
+            reset_server_cache()
+            self._server()
+        per_login = time.perf_counter() - started
+        self.assertEqual(mock_server.call_count, logins)
+
+        mock_server.reset_mock()
+        reset_server_cache()
+        started = time.perf_counter()
+        for _ in range(logins):
+            self._server()
+        cached = time.perf_counter() - started
+        self.assertEqual(mock_server.call_count, 1)
+
+        self.assertLess(cached, per_login / 2)
+
+
+@override_settings(
+    LDAP_SERVER_URL="ldap://ldap.example.com:389",
+    LDAP_SEARCH_BASE="DC=example,DC=com",
+    LDAP_USE_SSL=False,
+    LDAP_FORCE_STARTTLS=True,
+    LDAP_DOMAIN="example",
+    LDAP_UPN_SUFFIX="example.local",
+)
+class LoginConnectionReuseTests(TestCase):
+    """ログイン時の接続共有 (StartTLS 1回 + 候補ごとの rebind) のテスト"""
+
+    def setUp(self):
+        reset_server_cache()
+        reset_preferred_candidates()
+        self.addCleanup(reset_server_cache)
+        self.addCleanup(reset_preferred_candidates)
+        self.backend = WindowsLDAPBackend()
+
+    def _mock_conn(self):
+        conn = MagicMock(closed=False)
+        conn.start_tls.return_value = True
+        # UPN 形式だけが通るドメイン
+        conn.rebind.side_effect = lambda user=None, **kw: user.endswith("@example.local")
+        conn.result = {"description": "invalidCredentials"}
+        conn.search.return_value = True
+        conn.entries = [SimpleNamespace(
+            displayName="Alice Example", cn="Alice Example", mail="alice@example.com",
+            distinguishedName="CN=Alice,OU=Dept1,DC=example,DC=com", department="Dept1", title="",
+        )]
+        return conn
+
+    @patch("ldap3.Connection")
+    def test_candidates_share_one_connection(self, mock_conn_cls):
+        conn = mock_conn_cls.return_value = self._mock_conn()
+        user, error = self.backend._authenticate_ldap3("alice", "pw")
+        self.assertIsNotNone(user)
+        self.assertIsNone(error)
+        self.assertEqual(mock_conn_cls.call_count, 1)
+        conn.start_tls.assert_called_once()
+        self.assertEqual([c.kwargs["user"] for c in conn.rebind.call_args_list],
+                         ["example\\alice", "alice@example.local"])
+        conn.unbind.assert_called_once()
+
+    @patch("ldap3.Connection")
+    def test_successful_form_is_tried_first_next_time(self, mock_conn_cls):
+        conn = mock_conn_cls.return_value = self._mock_conn()
+        self.backend._authenticate_ldap3("alice", "pw")
+        conn.rebind.reset_mock()
+        user, _ = self.backend._authenticate_ldap3("alice", "pw")
+        self.assertIsNotNone(user)
+        self.assertEqual([c.kwargs["user"] for c in conn.rebind.call_args_list], ["alice@example.local"])
+
+    @patch("ldap3.Connection")
+    def test_closed_connection_is_reopened_with_starttls(self, mock_conn_cls):
+        dropped = self._mock_conn()
+
+        def drop(user=None, **kw):
+            dropped.closed = True
+            return False
+        dropped.rebind.side_effect = drop
+        fresh = self._mock_conn()
+        mock_conn_cls.side_effect = [dropped, fresh]
+        user, _ = self.backend._authenticate_ldap3("alice", "pw")
+        self.assertIsNotNone(user)
+        fresh.start_tls.assert_called_once()
+        fresh.rebind.assert_called_once()
+
+
+@override_settings(
+    LDAP_SERVER_URL="ldap://ldap.example.com:389",
+    LDAP_SEARCH_BASE="DC=example,DC=com",
+    LDAP_BIND_DN="CN=svc,DC=example,DC=com",
+    LDAP_BIND_PASSWORD="secret",
+)
+class ApproverCacheTests(TestCase):
+    """承認者候補の OU 単位キャッシュのテスト"""
+
+    def setUp(self):
+        reset_pools()
+        approver_cache.invalidate()
+        approver_cache.reset_stats()
+        self.addCleanup(reset_pools)
+        self.addCleanup(approver_cache.invalidate)
+        patchers = [patch("ldap3.Server"), patch("ldap3.Connection")]
+        _, mock_conn_cls = [p.start() for p in patchers]
+        for p in patchers:
+            self.addCleanup(p.stop)
+        self.conn = mock_conn_cls.return_value
+        self.conn.configure_mock(closed=False, bound=True)
+        self.conn.bind.return_value = True
+        self.paged_search = self.conn.extend.standard.paged_search
+        self.paged_search.side_effect = lambda **kw: iter([self._entry("bob", "Bob")])
+
+    @staticmethod
+    def _entry(username, display_name):
+        return {'type': 'searchResEntry', 'dn': f"CN={display_name},OU=Dept1,OU=Div,DC=example,DC=com",
+                'attributes': {'sAMAccountName': username, 'cn': display_name, 'mail': f"{username}@example.com"}}
+
+    def test_same_ou_hits_ldap_once(self):
+        service = LDAPReadOnlyService()
+        first = service.get_approvers_for_dn("CN=Alice,OU=Dept1,OU=Div,DC=example,DC=com")
+        second = service.get_approvers_for_dn("CN=Carol,OU=Dept1,OU=Div,DC=example,DC=com")
+        self.assertEqual(first, second)
+        self.assertEqual(self.paged_search.call_count, 2)  # 所属 OU + 上位 OU の1回分
+        self.assertEqual(approver_cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+        service.get_approvers_for_dn("CN=Dave,OU=Dept2,OU=Div,DC=example,DC=com")
+        self.assertEqual(self.paged_search.call_count, 4)
+
+    def test_failed_lookup_is_not_cached(self):
+        results = [RuntimeError("LDAP down"), [self._entry("bob", "Bob")], [self._entry("carol", "Carol")]]
+
+        def paged(**kw):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return iter(result)
+        self.paged_search.side_effect = paged
+        service = LDAPReadOnlyService()
+        user_dn = "CN=Alice,OU=Dept1,OU=Div,DC=example,DC=com"
+        self.assertEqual(service.get_approvers_for_dn(user_dn), [])
+        self.assertEqual(len(service.get_approvers_for_dn(user_dn)), 2)
+
+    def test_invalidation_endpoint(self):
+        User = get_user_model()
+        url = reverse("users:approver-cache")
+        user_dn = "CN=Alice,OU=Dept1,OU=Div,DC=example,DC=com"
+        LDAPReadOnlyService().get_approvers_for_dn(user_dn)
+
+        self.client.force_login(User.objects.create_user(username="member", password="pw"))
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user(username="admin", password="pw", is_staff=True))
+        response = self.client.post(url, {"ou": "OU=Dept1, OU=Div, DC=example, DC=com"})
+        self.assertEqual(response.json()["invalidated"], "OU=Dept1, OU=Div, DC=example, DC=com")
+        self.assertIsNone(approver_cache.get("OU=Dept1,OU=Div,DC=example,DC=com"))
+
+        stats = self.client.get(url).json()["stats"]
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 2))
+
+    def test_resync_sends_prefix_and_limit_to_server(self):
+        ou_dn = "OU=Dept1,OU=Div,DC=example,DC=com"
+        approver_cache.store(ou_dn, [{'username': 'stale', 'display_name': 'Stale', 'email': '', 'dn': '', 'ou': ''}])
+        user = get_user_model().objects.create_user(username="alice", password="pw", ldap_dn=f"CN=Alice,{ou_dn}")
+        self.client.force_login(user)
+        body = self.client.get(reverse("users:approvers-resync"), {"q": "b*", "limit": "3"}).json()
+        self.assertEqual([c["username"] for c in body["candidates"]], ["bob", "bob"])
+        first = self.paged_search.call_args_list[0].kwargs
+        self.assertEqual(
+            first["search_filter"],
+            r"(&(objectClass=user)(!(objectClass=computer))"
+            r"(|(sAMAccountName=b\2a*)(cn=b\2a*)(displayName=b\2a*)))",
+        )
+        self.assertEqual(first["size_limit"], 4)  # 本人除外分の1件を含む
+        self.assertEqual(self.paged_search.call_args_list[1].kwargs["size_limit"], 3)
+        # 絞った結果は保存せず、古いキャッシュは破棄する
+        self.assertIsNone(approver_cache.get(ou_dn))
+
+    def test_resync_without_query_replaces_cache(self):
+        ou_dn = "OU=Dept1,OU=Div,DC=example,DC=com"
+        approver_cache.store(ou_dn, [{'username': 'stale', 'display_name': 'Stale', 'email': '', 'dn': '', 'ou': ''}])
+        user = get_user_model().objects.create_user(username="alice", password="pw", ldap_dn=f"CN=Alice,{ou_dn}")
+        self.client.force_login(user)
+        self.client.get(reverse("users:approvers-resync"))
+        self.assertEqual(self.paged_search.call_args_list[0].kwargs["size_limit"], 0)
+        self.assertEqual({a["username"] for a in approver_cache.get(ou_dn)}, {"bob"})
+
+    def test_evicts_least_recently_used_entry(self):
+        with override_settings(LDAP_APPROVER_CACHE_MAX_ENTRIES=2):
+            approver_cache.store("OU=A,DC=example,DC=com", [])
+            approver_cache.store("OU=B,DC=example,DC=com", [])
+            # A を最近使ったことにする (B より新しい参照時刻)
+            ApproverCacheEntry.objects.filter(ou_dn="OU=B,DC=example,DC=com").update(
+                last_accessed_at=timezone.now() - timedelta(hours=1)
+            )
+            approver_cache.store("OU=C,DC=example,DC=com", [])
+        self.assertEqual(
+            set(ApproverCacheEntry.objects.values_list('ou_dn', flat=True)),
+            {"OU=A,DC=example,DC=com", "OU=C,DC=example,DC=com"},
+        )
+
+    def test_hit_refreshes_access_time_only_after_resolution(self):
+        ou_dn = "OU=Dept1,OU=Div,DC=example,DC=com"
+        approver_cache.store(ou_dn, [])
+        with self.assertNumQueries(1):
+            approver_cache.get(ou_dn)
+        old = timezone.now() - timedelta(hours=1)
+        ApproverCacheEntry.objects.update(last_accessed_at=old)
+        with self.assertNumQueries(2):
+            approver_cache.get(ou_dn)
+        self.assertGreater(ApproverCacheEntry.objects.get().last_accessed_at, old)
+
+    def test_invalidate_all_keeps_stats(self):
+        approver_cache.get("OU=Dept1,OU=Div,DC=example,DC=com")
+        approver_cache.invalidate()
+        self.assertEqual(approver_cache.stats()["misses"], 1)
+
+    def test_cache_table_errors_fall_back_to_ldap(self):
+        with patch.object(ApproverCacheEntry.objects, "filter", side_effect=OperationalError("no such table")):
+            approvers = LDAPReadOnlyService().get_approvers_for_dn("CN=Alice,OU=Dept1,OU=Div,DC=example,DC=com")
+        self.assertEqual({a["username"] for a in approvers}, {"bob"})
+        self.assertEqual(self.paged_search.call_count, 2)
+
+
+class PagedApproverSearchTests(TestCase):
+    """LDAPReadOnlyService.iter_approvers (Simple Paged Results) のテスト"""
+
+    OU_LIST = ["OU=Dept1,OU=Div,DC=example,DC=com", "OU=Div,DC=example,DC=com"]
+
+    def setUp(self):
+        approver_cache.invalidate()
+        self.addCleanup(approver_cache.invalidate)
+        self.pulled = 0
+
+        def paged(search_base=None, **kw):
+            # サーバからページ単位で届く想定。取り出された件数を数える
+            for i in range(1500):
+                self.pulled += 1
+                yield {'type': 'searchResEntry', 'dn': f"CN=u{i},{search_base}",
+                       'attributes': {'sAMAccountName': f"user{i:04d}", 'cn': f"User {i:04d}"}}
+        self.conn = MagicMock()
+        self.conn.extend.standard.paged_search.side_effect = paged
+
+    def test_streams_beyond_max_page_size(self):
+        approvers = LDAPReadOnlyService().iter_approvers(self.conn, self.OU_LIST[:1], page_size=200)
+        self.assertEqual(self.pulled, 0)  # ジェネレータなので取り出すまで検索しない
+        self.assertEqual(sum(1 for _ in approvers), 1500)
+        self.assertEqual(self.conn.extend.standard.paged_search.call_args.kwargs['paged_size'], 200)
+
+    def test_limit_stops_search_early(self):
+        approvers = list(LDAPReadOnlyService().iter_approvers(self.conn, self.OU_LIST, limit=10))
+        self.assertEqual(len(approvers), 10)
+        self.assertEqual(self.pulled, 10)
+        self.conn.extend.standard.paged_search.assert_called_once()
+
+    def test_name_prefix_is_sent_to_server_escaped(self):
+        list(LDAPReadOnlyService().iter_approvers(self.conn, self.OU_LIST[:1], name_prefix="ta*(x)"))
+        search_filter = self.conn.extend.standard.paged_search.call_args.kwargs['search_filter']
+        self.assertEqual(
+            search_filter,
+            r"(&(objectClass=user)(!(objectClass=computer))"
+            r"(|(sAMAccountName=ta\2a\28x\29*)(cn=ta\2a\28x\29*)(displayName=ta\2a\28x\29*)))",
+        )
+
+    def test_cached_candidates_are_narrowed_locally(self):
+        approver_cache.store(self.OU_LIST[0], [
+            {'username': 'tanaka', 'display_name': 'Tanaka', 'email': '', 'dn': '', 'ou': ''},
+            {'username': 'sato', 'display_name': 'Sato', 'email': '', 'dn': '', 'ou': ''},
+            {'username': 'takeda', 'display_name': 'Takeda', 'email': '', 'dn': '', 'ou': ''},
+        ])
+        approvers = LDAPReadOnlyService().get_approvers_for_dn(
+            "CN=Alice,OU=Dept1,OU=Div,DC=example,DC=com", name_prefix="TA", limit=1
+        )
+        self.assertEqual([a['username'] for a in approvers], ['tanaka'])
+        self.conn.extend.standard.paged_search.assert_not_called()
+
+    def test_cached_narrowing_matches_display_name_like_server(self):
+        # cn と displayName が異なる利用者 (サーバ側のフィルタは displayName でも一致する)
+        def paged(search_base=None, **kw):
+            yield {'type': 'searchResEntry', 'dn': f"CN=t.yamada,{search_base}",
+                   'attributes': {'sAMAccountName': 'tyamada', 'cn': 't.yamada', 'displayName': '山田 太郎'}}
+        self.conn.extend.standard.paged_search.side_effect = paged
+        service = LDAPReadOnlyService()
+        fetched = list(service.iter_approvers(self.conn, self.OU_LIST[:1]))
+        self.assertEqual(fetched[0].ldap_display_name, '山田 太郎')
+        approver_cache.store(self.OU_LIST[0], [a.to_dict() for a in fetched])
+        approvers = service.get_approvers_for_dn("CN=Alice,OU=Dept1,OU=Div,DC=example,DC=com", name_prefix="山田")
+        self.assertEqual([a['username'] for a in approvers], ['tyamada'])
@@ -10,4 +10,5 @@ urlpatterns = [
     path('me/', views.CurrentUserView.as_view(), name='current-user'),
     path('search/', views.UserSearchView.as_view(), name='user-search'),
     path('approvers/resync/', views.resync_and_fetch_approvers, name='approvers-resync'),
+    path('approvers/cache/', views.manage_approver_cache, name='approver-cache'),
 ]
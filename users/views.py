@@ -14,6 +14,7 @@ from django.utils import timezone
 from .serializers import UserSerializer
 from .session_manager import SessionManager
 from users.utils import get_approvers_for_user
+from users import approver_cache
 from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
@@ -21,7 +22,12 @@ from django.contrib.auth.decorators import login_required
 
 @login_required
 def resync_and_fetch_approvers(request):
-    """現在ログインユーザのLDAP情報を再同期し、承認者候補をJSONで返す"""
+    """現在ログインユーザのLDAP情報を再同期し、承認者候補をJSONで返す
+
+    キャッシュは使わずにサーバから取り直す。クエリ q (名前の前方一致) と limit (件数上限)
+    はそのまま LDAP の検索条件として送る。絞り込み無しなら結果で所属 OU のキャッシュを
+    置き換え、絞り込み付きなら古いキャッシュを破棄する。
+    """
     import logging
     logger = logging.getLogger('users.backends')
     if request.method != 'GET':
@@ -30,13 +36,23 @@ def resync_and_fetch_approvers(request):
     user = request.user
     logger.debug("[resync] start user=%s", user.username)
     try:
-        profile = getattr(user, 'profile', None)
-        ldap_dn = getattr(profile, 'ldap_dn', '') if profile else ''
+        # 旧 UserProfile は User に統合済み
+        ldap_dn = getattr(user, 'ldap_dn', '')
         if not ldap_dn:
             logger.warning("[resync] missing ldap_dn user=%s", user.username)
             return JsonResponse({'ok': False, 'error': 'ldap_dn_not_set', 'candidates': []}, status=400)
         from users.ldap_service import LDAPReadOnlyService
-        approvers_raw = LDAPReadOnlyService().get_approvers_for_dn(ldap_dn) or []
+        name_prefix = (request.GET.get('q') or '').strip() or None
+        try:
+            limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        except ValueError:
+            return JsonResponse({'ok': False, 'error': 'invalid_limit', 'candidates': []}, status=400)
+        if limit is not None and limit < 1:
+            return JsonResponse({'ok': False, 'error': 'invalid_limit', 'candidates': []}, status=400)
+        # 本人は後で除外するので1件多めに取る
+        approvers_raw = LDAPReadOnlyService().get_approvers_for_dn(
+            ldap_dn, name_prefix=name_prefix, limit=limit + 1 if limit else None, refresh=True
+        ) or []
         logger.debug("[resync] fetched count=%d", len(approvers_raw))
         cleaned = [
             {
@@ -45,13 +61,30 @@ def resync_and_fetch_approvers(request):
                 'email': a.get('email',''),
                 'ou': a.get('ou','')
             } for a in approvers_raw if a.get('username') and a.get('username') != user.username
-        ]
+        ][:limit]
         logger.debug("[resync] cleaned count=%d", len(cleaned))
         return JsonResponse({'ok': True, 'candidates': cleaned})
     except Exception as e:  # noqa: BLE001
         logger.exception("[resync] unexpected error user=%s", user.username)
         return JsonResponse({'ok': False, 'error': 'exception', 'detail': str(e)}, status=500)
 
+
+@login_required
+def manage_approver_cache(request):
+    """承認者候補キャッシュのヒット/ミス件数 (GET。このプロセス分) と手動無効化 (POST)。管理者のみ
+
+    POST の ou に OU の DN を渡すとその OU 分だけ、省略すると全 OU 分を破棄する。
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
+    if request.method == 'GET':
+        return JsonResponse({'ok': True, 'stats': approver_cache.stats()})
+    if request.method != 'POST':
+        return JsonResponse({'ok': False, 'error': 'method_not_allowed'}, status=405)
+    ou_dn = (request.POST.get('ou') or '').strip() or None
+    approver_cache.invalidate(ou_dn)
+    return JsonResponse({'ok': True, 'invalidated': ou_dn or 'all'})
+
 User = get_user_model()
 
 